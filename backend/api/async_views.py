@@ -0,0 +1,117 @@
+"""
+Vistas async para el despliegue ASGI (`uvicorn kcdummy.asgi:application`).
+
+Responden lo mismo que sus equivalentes de `views.py`, pero la
+autenticación, las llamadas a Keycloak y las consultas esperan sin ocupar
+un hilo del servidor. DRF 3.14 no ejecuta vistas async, así que son vistas
+de Django que solo responden JSON (sin la API navegable).
+"""
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from functools import wraps
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+import httpx
+import logging
+from core.authentication import async_authentication
+from core.keycloak_async import async_service_account_tokens
+from .conditional import (
+    apesticides_state, pesticide_detail_etag, pesticides_condition, pesticides_list_etag,
+)
+from .filters import filter_pesticides, order_by_fields, parse_ordering
+from .models import Pesticide
+from .pagination import get_paginator
+from .renderers import FastJSONRenderer
+from .response_cache import acache_pesticide_response
+from .serializers import PesticideSerializer
+from .views import aserialize_page
+
+logger = logging.getLogger(__name__)
+
+_renderer = FastJSONRenderer()
+
+
+def json_response(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type='application/json')
+
+
+def with_pesticides_state(view_func):
+    """
+    Lee la versión de los productos antes de `pesticides_condition`, cuyas
+    funciones de ETag y Last-Modified no pueden consultar la base desde el
+    event loop
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        await apesticides_state(request)
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+@csrf_exempt
+@require_POST
+@async_authentication('frontintegration')
+async def token_exchange(request):
+    """Igual que `views.token_exchange`, sin bloquear mientras se pide el token"""
+    try:
+        username = request.user.token_info.get('preferred_username')
+        logger.info(f"Iniciando intercambio de token para usuario: {username}")
+
+        try:
+            token_data = await async_service_account_tokens.aget_token_data()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Error en intercambio de token: {e.response.status_code}")
+            logger.error(f"Respuesta: {e.response.text}")
+            return json_response({'error': 'Error en el intercambio de token'}, status=400)
+
+        logger.info("Intercambio de token exitoso")
+        return json_response({
+            'token': token_data.get('access_token'),
+            'expires_in': token_data.get('expires_in'),
+            'token_type': token_data.get('token_type', 'Bearer')
+        })
+    except Exception as e:
+        logger.error(f"Error en el intercambio de token: {str(e)}")
+        return json_response({'error': str(e)}, status=500)
+
+
+@require_GET
+@async_authentication('backintegration')
+@with_pesticides_state
+@pesticides_condition(pesticides_list_etag)
+@acache_pesticide_response
+async def pesticides_list(request):
+    """Igual que `views.pesticides_list` (mismos parámetros y respuesta)"""
+    try:
+        # La paginación lee los parámetros de la petición de DRF
+        drf_request = Request(request)
+        pesticides = filter_pesticides(Pesticide.objects.all(), request.GET)
+        pesticides = pesticides.order_by(*order_by_fields(*parse_ordering(request.GET)))
+
+        response = await aserialize_page(get_paginator(drf_request), pesticides, drf_request)
+        return json_response(response.data)
+    except ValidationError as e:
+        return json_response({'error': e.detail}, status=400)
+    except NotFound as e:
+        return json_response({'error': e.detail}, status=404)
+    except Exception as e:
+        logger.error(f"Error en pesticides_list: {str(e)}")
+        return json_response({'error': str(e)}, status=500)
+
+
+@require_GET
+@async_authentication('backintegration')
+@with_pesticides_state
+@pesticides_condition(pesticide_detail_etag)
+@acache_pesticide_response
+async def pesticide_detail(request, pk):
+    """Igual que `views.pesticide_detail`"""
+    try:
+        pesticide = await Pesticide.objects.aget(pk=pk)
+        return json_response(PesticideSerializer(pesticide).data)
+    except Pesticide.DoesNotExist:
+        return json_response({'error': 'Producto no encontrado'}, status=404)
+    except Exception as e:
+        logger.error(f"Error en pesticide_detail: {str(e)}")
+        return json_response({'error': str(e)}, status=500)
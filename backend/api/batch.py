@@ -0,0 +1,49 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+# Parámetro de la petición -> campo del modelo
+BATCH_FIELDS = {
+    'ids': 'id',
+    'registration_numbers': 'registration_number',
+}
+
+
+def max_batch_size():
+    return getattr(settings, 'PESTICIDES_BATCH_MAX_SIZE', 100)
+
+
+def _values(raw):
+    if isinstance(raw, str):
+        return [item.strip() for item in raw.split(',') if item.strip()]
+    if isinstance(raw, list):
+        if any(isinstance(item, (dict, list)) for item in raw):
+            raise ValidationError('Los identificadores deben ser números o textos')
+        return [str(item).strip() for item in raw if str(item).strip()]
+    raise ValidationError('Se esperaba una lista o valores separados por coma')
+
+
+def parse_batch(request):
+    """
+    Retorna (campo, identificadores sin repetir, en el orden pedido) a partir
+    de la query string (GET) o del cuerpo JSON (POST).
+    """
+    params = request.data if request.method == 'POST' else request.query_params
+    if not isinstance(params, dict):
+        raise ValidationError('El cuerpo debe ser un objeto JSON')
+    given = [param for param in BATCH_FIELDS if params.get(param) not in (None, '')]
+    if len(given) != 1:
+        raise ValidationError(f"Indicar uno de: {', '.join(BATCH_FIELDS)}")
+    param = given[0]
+
+    identifiers = list(dict.fromkeys(_values(params.get(param))))
+    if not identifiers:
+        raise ValidationError({param: 'No se indicaron identificadores'})
+    if len(identifiers) > max_batch_size():
+        raise ValidationError({param: f"Se admiten hasta {max_batch_size()} identificadores por petición"})
+
+    if param == 'ids':
+        try:
+            identifiers = list(dict.fromkeys(int(identifier) for identifier in identifiers))
+        except (TypeError, ValueError):
+            raise ValidationError({param: 'Los ids deben ser números enteros'})
+    return BATCH_FIELDS[param], identifiers
@@ -0,0 +1,294 @@
+"""
+Carga masiva de productos desde CSV, JSON o NDJSON.
+
+Las filas se leen como stream, se validan contra el modelo y se copian con
+`COPY` a una tabla temporal, por lotes. Al final un único
+`INSERT ... ON CONFLICT (registration_number) DO UPDATE` pasa la tabla
+temporal a la definitiva. Todo ocurre en una sola transacción.
+"""
+from datetime import date
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date
+import csv
+import io
+import json
+from .models import DatasetVersion, Pesticide, PesticideStat
+
+# Campos que se cargan; registration_number identifica al producto
+FIELDS = (
+    'registration_number', 'name', 'active_ingredient', 'manufacturer',
+    'status', 'last_review_date', 'category',
+)
+FORMATS = ('csv', 'json', 'ndjson')
+READ_SIZE = 64 * 1024
+# Motivos de rechazo que se guardan por defecto; el resto de las filas solo se cuenta
+MAX_ERRORS = 50
+STAGING_TABLE = 'pesticide_staging'
+
+
+class RowError(ValueError):
+    """Fila rechazada; el mensaje indica el motivo"""
+
+
+def detect_format(stream, name=None):
+    """
+    Formato según la extensión del archivo o, si no la hay (stdin), según el
+    primer carácter: `[` arreglo JSON, `{` NDJSON y cualquier otro CSV.
+    `stream` debe ser binario con `peek()`.
+    """
+    if name:
+        extension = name.rsplit('.', 1)[-1].lower()
+        if extension in FORMATS:
+            return extension
+        if extension == 'jsonl':
+            return 'ndjson'
+    start = stream.peek(READ_SIZE).lstrip(b'\xef\xbb\xbf \t\r\n')[:1]
+    if start == b'[':
+        return 'json'
+    if start == b'{':
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_csv(text, delimiter=','):
+    reader = csv.DictReader(text, delimiter=delimiter)
+    for item in reader:
+        yield reader.line_num, item
+
+
+def iter_ndjson(text):
+    for number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, RowError(f"JSON no válido: {e.msg}")
+
+
+def iter_json_array(text):
+    """
+    Objetos de un arreglo JSON, decodificados de a uno con `raw_decode` a
+    medida que se lee el archivo, sin cargarlo completo.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    number = 0
+    for chunk in iter(lambda: text.read(READ_SIZE), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n\ufeff':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise RowError('Se esperaba un arreglo JSON')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            if buffer[position] == ',':
+                position += 1
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Objeto incompleto: se lee otro bloque
+                break
+            number += 1
+            yield number, item
+    raise RowError('El arreglo JSON está incompleto o no es válido')
+
+
+def iter_items(text, file_format, delimiter=','):
+    """(número de línea u objeto, fila) del archivo en el formato indicado"""
+    if file_format == 'csv':
+        return iter_csv(text, delimiter)
+    if file_format == 'ndjson':
+        return iter_ndjson(text)
+    return iter_json_array(text)
+
+
+def _choices(field):
+    return {choice for choice, _ in Pesticide._meta.get_field(field).choices}
+
+
+class PesticideLoader:
+    """
+    Carga filas (dicts) con COPY y upsert. Uso:
+
+        with transaction.atomic():
+            loader = PesticideLoader(batch_size=5000)
+            loader.load(items)
+
+    Después de `load()` quedan los totales en `read`, `rejected`,
+    `inserted`, `updated` y `unchanged`, y los motivos de rechazo de las
+    primeras `max_errors` filas en `errors` (lista de (línea, motivo)).
+    """
+
+    def __init__(self, batch_size=5000, max_errors=MAX_ERRORS):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.read = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        # Línea (u objeto) de la última fila leída, para ubicar errores del archivo
+        self.line = None
+        self._statuses = _choices('status')
+        self._categories = _choices('category')
+        self._max_lengths = {
+            name: Pesticide._meta.get_field(name).max_length for name in FIELDS
+        }
+
+    def clean(self, item):
+        """Tupla con los valores de FIELDS, o RowError con el motivo"""
+        if isinstance(item, RowError):
+            raise item
+        if not isinstance(item, dict):
+            raise RowError('La fila no es un objeto')
+
+        values = []
+        for name in FIELDS:
+            value = item.get(name)
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == '':
+                raise RowError(f"Falta {name}")
+            if name == 'last_review_date':
+                value = self._clean_date(value)
+            else:
+                value = str(value)
+                if '\x00' in value:
+                    # PostgreSQL no admite NUL en columnas de texto: COPY fallaría
+                    raise RowError(f"{name} contiene un carácter NUL")
+                max_length = self._max_lengths[name]
+                if max_length and len(value) > max_length:
+                    raise RowError(f"{name} supera {max_length} caracteres")
+            if name == 'status' and value not in self._statuses:
+                raise RowError(f"status no válido: {value}")
+            if name == 'category' and value not in self._categories:
+                raise RowError(f"category no válida: {value}")
+            values.append(value)
+        return values
+
+    def _clean_date(self, value):
+        if isinstance(value, date):
+            return value
+        try:
+            parsed = parse_date(str(value))
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise RowError(f"last_review_date no válida: {value}")
+        return parsed
+
+    def _create_staging(self, cursor):
+        columns = ', '.join(
+            f"{name} {Pesticide._meta.get_field(name).db_type(connection)}" for name in FIELDS
+        )
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {STAGING_TABLE} (line bigint, {columns}) ON COMMIT DROP"
+        )
+
+    def _copy(self, cursor, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line, values in batch:
+            writer.writerow([line, *(
+                value.isoformat() if isinstance(value, date) else value for value in values
+            )])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} (line, {', '.join(FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    def _upsert(self, cursor):
+        table = Pesticide._meta.db_table
+        columns = ', '.join(FIELDS)
+        updated = [name for name in FIELDS if name != 'registration_number']
+        assignments = ', '.join(f"{name} = EXCLUDED.{name}" for name in updated)
+        current = ', '.join(f"{table}.{name}" for name in updated)
+        excluded = ', '.join(f"EXCLUDED.{name}" for name in updated)
+
+        staged = (
+            f"SELECT DISTINCT ON (registration_number) {columns}"
+            f" FROM {STAGING_TABLE} ORDER BY registration_number, line DESC"
+        )
+        stat_columns = ', '.join(PesticideStat.SOURCE_COLUMNS)
+
+        # Las filas escritas llevan una nueva versión de cambio; si al final
+        # nada cambió, se descarta el incremento con el savepoint
+        savepoint = transaction.savepoint()
+        version = DatasetVersion.bump(DatasetVersion.PESTICIDES)
+
+        # Las estadísticas descuentan los valores de las filas vigentes que
+        # se van a modificar...
+        staged_columns = ', '.join(f"staged.{name}" for name in updated)
+        changing = (
+            f"SELECT {', '.join(f'{table}.{name}' for name in PesticideStat.SOURCE_COLUMNS)}"
+            f" FROM {table} JOIN ({staged}) AS staged USING (registration_number)"
+            f" WHERE {table}.deleted_at IS NULL AND ({current}) IS DISTINCT FROM ({staged_columns})"
+        )
+        cursor.execute(PesticideStat.delta_sql(changing, -1))
+
+        # ...y suman las filas insertadas o actualizadas. Si un registro se
+        # repite en el archivo, vale la última fila. Las filas sin cambios no
+        # se reescriben; las borradas se restauran.
+        cursor.execute(
+            f"WITH upserted AS ("
+            f" INSERT INTO {table} ({columns}, updated_at, change_version, deleted_at)"
+            f" SELECT {columns}, now(), %s, NULL FROM ({staged}) AS staged"
+            f" ON CONFLICT (registration_number) DO UPDATE SET {assignments},"
+            f" updated_at = EXCLUDED.updated_at, change_version = EXCLUDED.change_version, deleted_at = NULL"
+            f" WHERE ({current}, {table}.deleted_at) IS DISTINCT FROM ({excluded}, NULL)"
+            f" RETURNING (xmax = 0) AS inserted, {stat_columns}"
+            f"), stats AS ({PesticideStat.delta_sql(f'SELECT {stat_columns} FROM upserted')})"
+            f" SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted",
+            [version]
+        )
+        self.inserted, self.updated = cursor.fetchone()
+        if self.inserted or self.updated:
+            transaction.savepoint_commit(savepoint)
+        else:
+            transaction.savepoint_rollback(savepoint)
+
+        cursor.execute(f"SELECT count(DISTINCT registration_number) FROM {STAGING_TABLE}")
+        self.unchanged = cursor.fetchone()[0] - self.inserted - self.updated
+
+    def load(self, items):
+        """
+        Carga los pares (línea, fila). Debe llamarse dentro de una
+        transacción (la tabla temporal se elimina en el commit).
+        """
+        if not transaction.get_connection().in_atomic_block:
+            raise RuntimeError('PesticideLoader.load() requiere una transacción')
+
+        with connection.cursor() as cursor:
+            self._create_staging(cursor)
+            batch = []
+            for line, item in items:
+                self.read += 1
+                self.line = line
+                try:
+                    batch.append((line, self.clean(item)))
+                except RowError as e:
+                    self.rejected += 1
+                    if len(self.errors) < self.max_errors:
+                        self.errors.append((line, str(e)))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self._copy(cursor, batch)
+                    batch = []
+            if batch:
+                self._copy(cursor, batch)
+
+            self._upsert(cursor)
@@ -0,0 +1,101 @@
+"""
+Respuestas condicionales (ETag / Last-Modified) de los productos, con
+`pesticides_condition` sobre `django.views.decorators.http.condition`.
+
+Se calculan a partir de la versión del conjunto de datos, sin consultar ni
+serializar los productos. La versión se lee antes que los datos, por lo que
+una respuesta nunca lleva un ETag más nuevo que su contenido.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+from functools import wraps
+import hashlib
+from .export import accepts_gzip
+from .models import DatasetVersion
+
+# Métodos con respuestas condicionales
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def pesticides_state(request):
+    """(versión, última escritura) de los productos, una sola vez por petición"""
+    state = getattr(request, '_pesticides_state', None)
+    if state is None:
+        state = DatasetVersion.current(DatasetVersion.PESTICIDES)
+        request._pesticides_state = state
+    return state
+
+
+async def apesticides_state(request):
+    """
+    Igual que `pesticides_state`, con el ORM asíncrono. Las vistas async lo
+    llaman antes de `condition`, cuyas funciones se ejecutan sin await y así
+    encuentran el estado ya leído.
+    """
+    state = getattr(request, '_pesticides_state', None)
+    if state is None:
+        state = await DatasetVersion.acurrent(DatasetVersion.PESTICIDES)
+        request._pesticides_state = state
+    return state
+
+
+def _query_hash(request):
+    query = sorted(request.GET.lists())
+    return hashlib.sha256(repr(query).encode('utf-8')).hexdigest()[:16]
+
+
+def pesticides_list_etag(request, *args, **kwargs):
+    version, _ = pesticides_state(request)
+    return f"pesticides-{version}-{_query_hash(request)}"
+
+
+def pesticides_export_etag(request, *args, **kwargs):
+    # La versión comprimida es otra representación y lleva otro ETag
+    etag = pesticides_list_etag(request)
+    return f"{etag}-gzip" if accepts_gzip(request) else etag
+
+
+def pesticide_detail_etag(request, pk, *args, **kwargs):
+    version, _ = pesticides_state(request)
+    return f"pesticide-{version}-{pk}"
+
+
+def pesticides_last_modified(request, *args, **kwargs):
+    _, updated_at = pesticides_state(request)
+    return updated_at
+
+
+def _add_last_modified(request, response):
+    if response.has_header('ETag') and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(pesticides_last_modified(request).timestamp())
+    return response
+
+
+def pesticides_condition(etag_func):
+    """
+    `condition` con el ETag como único validador. Last-Modified tiene
+    resolución de un segundo y dos escrituras en el mismo segundo dejarían a
+    un cliente que solo envía If-Modified-Since con un 304 obsoleto: se
+    agrega a la respuesta junto al ETag, pero no se evalúa.
+
+    Solo aplica a GET y HEAD: el ETag depende de la query string y no del
+    cuerpo, así que un POST se atiende sin validadores.
+    """
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func)(view_func)
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(request, *args, **kwargs):
+                if request.method not in SAFE_METHODS:
+                    return await view_func(request, *args, **kwargs)
+                return _add_last_modified(request, await conditional_view(request, *args, **kwargs))
+        else:
+            @wraps(view_func)
+            def wrapper(request, *args, **kwargs):
+                if request.method not in SAFE_METHODS:
+                    return view_func(request, *args, **kwargs)
+                return _add_last_modified(request, conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,200 @@
+"""
+Exportación completa de los productos como stream.
+
+Las filas se leen con un cursor del lado del servidor (`iterator()`) y se
+escriben en bloques a medida que llegan, de modo que la memoria usada no
+depende del tamaño de la tabla. Formatos: JSON, NDJSON, CSV y Parquet (este
+último requiere `pyarrow`).
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from itertools import islice
+import csv
+import io
+import re
+from .models import Pesticide
+from .renderers import FastJSONRenderer
+from .serializers import PesticideFastSerializer
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - pyarrow es opcional
+    pyarrow = None
+
+# Tamaño aproximado de cada bloque enviado al cliente
+BUFFER_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+_gzip_re = re.compile(r'\bgzip\b')
+
+
+class ExportUnavailable(Exception):
+    """El formato pedido necesita una dependencia que no está instalada"""
+
+
+def chunk_size():
+    return getattr(settings, 'PESTICIDES_EXPORT_CHUNK_SIZE', 2000)
+
+
+def row_group_size():
+    return getattr(settings, 'PESTICIDES_PARQUET_ROW_GROUP_SIZE', 10000)
+
+
+def accepts_gzip(request):
+    return bool(_gzip_re.search(request.headers.get('Accept-Encoding', '')))
+
+
+def iter_values(queryset):
+    """Tuplas con los campos de PesticideSerializer, leídas de a `chunk_size()` filas"""
+    return queryset.values_list(*PesticideFastSerializer.fields()).iterator(chunk_size=chunk_size())
+
+
+def _buffered(parts):
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _json_parts(queryset):
+    render = FastJSONRenderer().render
+    yield b'['
+    separator = b''
+    for item in PesticideFastSerializer.iter_serialize(iter_values(queryset)):
+        yield separator + render(item)
+        separator = b','
+    yield b']'
+
+
+def _ndjson_parts(queryset):
+    render = FastJSONRenderer().render
+    for item in PesticideFastSerializer.iter_serialize(iter_values(queryset)):
+        yield render(item) + b'\n'
+
+
+class _Echo:
+    """Destino de csv.writer que devuelve cada línea en vez de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_parts(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(PesticideFastSerializer.fields()).encode('utf-8')
+    for row in PesticideFastSerializer.format_rows(iter_values(queryset)):
+        yield writer.writerow(row).encode('utf-8')
+
+
+class _StreamSink(io.RawIOBase):
+    """Archivo de solo escritura que acumula lo escrito hasta vaciarlo con `drain()`"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(field):
+    internal_type = field.get_internal_type()
+    if field.choices:
+        # Pocas opciones fijas: se guardan como índices a un diccionario
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    if internal_type in ('AutoField', 'BigAutoField', 'IntegerField', 'BigIntegerField'):
+        return pyarrow.int64()
+    if internal_type == 'DateField':
+        return pyarrow.date32()
+    if internal_type == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    return pyarrow.string()
+
+
+def parquet_schema():
+    return pyarrow.schema([
+        (name, _arrow_type(Pesticide._meta.get_field(name)))
+        for name in PesticideFastSerializer.fields()
+    ])
+
+
+def _arrow_column(values, arrow_type):
+    if pyarrow.types.is_dictionary(arrow_type):
+        return pyarrow.array(values, arrow_type.value_type).dictionary_encode()
+    return pyarrow.array(values, arrow_type)
+
+
+def _parquet_parts(queryset):
+    schema = parquet_schema()
+    dictionary_columns = [field.name for field in schema if pyarrow.types.is_dictionary(field.type)]
+    sink = _StreamSink()
+    rows = iter_values(queryset)
+    with pyarrow.parquet.ParquetWriter(sink, schema, use_dictionary=dictionary_columns) as writer:
+        # Un row group por lote: solo se tiene en memoria un lote a la vez
+        while batch := list(islice(rows, row_group_size())):
+            columns = [
+                _arrow_column(values, field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORT_PARTS = {
+    'json': _json_parts,
+    'ndjson': _ndjson_parts,
+    'csv': _csv_parts,
+    'parquet': _parquet_parts,
+}
+
+
+def stream_pesticides(queryset, export_format, gzip=False):
+    """
+    StreamingHttpResponse con los productos en el formato pedido,
+    opcionalmente comprimido con gzip (Parquet ya viene comprimido).
+    """
+    if export_format == 'parquet':
+        if pyarrow is None:
+            raise ExportUnavailable('La exportación a Parquet requiere pyarrow')
+        gzip = False
+
+    content = _buffered(EXPORT_PARTS[export_format](queryset))
+    if gzip:
+        content = compress_sequence(content)
+
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="pesticides.{export_format}"'
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
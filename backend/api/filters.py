@@ -0,0 +1,84 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from .models import Pesticide
+
+# Campos por los que se puede ordenar (todos con índice)
+ORDERING_FIELDS = ('name', 'registration_number', 'manufacturer', 'last_review_date', 'id')
+DEFAULT_ORDERING = 'name'
+# Campos únicos: el orden por sí solos ya es total
+UNIQUE_ORDERING_FIELDS = ('id', 'registration_number')
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _choice_values(params, field, choices):
+    values = _split(params.get(field, ''))
+    valid = {choice for choice, _ in choices}
+    invalid = [value for value in values if value not in valid]
+    if invalid:
+        raise ValidationError({field: f"Valores no válidos: {', '.join(invalid)}"})
+    return values
+
+
+def _date(params, param):
+    value = params.get(param)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({param: 'Fecha no válida, usar el formato AAAA-MM-DD'})
+    return parsed
+
+
+def filter_pesticides(queryset, params):
+    """
+    Aplica los filtros de la query string:
+
+    - status, category: uno o varios valores separados por coma
+    - manufacturer: coincidencia exacta
+    - last_review_date_after / last_review_date_before: rango inclusivo
+    """
+    statuses = _choice_values(params, 'status', Pesticide.STATUS_CHOICES)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+
+    categories = _choice_values(params, 'category', Pesticide.CATEGORY_CHOICES)
+    if categories:
+        queryset = queryset.filter(category__in=categories)
+
+    manufacturer = params.get('manufacturer')
+    if manufacturer:
+        queryset = queryset.filter(manufacturer=manufacturer)
+
+    review_after = _date(params, 'last_review_date_after')
+    if review_after:
+        queryset = queryset.filter(last_review_date__gte=review_after)
+
+    review_before = _date(params, 'last_review_date_before')
+    if review_before:
+        queryset = queryset.filter(last_review_date__lte=review_before)
+
+    return queryset
+
+
+def parse_ordering(params):
+    """Retorna (campo, descendente) a partir de `ordering` (p. ej. `-last_review_date`)"""
+    ordering = params.get('ordering') or DEFAULT_ORDERING
+    descending = ordering.startswith('-')
+    field = ordering.lstrip('-')
+    if field not in ORDERING_FIELDS:
+        raise ValidationError({'ordering': f"Campo no válido, usar uno de: {', '.join(ORDERING_FIELDS)}"})
+    return field, descending
+
+
+def order_by_fields(field, descending):
+    """Orden total sobre (campo, id), para que la paginación sea estable"""
+    fields = (field,) if field in UNIQUE_ORDERING_FIELDS else (field, 'id')
+    if descending:
+        return [f'-{name}' for name in fields]
+    return list(fields)
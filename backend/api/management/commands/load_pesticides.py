@@ -1,63 +1,123 @@
-from django.core.management.base import BaseCommand
-from api.models import Pesticide
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from api.bulk_load import FORMATS, PesticideLoader, RowError, detect_format, iter_items
 from datetime import date
+import csv
+import io
+import sys
+import time
+
+# Errores de fila que se muestran; el resto solo se cuenta
+MAX_REPORTED_ERRORS = 50
+
+SAMPLE_DATA = [
+    {
+        "name": "Herbimax Plus",
+        "registration_number": "SAG-2023-001",
+        "active_ingredient": "Glifosato 41%",
+        "manufacturer": "AgroTech Chile",
+        "status": "Activo",
+        "last_review_date": date(2024, 1, 15),
+        "category": "Herbicida"
+    },
+    {
+        "name": "Fungicida Pro",
+        "registration_number": "SAG-2023-002",
+        "active_ingredient": "Tebuconazol 25%",
+        "manufacturer": "CropProtect",
+        "status": "Suspendido",
+        "last_review_date": date(2023, 12, 20),
+        "category": "Fungicida"
+    },
+    {
+        "name": "InsectiGuard",
+        "registration_number": "SAG-2023-003",
+        "active_ingredient": "Imidacloprid 20%",
+        "manufacturer": "BioProtect",
+        "status": "Activo",
+        "last_review_date": date(2024, 2, 1),
+        "category": "Insecticida"
+    },
+    {
+        "name": "AcariKill",
+        "registration_number": "SAG-2023-004",
+        "active_ingredient": "Abamectina 1.8%",
+        "manufacturer": "PestControl",
+        "status": "Cancelado",
+        "last_review_date": date(2023, 11, 30),
+        "category": "Acaricida"
+    },
+    {
+        "name": "WeedMaster",
+        "registration_number": "SAG-2023-005",
+        "active_ingredient": "2,4-D 48%",
+        "manufacturer": "AgroTech Chile",
+        "status": "Activo",
+        "last_review_date": date(2024, 1, 10),
+        "category": "Herbicida"
+    }
+]
+
 
 class Command(BaseCommand):
-    help = 'Carga datos de ejemplo de productos fitosanitarios'
-
-    def handle(self, *args, **kwargs):
-        pesticides_data = [
-            {
-                "name": "Herbimax Plus",
-                "registration_number": "SAG-2023-001",
-                "active_ingredient": "Glifosato 41%",
-                "manufacturer": "AgroTech Chile",
-                "status": "Activo",
-                "last_review_date": date(2024, 1, 15),
-                "category": "Herbicida"
-            },
-            {
-                "name": "Fungicida Pro",
-                "registration_number": "SAG-2023-002",
-                "active_ingredient": "Tebuconazol 25%",
-                "manufacturer": "CropProtect",
-                "status": "Suspendido",
-                "last_review_date": date(2023, 12, 20),
-                "category": "Fungicida"
-            },
-            {
-                "name": "InsectiGuard",
-                "registration_number": "SAG-2023-003",
-                "active_ingredient": "Imidacloprid 20%",
-                "manufacturer": "BioProtect",
-                "status": "Activo",
-                "last_review_date": date(2024, 2, 1),
-                "category": "Insecticida"
-            },
-            {
-                "name": "AcariKill",
-                "registration_number": "SAG-2023-004",
-                "active_ingredient": "Abamectina 1.8%",
-                "manufacturer": "PestControl",
-                "status": "Cancelado",
-                "last_review_date": date(2023, 11, 30),
-                "category": "Acaricida"
-            },
-            {
-                "name": "WeedMaster",
-                "registration_number": "SAG-2023-005",
-                "active_ingredient": "2,4-D 48%",
-                "manufacturer": "AgroTech Chile",
-                "status": "Activo",
-                "last_review_date": date(2024, 1, 10),
-                "category": "Herbicida"
-            }
-        ]
-
-        for pesticide_data in pesticides_data:
-            Pesticide.objects.get_or_create(
-                registration_number=pesticide_data['registration_number'],
-                defaults=pesticide_data
-            )
-
-        self.stdout.write(self.style.SUCCESS('Datos de ejemplo cargados exitosamente')) 
\ No newline at end of file
+    help = (
+        'Carga productos fitosanitarios desde un archivo CSV, JSON o NDJSON '
+        '(o stdin con "-"). Sin archivo carga los datos de ejemplo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Archivo a cargar, o "-" para leer de stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Formato del archivo (por defecto se detecta)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por cada COPY a la tabla temporal')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificación del archivo')
+        parser.add_argument('--delimiter', default=',', help='Separador de columnas del CSV')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size debe ser mayor que 0')
+
+        path = options['path']
+        started = time.monotonic()
+        loader = PesticideLoader(batch_size=options['batch_size'], max_errors=MAX_REPORTED_ERRORS)
+        try:
+            with transaction.atomic():
+                if path is None:
+                    loader.load(enumerate(SAMPLE_DATA, start=1))
+                else:
+                    self._load_file(loader, path, options)
+        except (OSError, UnicodeDecodeError, RowError, csv.Error, DatabaseError) as e:
+            # Los errores de COPY (p. ej. bytes no válidos) llegan como DatabaseError
+            position = '' if loader.line is None else f" después de la fila {loader.line}"
+            raise CommandError(f"No se pudo cargar {path}{position}: {e}")
+        elapsed = time.monotonic() - started
+
+        for line, reason in loader.errors:
+            self.stderr.write(f"Fila {line} rechazada: {reason}")
+        if loader.rejected > len(loader.errors):
+            self.stderr.write(f"... y {loader.rejected - len(loader.errors)} filas rechazadas más")
+
+        rate = loader.read / elapsed if elapsed > 0 else 0
+        self.stdout.write(
+            f"Filas leídas: {loader.read}, rechazadas: {loader.rejected}, "
+            f"nuevas: {loader.inserted}, actualizadas: {loader.updated}, sin cambios: {loader.unchanged}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Carga completada en {elapsed:.2f} s ({rate:,.0f} filas/s)"
+        ))
+
+    def _load_file(self, loader, path, options):
+        if path == '-':
+            self._load_stream(loader, sys.stdin.buffer, None, options)
+            return
+        with open(path, 'rb') as stream:
+            self._load_stream(loader, stream, path, options)
+
+    def _load_stream(self, loader, stream, name, options):
+        if not hasattr(stream, 'peek'):
+            stream = io.BufferedReader(stream)
+        file_format = options['format'] or detect_format(stream, name)
+        text = io.TextIOWrapper(stream, encoding=options['encoding'], newline='')
+        try:
+            loader.load(iter_items(text, file_format, options['delimiter']))
+        finally:
+            text.detach()
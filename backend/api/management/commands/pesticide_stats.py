@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.models import PesticideStat
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica que las estadísticas de productos coincidan con la tabla de '
+        'productos; con --rebuild las recalcula por completo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recalcula todos los conteos')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            PesticideStat.rebuild()
+            self.stdout.write('Estadísticas recalculadas')
+
+        differences = PesticideStat.differences()
+        for dimension, value, stored, computed in differences:
+            self.stderr.write(f"{dimension}={value}: guardado {stored}, calculado {computed}")
+        if differences:
+            raise CommandError(
+                f"{len(differences)} grupos no coinciden; ejecutar con --rebuild para recalcular"
+            )
+        self.stdout.write(self.style.SUCCESS('Las estadísticas coinciden con los productos'))
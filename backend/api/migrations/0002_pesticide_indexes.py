@@ -0,0 +1,41 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pesticide',
+            options={'ordering': ['name', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['name', 'id'], name='pesticide_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['status', 'category', 'name', 'id'], name='pesticide_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['manufacturer', 'name', 'id'], name='pesticide_manuf_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['manufacturer', 'id'], name='pesticide_manuf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['last_review_date', 'id'], name='pesticide_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(condition=models.Q(('status', 'Activo')), fields=['name', 'id'], name='pesticide_active_name_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_pesticide_indexes'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        # Configuración en español que además ignora acentos ("fungicida" == "fungicída")
+        migrations.RunSQL(
+            sql=[
+                "CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish);",
+                "ALTER TEXT SEARCH CONFIGURATION spanish_unaccent "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;",
+            ],
+            reverse_sql="DROP TEXT SEARCH CONFIGURATION spanish_unaccent;",
+        ),
+        migrations.AddField(
+            model_name='pesticide',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('name', config='spanish_unaccent', weight='A'), '||', django.contrib.postgres.search.SearchVector('active_ingredient', config='spanish_unaccent', weight='B'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), '||', django.contrib.postgres.search.SearchVector('manufacturer', config='spanish_unaccent', weight='C'), django.contrib.postgres.search.SearchConfig('spanish_unaccent')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pesticide_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='pesticide_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['active_ingredient'], name='pesticide_ingr_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['manufacturer'], name='pesticide_manuf_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-17 22:43
+
+from django.db import migrations, models
+
+
+def create_pesticides_version(apps, schema_editor):
+    DatasetVersion = apps.get_model('api', 'DatasetVersion')
+    DatasetVersion.objects.get_or_create(name='pesticides')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_pesticide_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_pesticides_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pesticide',
+            name='change_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pesticide',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pesticide',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(fields=['change_version', 'id'], name='pesticide_change_idx'),
+        ),
+    ]
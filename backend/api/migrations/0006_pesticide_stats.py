@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:05
+
+from django.db import migrations, models
+
+# Conteos iniciales desde los productos vigentes (ver PesticideStat.grouped_sql)
+POPULATE_STATS = """
+INSERT INTO api_pesticidestat (dimension, value, count)
+SELECT d.dimension, d.value, count(*)
+FROM api_pesticide AS src
+CROSS JOIN LATERAL (VALUES
+    ('status', src.status),
+    ('category', src.category),
+    ('manufacturer', src.manufacturer),
+    ('review_month', to_char(src.last_review_date, 'YYYY-MM'))
+) AS d (dimension, value)
+WHERE src.deleted_at IS NULL
+GROUP BY d.dimension, d.value
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_pesticide_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PesticideStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('value', models.CharField(max_length=200)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pesticidestat',
+            constraint=models.UniqueConstraint(fields=('dimension', 'value'), name='pesticide_stat_unique'),
+        ),
+        migrations.RunSQL(POPULATE_STATS, migrations.RunSQL.noop),
+    ]
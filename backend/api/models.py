@@ -1,6 +1,89 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from collections import Counter
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+# Configuración de búsqueda de texto: español sin acentos (ver migración 0003)
+SEARCH_CONFIG = 'spanish_unaccent'
+
+
+class PesticideQuerySet(models.QuerySet):
+    """
+    Toda escritura masiva asigna a las filas una nueva versión de cambio
+    (`change_version`), igual que `Pesticide.save()`, para que aparezcan en
+    el feed de cambios.
+    """
+
+    def update(self, **kwargs):
+        with transaction.atomic():
+            kwargs.setdefault('updated_at', timezone.now())
+            kwargs['change_version'] = DatasetVersion.bump(DatasetVersion.PESTICIDES)
+            if not set(self.model.STAT_FIELDS).intersection(kwargs):
+                return super().update(**kwargs)
+            # Las estadísticas descuentan los valores anteriores y suman los nuevos
+            rows = self.model.all_objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+            PesticideStat.apply_queryset(rows, -1)
+            count = super().update(**kwargs)
+            PesticideStat.apply_queryset(rows, 1)
+            return count
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            version = DatasetVersion.bump(DatasetVersion.PESTICIDES)
+            for obj in objs:
+                obj.change_version = version
+            if not (kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts')):
+                created = super().bulk_create(objs, *args, **kwargs)
+                PesticideStat.apply_deltas(Counter(key for obj in objs for key in obj.stat_keys()))
+                return created
+
+            # No se sabe qué filas se insertan, se actualizan o se ignoran: como
+            # en update(), se descuentan las filas con las que puede haber
+            # conflicto y se vuelven a sumar después. El incremento de versión
+            # impide que otro escritor las cambie entremedio.
+            rows = self.model.all_objects.filter(
+                models.Q(registration_number__in={obj.registration_number for obj in objs})
+                | models.Q(pk__in={obj.pk for obj in objs if obj.pk is not None})
+            )
+            PesticideStat.apply_queryset(rows, -1)
+            created = super().bulk_create(objs, *args, **kwargs)
+            PesticideStat.apply_queryset(rows, 1)
+            return created
+
+    def delete(self):
+        """Borrado lógico: las filas quedan como marcas de borrado (`deleted_at`)"""
+        count = self.filter(deleted_at__isnull=True).update(deleted_at=timezone.now())
+        return count, {self.model._meta.label: count}
+
+    delete.alters_data = True
+
+    def hard_delete(self):
+        with transaction.atomic():
+            return super().delete()
+
+    hard_delete.alters_data = True
+
+
+class PesticideManager(models.Manager.from_queryset(PesticideQuerySet)):
+    """Productos vigentes, sin los borrados"""
+    include_deleted = False
+
+    def get_queryset(self):
+        # El vector de búsqueda solo se usa en filtros, no se carga con las filas
+        queryset = super().get_queryset().defer('search_vector')
+        if not self.include_deleted:
+            queryset = queryset.filter(deleted_at__isnull=True)
+        return queryset
+
+
+class AllPesticideManager(PesticideManager):
+    """Todos los productos, incluidas las marcas de borrado"""
+    include_deleted = True
 
-# Create your models here.
 
 class Pesticide(models.Model):
     STATUS_CHOICES = [
@@ -24,9 +107,264 @@ class Pesticide(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     last_review_date = models.DateField()
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    # tsvector almacenado y mantenido por PostgreSQL
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('active_ingredient', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('manufacturer', weight='C', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    # Seguimiento de cambios para el feed /api/pesticides/changes/:
+    # change_version es la versión de DatasetVersion de la última escritura
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    change_version = models.BigIntegerField(default=0)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PesticideManager()
+    all_objects = AllPesticideManager()
+
+    # Campos de los que dependen las estadísticas (PesticideStat)
+    STAT_FIELDS = ('status', 'category', 'manufacturer', 'last_review_date', 'deleted_at')
 
     class Meta:
-        ordering = ['name']
+        ordering = ['name', 'id']
+        # Índices para los filtros y órdenes del listado (ver api.filters):
+        # cada orden termina en `id`, que es el desempate de la paginación keyset
+        indexes = [
+            models.Index(fields=['name', 'id'], name='pesticide_name_idx'),
+            models.Index(fields=['status', 'category', 'name', 'id'], name='pesticide_status_cat_idx'),
+            models.Index(fields=['manufacturer', 'name', 'id'], name='pesticide_manuf_name_idx'),
+            models.Index(fields=['manufacturer', 'id'], name='pesticide_manuf_idx'),
+            models.Index(fields=['last_review_date', 'id'], name='pesticide_review_idx'),
+            # La mayoría de las consultas piden solo productos activos
+            models.Index(
+                fields=['name', 'id'],
+                name='pesticide_active_name_idx',
+                condition=models.Q(status='Activo'),
+            ),
+            # Búsqueda de texto completo y por similitud (pg_trgm)
+            GinIndex(fields=['search_vector'], name='pesticide_search_idx'),
+            GinIndex(fields=['name'], name='pesticide_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['active_ingredient'], name='pesticide_ingr_trgm_idx', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['manufacturer'], name='pesticide_manuf_trgm_idx', opclasses=['gin_trgm_ops']),
+            # Recorrido del feed de cambios
+            models.Index(fields=['change_version', 'id'], name='pesticide_change_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.registration_number})"
+
+    def stat_keys(self):
+        """Grupos de PesticideStat que cuentan a este producto (ninguno si está borrado)"""
+        if self.deleted_at is not None:
+            return []
+        last_review_date = self._meta.get_field('last_review_date').to_python(self.last_review_date)
+        return PesticideStat.keys(self.status, self.category, self.manufacturer, last_review_date)
+
+    def save(self, *args, **kwargs):
+        # La escritura y el incremento de versión se confirman juntos
+        with transaction.atomic():
+            self.change_version = DatasetVersion.bump(DatasetVersion.PESTICIDES)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'change_version', 'updated_at'}
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Borrado lógico: el producto queda como marca de borrado en el feed de cambios"""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+        return 1, {self._meta.label: 1}
+
+    def hard_delete(self, *args, **kwargs):
+        # La señal pre_delete incrementa la versión en la misma transacción
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class DatasetVersion(models.Model):
+    """
+    Contador de versión por conjunto de datos, incrementado en cada escritura.
+    Permite saber si los datos cambiaron (ETag, cachés) con una sola lectura
+    por clave primaria, sin recorrer la tabla.
+    """
+    PESTICIDES = 'pesticides'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def current(cls, name):
+        """Retorna (versión, fecha de la última escritura)"""
+        dataset, _ = cls.objects.get_or_create(name=name)
+        return dataset.version, dataset.updated_at
+
+    @classmethod
+    async def acurrent(cls, name):
+        """Igual que `current`, con el ORM asíncrono"""
+        dataset, _ = await cls.objects.aget_or_create(name=name)
+        return dataset.version, dataset.updated_at
+
+    @classmethod
+    def bump(cls, name):
+        """
+        Incrementa la versión y la retorna. Debe llamarse dentro de la
+        transacción de la escritura: el bloqueo de la fila serializa a los
+        escritores hasta el commit.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cls._meta.db_table} (name, version, updated_at) "
+                "VALUES (%s, 1, now()) "
+                "ON CONFLICT (name) DO UPDATE "
+                f"SET version = {cls._meta.db_table}.version + 1, updated_at = now() "
+                "RETURNING version",
+                [name]
+            )
+            return cursor.fetchone()[0]
+
+
+class PesticideStat(models.Model):
+    """
+    Cantidad de productos vigentes por estado, categoría, fabricante y mes de
+    la última revisión. Se mantiene en cada escritura (señales,
+    PesticideQuerySet y la carga masiva), así que leer las estadísticas
+    cuesta lo mismo que la cantidad de grupos, no que la de productos.
+    """
+    STATUS = 'status'
+    CATEGORY = 'category'
+    MANUFACTURER = 'manufacturer'
+    REVIEW_MONTH = 'review_month'
+    DIMENSIONS = (STATUS, CATEGORY, MANUFACTURER, REVIEW_MONTH)
+
+    # Columnas de Pesticide que necesitan las consultas agrupadas
+    SOURCE_COLUMNS = ('status', 'category', 'manufacturer', 'last_review_date')
+
+    dimension = models.CharField(max_length=20)
+    value = models.CharField(max_length=200)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'value'], name='pesticide_stat_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.value}: {self.count}"
+
+    @classmethod
+    def keys(cls, status, category, manufacturer, last_review_date):
+        return [
+            (cls.STATUS, status),
+            (cls.CATEGORY, category),
+            (cls.MANUFACTURER, manufacturer),
+            (cls.REVIEW_MONTH, last_review_date.strftime('%Y-%m')),
+        ]
+
+    @classmethod
+    def grouped_sql(cls, source, sign=1):
+        """
+        SELECT (dimension, value, count) que agrupa las filas de `source`, una
+        subconsulta con las columnas SOURCE_COLUMNS. `sign` -1 las descuenta.
+        """
+        return (
+            f"SELECT d.dimension, d.value, {int(sign)} * count(*) AS count FROM ({source}) AS src "
+            "CROSS JOIN LATERAL (VALUES "
+            f"('{cls.STATUS}', src.status), "
+            f"('{cls.CATEGORY}', src.category), "
+            f"('{cls.MANUFACTURER}', src.manufacturer), "
+            f"('{cls.REVIEW_MONTH}', to_char(src.last_review_date, 'YYYY-MM'))"
+            ") AS d (dimension, value) GROUP BY d.dimension, d.value"
+        )
+
+    @classmethod
+    def delta_sql(cls, source, sign=1):
+        """INSERT que suma (o resta) las filas de `source` a los conteos"""
+        table = cls._meta.db_table
+        return (
+            f"INSERT INTO {table} (dimension, value, count) {cls.grouped_sql(source, sign)} "
+            f"ON CONFLICT (dimension, value) DO UPDATE SET count = {table}.count + EXCLUDED.count"
+        )
+
+    @classmethod
+    def apply_queryset(cls, queryset, sign=1):
+        """Suma (o resta) a los conteos los productos vigentes de `queryset`"""
+        source = queryset.filter(deleted_at__isnull=True).order_by().values(*cls.SOURCE_COLUMNS)
+        sql, params = source.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(cls.delta_sql(sql, sign), params)
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Aplica un Counter {(dimension, value): diferencia}"""
+        rows = [(dimension, value, delta) for (dimension, value), delta in deltas.items() if delta]
+        if not rows:
+            return
+        table = cls._meta.db_table
+        placeholders = ', '.join(['(%s, %s, %s)'] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (dimension, value, count) VALUES {placeholders} "
+                f"ON CONFLICT (dimension, value) DO UPDATE SET count = {table}.count + EXCLUDED.count",
+                [item for row in rows for item in row]
+            )
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula todos los conteos desde la tabla de productos"""
+        with transaction.atomic():
+            # El incremento de versión bloquea a los escritores hasta el commit
+            DatasetVersion.bump(DatasetVersion.PESTICIDES)
+            cls.objects.all().delete()
+            cls.apply_queryset(Pesticide.all_objects.all())
+
+    @classmethod
+    def differences(cls):
+        """
+        Grupos cuyo conteo guardado no coincide con el calculado desde los
+        productos: lista de (dimension, value, guardado, calculado). Una sola
+        consulta, así ambos lados se leen del mismo snapshot.
+        """
+        source = Pesticide.all_objects.filter(deleted_at__isnull=True).order_by().values(*cls.SOURCE_COLUMNS)
+        sql, params = source.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT coalesce(s.dimension, c.dimension), coalesce(s.value, c.value), "
+                "coalesce(s.count, 0), coalesce(c.count, 0) "
+                f"FROM (SELECT * FROM {cls._meta.db_table} WHERE count <> 0) AS s "
+                f"FULL OUTER JOIN ({cls.grouped_sql(sql)}) AS c "
+                "ON s.dimension = c.dimension AND s.value = c.value "
+                "WHERE s.count IS DISTINCT FROM c.count ORDER BY 1, 2",
+                params
+            )
+            return cursor.fetchall()
+
+    @classmethod
+    def summary(cls):
+        """Conteos por dimensión, con todos los estados y categorías y los años de revisión"""
+        groups = {dimension: {} for dimension in cls.DIMENSIONS}
+        rows = cls.objects.filter(count__gt=0).order_by('dimension', '-count', 'value')
+        for dimension, value, count in rows.values_list('dimension', 'value', 'count'):
+            groups.setdefault(dimension, {})[value] = count
+
+        statuses = {choice: groups[cls.STATUS].get(choice, 0) for choice, _ in Pesticide.STATUS_CHOICES}
+        categories = {choice: groups[cls.CATEGORY].get(choice, 0) for choice, _ in Pesticide.CATEGORY_CHOICES}
+        months = dict(sorted(groups[cls.REVIEW_MONTH].items()))
+        years = Counter()
+        for month, count in months.items():
+            years[month[:4]] += count
+        return {
+            'total': sum(statuses.values()),
+            'status': statuses,
+            'category': categories,
+            'manufacturer': groups[cls.MANUFACTURER],
+            'review_month': months,
+            'review_year': dict(years),
+        }
@@ -0,0 +1,270 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+import json
+from .filters import UNIQUE_ORDERING_FIELDS, order_by_fields, parse_ordering
+
+
+def default_page_size():
+    return getattr(settings, 'PESTICIDES_PAGE_SIZE', 100)
+
+
+def max_page_size():
+    return getattr(settings, 'PESTICIDES_MAX_PAGE_SIZE', 1000)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) sobre (campo de orden, id).
+
+    Cada página se obtiene con un filtro `(campo, id) > (último valor, último
+    id)` sobre un índice, así que el costo no depende de la profundidad de la
+    página ni del tamaño de la tabla. El cursor es opaco para el cliente.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor no válido'
+
+    def get_page_size(self, request):
+        page_size = default_page_size()
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        if requested <= 0:
+            return page_size
+        return min(requested, max_page_size())
+
+    def encode_cursor(self, value, pk, reverse=False):
+        payload = {'v': value.isoformat() if hasattr(value, 'isoformat') else value, 'id': pk}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        cursor = urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(encoded + padding))
+            value = model._meta.get_field(self.field).to_python(payload['v'])
+            return value, int(payload['id']), bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _after(self, value, pk, descending):
+        """Filas posteriores a la posición (value, pk) en el sentido del recorrido"""
+        op = 'lt' if descending else 'gt'
+        if self.field in UNIQUE_ORDERING_FIELDS:
+            return Q(**{f'{self.field}__{op}': value})
+        # El primer término acota el recorrido del índice; el resto desempata por id
+        return Q(**{f'{self.field}__{op}e': value}) & (Q(**{f'{self.field}__{op}': value}) | Q(**{f'id__{op}': pk}))
+
+    def _page_queryset(self, queryset, request):
+        """Lee los parámetros y retorna el queryset de la página, con una fila extra"""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = parse_ordering(request.query_params)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        self.reverse = cursor is not None and cursor[2]
+        self.has_cursor = cursor is not None
+        # Para ir a la página anterior se recorre en sentido inverso
+        walk_descending = self.descending != self.reverse
+
+        queryset = queryset.order_by(*order_by_fields(self.field, walk_descending))
+        if cursor is not None:
+            queryset = queryset.filter(self._after(cursor[0], cursor[1], walk_descending))
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        if self.reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+        self.page = rows
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._set_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Igual que `paginate_queryset`, con el ORM asíncrono"""
+        return self._set_page([row async for row in self._page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(getattr(last, self.field), last.id)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        first = self.page[0]
+        return self.encode_cursor(getattr(first, self.field), first.id, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class OffsetPagination(LimitOffsetPagination):
+    """Paginación `?limit=&offset=`, para clientes que necesitan el total (`count`)"""
+
+    @property
+    def default_limit(self):
+        return default_page_size()
+
+    @property
+    def max_limit(self):
+        return max_page_size()
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Igual que `paginate_queryset`, con el ORM asíncrono"""
+        self.limit = self.get_limit(request)
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        self.request = request
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+
+class NoPagination(BasePagination):
+    """
+    Lista completa como arreglo JSON, la respuesta del listado antes de que
+    se paginara. Se mantiene para los clientes que no envían parámetros de
+    paginación; los nuevos deben pedir `page_size` o `cursor`.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return list(queryset)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return [row async for row in queryset]
+
+    def get_paginated_response(self, data):
+        return Response(data)
+
+
+def get_paginator(request):
+    """
+    Paginación por offset si se piden `limit`/`offset`, keyset si se pide
+    `cursor` o `page_size`, y ninguna (arreglo completo) si no se pide nada
+    """
+    params = request.query_params
+    if OffsetPagination.limit_query_param in params or OffsetPagination.offset_query_param in params:
+        return OffsetPagination()
+    if KeysetPagination.cursor_query_param in params or KeysetPagination.page_size_query_param in params:
+        return KeysetPagination()
+    return NoPagination()
+
+
+class UncountedOffsetPagination(OffsetPagination):
+    """
+    Paginación por offset sin COUNT(*): se pide una fila extra para saber si
+    hay página siguiente. Para resultados ordenados por relevancia, donde no
+    hay una clave sobre la que paginar por keyset.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class ChangesPagination(KeysetPagination):
+    """
+    Recorre los cambios en orden de (change_version, id) a partir del cursor
+    `since`. El cursor de la respuesta apunta al último cambio entregado y se
+    usa como `since` en la siguiente sincronización; sin `since` se recorre
+    la tabla completa. El costo depende de la cantidad de cambios, no del
+    tamaño de la tabla (índice pesticide_change_idx).
+    """
+    cursor_query_param = 'since'
+    # Columnas que necesita la paginación además de las serializadas
+    extra_fields = ('change_version',)
+
+    def encode_since(self, version, pk):
+        raw = json.dumps({'v': version, 'id': pk}, separators=(',', ':')).encode('utf-8')
+        return urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_since(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0, 0
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(encoded + padding))
+            return int(payload['v']), int(payload['id'])
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _since(self, version, pk):
+        """Cambios posteriores a (version, pk); el primer término acota el índice"""
+        return Q(change_version__gte=version) & (Q(change_version__gt=version) | Q(id__gt=pk))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        version, pk = self.decode_since(request)
+
+        queryset = queryset.order_by('change_version', 'id').filter(self._since(version, pk))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if rows:
+            version, pk = rows[-1].change_version, rows[-1].id
+        self.cursor = self.encode_since(version, pk)
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'cursor': self.cursor,
+            'has_more': self.has_next,
+            'next': self.get_next_link(),
+            'results': data,
+        })
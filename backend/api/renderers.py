@@ -0,0 +1,75 @@
+"""
+Renderer JSON que usa orjson cuando está instalado.
+
+Produce exactamente los mismos bytes que `JSONRenderer` de DRF con la
+configuración por defecto (JSON compacto, UTF-8 sin escapar y U+2028/U+2029
+escapados). Los tipos que orjson no serializa igual que DRF (fechas, Decimal,
+textos traducibles, etc.) pasan por el encoder de DRF; si aun así falla, o se
+pide indentación, se usa el renderer estándar.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=JSONEncoder().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """
+    JSON delimitado por líneas (un objeto por línea). Se usa sobre todo para
+    negociar `?format=ndjson`; la exportación escribe su propio stream.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(super(NDJSONRenderer, self).render(item) + b'\n' for item in items)
+
+
+class ExportFileRenderer(FastJSONRenderer):
+    """
+    Formatos de archivo de la exportación (`?format=csv|parquet`). El
+    contenido se escribe como stream en la vista; este renderer solo entra en
+    juego para las respuestas de error, que se envían como JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return super().render(data, None, renderer_context)
+
+
+class CSVRenderer(ExportFileRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class ParquetRenderer(ExportFileRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
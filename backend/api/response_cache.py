@@ -0,0 +1,90 @@
+"""
+Caché de respuestas JSON ya serializadas de los productos.
+
+Cada entrada guarda los bytes finales de una respuesta y su clave incluye la
+versión de los productos (`DatasetVersion`), que se lee antes de consultar
+los datos. Una escritura incrementa la versión dentro de su transacción, así
+que ninguna petición posterior al commit puede recibir una entrada anterior.
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from functools import wraps
+from rest_framework.response import Response
+import hashlib
+from core.cache import TieredCache
+from .conditional import apesticides_state, pesticides_state
+
+response_cache = TieredCache(
+    'pesticide_responses',
+    maxsize=getattr(settings, 'PESTICIDES_RESPONSE_CACHE_SIZE', 512),
+    backend=getattr(settings, 'PESTICIDES_RESPONSE_CACHE_BACKEND', None),
+)
+
+
+def _cache_key(request, version):
+    # La URL absoluta incluye el host, usado en los links next/previous
+    url_hash = hashlib.sha256(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f"{version}:{url_hash}"
+
+
+def _json_response(content, cache_status):
+    response = HttpResponse(content, content_type='application/json')
+    response['X-Cache'] = cache_status
+    return response
+
+
+def cache_pesticide_response(view_func):
+    """
+    Sirve la respuesta desde la caché local y luego desde el backend de
+    caché de Django; si no está, ejecuta la vista y guarda lo renderizado.
+    Solo aplica a GET con respuesta JSON exitosa.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.accepted_renderer.format != 'json':
+            return view_func(request, *args, **kwargs)
+
+        version, _ = pesticides_state(request)
+        key = _cache_key(request, version)
+        content = response_cache.get(key)
+        if content is not None:
+            return _json_response(content, 'HIT')
+
+        response = view_func(request, *args, **kwargs)
+        if not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        content = request.accepted_renderer.render(
+            response.data,
+            request.accepted_media_type,
+            {'request': request, 'response': response},
+        )
+        response_cache.set(key, content, getattr(settings, 'PESTICIDES_RESPONSE_CACHE_TTL', 300))
+        return _json_response(content, 'MISS')
+    return wrapper
+
+
+def acache_pesticide_response(view_func):
+    """
+    Igual que `cache_pesticide_response`, para las vistas async (que ya
+    retornan el JSON renderizado).
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await view_func(request, *args, **kwargs)
+
+        version, _ = await apesticides_state(request)
+        key = _cache_key(request, version)
+        content = await response_cache.aget(key)
+        if content is not None:
+            return _json_response(content, 'HIT')
+
+        response = await view_func(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        await response_cache.aset(key, response.content, getattr(settings, 'PESTICIDES_RESPONSE_CACHE_TTL', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
@@ -0,0 +1,41 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+import re
+from .models import SEARCH_CONFIG
+
+MIN_QUERY_LENGTH = 2
+SEARCH_FIELDS = ('name', 'active_ingredient', 'manufacturer')
+TERM_RE = re.compile(r'\w+')
+
+
+def build_search_query(text):
+    """
+    tsquery de prefijos: cada palabra del texto debe aparecer como inicio de
+    una palabra indexada ("glifo" -> 'glifo':*).
+    """
+    terms = TERM_RE.findall(text)
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f"{term}:*" for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def search_pesticides(queryset, text):
+    """
+    Filtra y ordena por relevancia combinando la búsqueda de texto completo
+    (search_vector) con la similitud por trigramas, que tolera errores de
+    tipeo. Ambas condiciones usan índices GIN.
+    """
+    similarity = Greatest(*(TrigramWordSimilarity(text, field) for field in SEARCH_FIELDS))
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'{field}__trigram_word_similar': text})
+
+    query = build_search_query(text)
+    if query is None:
+        rank = similarity
+    else:
+        matches |= Q(search_vector=query)
+        rank = SearchRank(F('search_vector'), query) + similarity
+
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', 'id')
@@ -1,7 +1,101 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Pesticide
 
 class PesticideSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pesticide
-        fields = '__all__' 
\ No newline at end of file
+        exclude = ['search_vector', 'change_version', 'deleted_at']
+
+
+class PesticideChangeSerializer(serializers.ModelSerializer):
+    """Entrada del feed de cambios: `deleted_at` distinto de null indica un borrado"""
+    class Meta:
+        model = Pesticide
+        exclude = ['search_vector', 'change_version']
+
+
+def _format_date(value):
+    return None if value is None else value.isoformat()
+
+
+def _format_datetime(value):
+    # Igual que DateTimeField de DRF: zona horaria actual y sufijo Z para UTC
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class PesticideFastSerializer:
+    """
+    Serializador de solo lectura para listados grandes.
+
+    Lee las filas con `values_list()` sobre los mismos campos y en el mismo
+    orden que `PesticideSerializer`, sin instanciar modelos ni recorrer los
+    campos del serializador por cada valor. Solo las columnas de fecha se
+    formatean, una vez por fila. El resultado, renderizado en JSON, es
+    idéntico byte a byte al de `PesticideSerializer`.
+    """
+    serializer_class = PesticideSerializer
+
+    @classmethod
+    def fields(cls):
+        # Se calculan una vez por clase (no se heredan de la clase base)
+        if '_fields' not in cls.__dict__:
+            fields = tuple(cls.serializer_class().fields)
+            formatters = []
+            for index, name in enumerate(fields):
+                field = Pesticide._meta.get_field(name)
+                if isinstance(field, models.DateTimeField):
+                    formatters.append((index, _format_datetime))
+                elif isinstance(field, models.DateField):
+                    formatters.append((index, _format_date))
+            cls._formatters = tuple(formatters)
+            cls._fields = fields
+        return cls._fields
+
+    @classmethod
+    def rows(cls, queryset, *extra_fields):
+        """
+        Filas como tuplas con nombre: los paginadores leen el campo de orden
+        y el id con `getattr`, igual que en una instancia del modelo.
+        `extra_fields` van al final de la tupla y no se serializan.
+        """
+        return queryset.values_list(*cls.fields(), *extra_fields, named=True)
+
+    @classmethod
+    def format_rows(cls, rows):
+        """Tuplas con las fechas ya convertidas a texto"""
+        cls.fields()
+        formatters = cls._formatters
+        if not formatters:
+            yield from rows
+            return
+        for row in rows:
+            row = list(row)
+            for index, formatter in formatters:
+                row[index] = formatter(row[index])
+            yield row
+
+    @classmethod
+    def iter_serialize(cls, rows):
+        """Convierte cada tupla en el dict que entregaría PesticideSerializer"""
+        fields = cls.fields()
+        for row in cls.format_rows(rows):
+            yield dict(zip(fields, row))
+
+    @classmethod
+    def serialize(cls, rows):
+        return list(cls.iter_serialize(rows))
+
+
+class PesticideChangeFastSerializer(PesticideFastSerializer):
+    """Equivalente rápido de PesticideChangeSerializer"""
+    serializer_class = PesticideChangeSerializer
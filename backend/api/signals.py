@@ -0,0 +1,60 @@
+from collections import Counter
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .models import DatasetVersion, Pesticide, PesticideStat
+
+
+def _stored_state(pk):
+    """Valores de STAT_FIELDS guardados en la fila, o None si no existe"""
+    return Pesticide.all_objects.filter(pk=pk).values(*Pesticide.STAT_FIELDS).first()
+
+
+def _stat_keys(state):
+    if state is None or state['deleted_at'] is not None:
+        return []
+    return PesticideStat.keys(*(state[name] for name in PesticideStat.SOURCE_COLUMNS))
+
+
+@receiver(pre_delete, sender=Pesticide)
+def bump_pesticides_version(sender, **kwargs):
+    """
+    Los borrados físicos (`hard_delete`) también invalidan ETags y respuestas
+    en caché. Las demás escrituras incrementan la versión en `save()` y en
+    `PesticideQuerySet`. Se incrementa antes de borrar: el bloqueo de la
+    versión serializa a los escritores antes de leer los grupos de la fila.
+    """
+    DatasetVersion.bump(DatasetVersion.PESTICIDES)
+
+
+@receiver(pre_save, sender=Pesticide)
+@receiver(pre_delete, sender=Pesticide)
+def remember_stat_state(sender, instance, **kwargs):
+    """
+    Valores de la fila antes de escribirla, leídos de la base y no de la
+    instancia: otro escritor pudo cambiarla después de cargarla. `save()` y
+    `bump_pesticides_version` ya tienen el bloqueo de la versión.
+    """
+    instance._stat_old_state = None if instance.pk is None else _stored_state(instance.pk)
+
+
+@receiver(post_save, sender=Pesticide)
+def update_stats_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    old_state = instance._stat_old_state
+    new_state = {name: getattr(instance, name) for name in Pesticide.STAT_FIELDS}
+    if update_fields is not None and old_state is not None:
+        # Solo los campos escritos cambiaron en la fila
+        new_state = {
+            name: new_state[name] if name in update_fields else old_state[name]
+            for name in Pesticide.STAT_FIELDS
+        }
+    new_state['last_review_date'] = Pesticide._meta.get_field('last_review_date').to_python(
+        new_state['last_review_date']
+    )
+    deltas = Counter(_stat_keys(new_state))
+    deltas.subtract(Counter(_stat_keys(old_state)))
+    PesticideStat.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Pesticide)
+def update_stats_on_delete(sender, instance, **kwargs):
+    PesticideStat.apply_deltas(Counter({key: -1 for key in _stat_keys(instance._stat_old_state)}))
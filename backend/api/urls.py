@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'api'
 
@@ -7,5 +7,14 @@ urlpatterns = [
     path('auth/token/', views.token_exchange, name='token_exchange'),
     path('test/', views.test_view, name='test_view'),
     path('pesticides/', views.pesticides_list, name='pesticides_list'),
+    path('pesticides/changes/', views.pesticides_changes, name='pesticides_changes'),
+    path('pesticides/batch/', views.pesticides_batch, name='pesticides_batch'),
+    path('pesticides/stats/', views.pesticides_stats, name='pesticides_stats'),
+    path('pesticides/export/', views.pesticides_export, name='pesticides_export'),
+    path('pesticides/search/', views.pesticides_search, name='pesticides_search'),
     path('pesticides/<int:pk>/', views.pesticide_detail, name='pesticide_detail'),
+    # Mismas vistas en versión async, para el despliegue ASGI
+    path('async/auth/token/', async_views.token_exchange, name='async_token_exchange'),
+    path('async/pesticides/', async_views.pesticides_list, name='async_pesticides_list'),
+    path('async/pesticides/<int:pk>/', async_views.pesticide_detail, name='async_pesticide_detail'),
 ] 
\ No newline at end of file
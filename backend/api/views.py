@@ -3,21 +3,37 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from functools import wraps
 import logging
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from core.authentication import KeycloakAuthentication
-from core.keycloak import KeycloakService
+from core.keycloak import KeycloakService, service_account_tokens
+from core.log import debug_enabled
+from core.metrics import serialization_timer
 from rest_framework import status
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from django.conf import settings
 import requests
 import jwt
 import json
-from .models import Pesticide
-from .serializers import PesticideSerializer
+from .models import Pesticide, PesticideStat
+from .serializers import PesticideChangeFastSerializer, PesticideFastSerializer, PesticideSerializer
+from .renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer, ParquetRenderer
+from .export import ExportUnavailable, accepts_gzip, stream_pesticides
+from .batch import parse_batch
+from .filters import filter_pesticides, order_by_fields, parse_ordering
+from .pagination import ChangesPagination, UncountedOffsetPagination, get_paginator
+from .search import MIN_QUERY_LENGTH, search_pesticides
+from .conditional import (
+    pesticide_detail_etag, pesticides_condition, pesticides_export_etag, pesticides_list_etag,
+)
+from .response_cache import cache_pesticide_response
 
 logger = logging.getLogger(__name__)
 
+PESTICIDE_RENDERERS = [FastJSONRenderer, BrowsableAPIRenderer]
+
 # Create your views here.
 
 def require_authentication(view_func):
@@ -36,6 +52,41 @@ def keycloak_auth_class(client_id=None):
         {'expected_client': client_id}
     )
 
+def serialize_rows(queryset, fast_serializer=PesticideFastSerializer):
+    """Serializa todas las filas del queryset (rápido o con DRF, como serialize_page)"""
+    if getattr(settings, 'PESTICIDES_FAST_SERIALIZER', True):
+        return fast_serializer.serialize(fast_serializer.rows(queryset))
+    return fast_serializer.serializer_class(queryset, many=True).data
+
+def serialize_page(paginator, queryset, request, fast_serializer=PesticideFastSerializer):
+    """
+    Pagina y serializa. Con PESTICIDES_FAST_SERIALIZER se leen tuplas con
+    values_list() en lugar de instancias y el serializador de DRF.
+    """
+    if getattr(settings, 'PESTICIDES_FAST_SERIALIZER', True):
+        rows = fast_serializer.rows(queryset, *getattr(paginator, 'extra_fields', ()))
+        page = paginator.paginate_queryset(rows, request)
+        with serialization_timer(request):
+            data = fast_serializer.serialize(page)
+        return paginator.get_paginated_response(data)
+    page = paginator.paginate_queryset(queryset, request)
+    with serialization_timer(request):
+        data = fast_serializer.serializer_class(page, many=True).data
+    return paginator.get_paginated_response(data)
+
+async def aserialize_page(paginator, queryset, request, fast_serializer=PesticideFastSerializer):
+    """Igual que `serialize_page`, con el ORM asíncrono"""
+    if getattr(settings, 'PESTICIDES_FAST_SERIALIZER', True):
+        rows = fast_serializer.rows(queryset, *getattr(paginator, 'extra_fields', ()))
+        page = await paginator.apaginate_queryset(rows, request)
+        with serialization_timer(request):
+            data = fast_serializer.serialize(page)
+        return paginator.get_paginated_response(data)
+    page = await paginator.apaginate_queryset(queryset, request)
+    with serialization_timer(request):
+        data = fast_serializer.serializer_class(page, many=True).data
+    return paginator.get_paginated_response(data)
+
 @api_view(['POST'])
 @authentication_classes([keycloak_auth_class('frontintegration')])
 @permission_classes([IsAuthenticated])
@@ -53,51 +104,30 @@ def token_exchange(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        subject_token = auth_header.split(' ')[1]
-        
-        # Decodificar el token para obtener la información del usuario
-        token_info = jwt.decode(subject_token, options={"verify_signature": False})
-        username = token_info.get('preferred_username')
+        # El token ya fue verificado por KeycloakAuthentication
+        username = request.user.token_info.get('preferred_username')
         
         logger.info(f"Iniciando intercambio de token para usuario: {username}")
 
-        # Preparar la petición de intercambio de token
-        token_url = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}/protocol/openid-connect/token"
-        
-        exchange_data = {
-            'grant_type': 'client_credentials',
-            'client_id': settings.KEYCLOAK_CLIENT_ID,
-            'client_secret': settings.KEYCLOAK_CLIENT_SECRET,
-            'scope': 'openid'
-        }
-
-        logger.debug("Realizando intercambio de token...")
-        logger.debug(f"Token URL: {token_url}")
-        logger.debug(f"Exchange data: {json.dumps({k:v for k,v in exchange_data.items() if k != 'client_secret'}, indent=2)}")
-
-        response = requests.post(
-            token_url,
-            data=exchange_data,
-            verify=False
-        )
-
-        if response.status_code == 200:
-            token_data = response.json()
-            logger.info("Intercambio de token exitoso")
-            logger.debug(f"Token response: {json.dumps({k:v for k,v in token_data.items() if k != 'access_token'}, indent=2)}")
-            return Response({
-                'token': token_data.get('access_token'),
-                'expires_in': token_data.get('expires_in'),
-                'token_type': token_data.get('token_type', 'Bearer')
-            })
-        else:
-            logger.error(f"Error en intercambio de token: {response.status_code}")
-            logger.error(f"Respuesta: {response.text}")
+        # El token del backend (client_credentials) es el mismo para todos los
+        # usuarios, así que se reutiliza mientras esté vigente
+        try:
+            token_data = service_account_tokens.get_token_data()
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"Error en intercambio de token: {e.response.status_code}")
+            logger.error(f"Respuesta: {e.response.text}")
             return Response(
                 {'error': 'Error en el intercambio de token'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        logger.info("Intercambio de token exitoso")
+        return Response({
+            'token': token_data.get('access_token'),
+            'expires_in': token_data.get('expires_in'),
+            'token_type': token_data.get('token_type', 'Bearer')
+        })
+
     except Exception as e:
         logger.error(f"Error en el intercambio de token: {str(e)}")
         return Response(
@@ -111,8 +141,9 @@ def token_exchange(request):
 def test_view(request):
     """Vista protegida que requiere autenticación."""
     try:
-        logger.debug("Accediendo a test_view")
-        logger.debug(f"Usuario autenticado: {request.user.user_info.get('preferred_username')}")
+        if debug_enabled(logger):
+            logger.debug("Accediendo a test_view")
+            logger.debug(f"Usuario autenticado: {request.user.user_info.get('preferred_username')}")
         
         return Response({
             'message': 'API funcionando correctamente',
@@ -130,12 +161,27 @@ def test_view(request):
 @api_view(['GET'])
 @authentication_classes([keycloak_auth_class('backintegration')])
 @permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticides_list_etag)
+@cache_pesticide_response
 def pesticides_list(request):
-    """Vista para listar todos los productos fitosanitarios."""
+    """
+    Vista para listar los productos fitosanitarios, paginada y filtrable.
+
+    Parámetros: status, category, manufacturer, last_review_date_after,
+    last_review_date_before, ordering, page_size y cursor (keyset) o
+    limit/offset (paginación por offset con total). Sin parámetros de
+    paginación retorna el arreglo completo, como antes de paginar.
+    """
     try:
-        pesticides = Pesticide.objects.all()
-        serializer = PesticideSerializer(pesticides, many=True)
-        return Response(serializer.data)
+        pesticides = filter_pesticides(Pesticide.objects.all(), request.query_params)
+        pesticides = pesticides.order_by(*order_by_fields(*parse_ordering(request.query_params)))
+
+        return serialize_page(get_paginator(request), pesticides, request)
+    except ValidationError as e:
+        return Response({'error': e.detail}, status=400)
+    except NotFound as e:
+        return Response({'error': e.detail}, status=404)
     except Exception as e:
         logger.error(f"Error en pesticides_list: {str(e)}")
         return Response({'error': str(e)}, status=500)
@@ -143,6 +189,138 @@ def pesticides_list(request):
 @api_view(['GET'])
 @authentication_classes([keycloak_auth_class('backintegration')])
 @permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticides_list_etag)
+@cache_pesticide_response
+def pesticides_search(request):
+    """
+    Búsqueda de productos por nombre, ingrediente activo y fabricante.
+
+    `q` admite prefijos y errores de tipeo ("glifo" encuentra "Glifosato 41%").
+    Los resultados vienen ordenados por relevancia y paginados con
+    limit/offset; acepta los mismos filtros que el listado.
+    """
+    try:
+        text = request.query_params.get('q', '').strip()
+        if len(text) < MIN_QUERY_LENGTH:
+            return Response(
+                {'error': f'La búsqueda debe tener al menos {MIN_QUERY_LENGTH} caracteres'},
+                status=400
+            )
+
+        pesticides = filter_pesticides(Pesticide.objects.all(), request.query_params)
+        pesticides = search_pesticides(pesticides, text)
+
+        return serialize_page(UncountedOffsetPagination(), pesticides, request)
+    except ValidationError as e:
+        return Response({'error': e.detail}, status=400)
+    except Exception as e:
+        logger.error(f"Error en pesticides_search: {str(e)}")
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@authentication_classes([keycloak_auth_class('backintegration')])
+@permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticides_list_etag)
+@cache_pesticide_response
+def pesticides_stats(request):
+    """
+    Cantidad de productos vigentes por estado, categoría, fabricante y por
+    mes y año de la última revisión. Se lee de la tabla de resumen
+    PesticideStat, sin recorrer los productos.
+    """
+    try:
+        return Response(PesticideStat.summary())
+    except Exception as e:
+        logger.error(f"Error en pesticides_stats: {str(e)}")
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@authentication_classes([keycloak_auth_class('backintegration')])
+@permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticides_list_etag)
+@cache_pesticide_response
+def pesticides_changes(request):
+    """
+    Productos creados, modificados o borrados después del cursor `since`,
+    para sincronizar copias del registro. Los borrados vienen con
+    `deleted_at`. La respuesta trae el cursor para la siguiente llamada y
+    `has_more` si quedan cambios por leer (`page_size` como en el listado).
+    """
+    try:
+        return serialize_page(
+            ChangesPagination(), Pesticide.all_objects.all(), request,
+            fast_serializer=PesticideChangeFastSerializer,
+        )
+    except NotFound as e:
+        return Response({'error': e.detail}, status=404)
+    except Exception as e:
+        logger.error(f"Error en pesticides_changes: {str(e)}")
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@authentication_classes([keycloak_auth_class('backintegration')])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, NDJSONRenderer, CSVRenderer, ParquetRenderer])
+@pesticides_condition(pesticides_export_etag)
+def pesticides_export(request):
+    """
+    Exporta todos los productos (o los que cumplan los filtros del listado)
+    como stream, ordenados por id.
+
+    `?format=json` (arreglo, por defecto), `ndjson` (un objeto por línea),
+    `csv` o `parquet` (requiere pyarrow). Se comprime con gzip si el cliente
+    envía `Accept-Encoding: gzip`, salvo Parquet, que ya va comprimido.
+    """
+    try:
+        pesticides = filter_pesticides(Pesticide.objects.all(), request.query_params).order_by('id')
+        return stream_pesticides(pesticides, request.accepted_renderer.format, gzip=accepts_gzip(request))
+    except ValidationError as e:
+        return Response({'error': e.detail}, status=400)
+    except ExportUnavailable as e:
+        return Response({'error': str(e)}, status=501)
+    except Exception as e:
+        logger.error(f"Error en pesticides_export: {str(e)}")
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET', 'POST'])
+@authentication_classes([keycloak_auth_class('backintegration')])
+@permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticides_list_etag)
+@cache_pesticide_response
+def pesticides_batch(request):
+    """
+    Detalle de varios productos en una sola consulta.
+
+    `?ids=1,2,3` o `?registration_numbers=A,B`; para listas largas, POST con
+    `{"ids": [...]}` o `{"registration_numbers": [...]}`. `results` viene
+    indexado por el identificador pedido, con null para los no encontrados,
+    que además se listan en `not_found`.
+    """
+    try:
+        field, identifiers = parse_batch(request)
+        pesticides = Pesticide.objects.filter(**{f'{field}__in': identifiers}).order_by()
+        found = {str(item[field]): item for item in serialize_rows(pesticides)}
+        results = {str(identifier): found.get(str(identifier)) for identifier in identifiers}
+        return Response({
+            'results': results,
+            'not_found': [key for key, item in results.items() if item is None],
+        })
+    except (ParseError, ValidationError) as e:
+        return Response({'error': e.detail}, status=400)
+    except Exception as e:
+        logger.error(f"Error en pesticides_batch: {str(e)}")
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+@authentication_classes([keycloak_auth_class('backintegration')])
+@permission_classes([IsAuthenticated])
+@renderer_classes(PESTICIDE_RENDERERS)
+@pesticides_condition(pesticide_detail_etag)
+@cache_pesticide_response
 def pesticide_detail(request, pk):
     """Vista para obtener el detalle de un producto fitosanitario."""
     try:
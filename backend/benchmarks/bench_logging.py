@@ -0,0 +1,138 @@
+"""
+Costo de CPU del logging por petición en el pipeline de autenticación.
+
+Cada petición pasa por el middleware de acceso (si está disponible),
+`KeycloakMiddleware` (firma, introspección y userinfo) y
+`KeycloakAuthentication` con userinfo remoto, sin cachés de introspección ni
+de userinfo. Keycloak se reemplaza por una sesión HTTP falsa y los logs se
+escriben a /dev/null, así que se mide el formateo y no la terminal.
+
+Desde backend/:
+
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --requests 5000 --modes production
+"""
+from pathlib import Path
+import argparse
+import logging
+import os
+import sys
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kcdummy.settings')
+os.environ.setdefault('KEYCLOAK_URL', 'http://keycloak.bench:8080')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from core import http as core_http  # noqa: E402
+from core.authentication import KeycloakAuthentication  # noqa: E402
+from core.jwks import jwks_cache  # noqa: E402
+from core.keycloak import _introspection_cache  # noqa: E402
+from core.middleware import KeycloakMiddleware  # noqa: E402
+from fake_keycloak import FakeSession, build_token, generate_keys  # noqa: E402
+
+try:
+    from core.log import logging_config
+    from core.middleware import AccessLogMiddleware
+except ImportError:  # árbol sin modos de logging: solo se mide la configuración de settings
+    logging_config = None
+    AccessLogMiddleware = None
+
+
+class CountingStream:
+    """Stream que descarta lo escrito y cuenta los bytes"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+
+    def flush(self):
+        pass
+
+
+def configure_logging(mode, sample_rate):
+    if mode == 'settings':
+        logging.config.dictConfig(settings.LOGGING)
+    else:
+        if sample_rate is None:
+            sample_rate = 0 if mode == 'production' else 1
+        settings.LOG_DEBUG_SAMPLE_RATE = sample_rate
+        logging.config.dictConfig(logging_config(mode, sample_rate=sample_rate))
+    stream = CountingStream()
+    for logger in [logging.getLogger()] + [logging.getLogger(name) for name in logging.root.manager.loggerDict]:
+        for handler in getattr(logger, 'handlers', []):
+            if isinstance(handler, logging.StreamHandler):
+                handler.setStream(stream)
+    return stream
+
+
+def build_pipeline():
+    authentication = KeycloakAuthentication('backintegration')
+
+    def view(request):
+        user, _ = authentication.authenticate(request)
+        request.user = user
+        return HttpResponse(b'{}', content_type='application/json')
+
+    pipeline = KeycloakMiddleware(view)
+    if AccessLogMiddleware is not None:
+        pipeline = AccessLogMiddleware(pipeline)
+    return pipeline
+
+
+def run(pipeline, token, requests_count):
+    factory = RequestFactory()
+    start = time.process_time()
+    for _ in range(requests_count):
+        _introspection_cache.clear()
+        request = factory.get('/api/pesticides/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = pipeline(request)
+        assert response.status_code == 200, response.content
+    return (time.process_time() - start) / requests_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU por petición según el modo de logging')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3, help='corridas por modo; se informa la mejor')
+    parser.add_argument(
+        '--modes', default='settings,development,production,production:100',
+        help='settings (configuración actual de settings.py), development, production; '
+             'production:N muestrea el debug de 1 de cada N peticiones',
+    )
+    args = parser.parse_args()
+
+    private_key, jwks = generate_keys()
+    issuer = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}"
+    token, claims = build_token(private_key, issuer)
+
+    core_http._session = FakeSession(issuer, jwks, claims)
+    jwks_cache.load(jwks)
+    settings.KEYCLOAK_USERINFO_REMOTE = True
+    settings.KEYCLOAK_USERINFO_CACHE_TTL = 0
+
+    print(f"{'modo':<18} {'µs/petición':>12} {'bytes de log/petición':>22}")
+    for spec in args.modes.split(','):
+        mode, _, rate = spec.partition(':')
+        if mode != 'settings' and logging_config is None:
+            continue
+        stream = configure_logging(mode, int(rate) if rate else None)
+        pipeline = build_pipeline()
+        run(pipeline, token, min(200, args.requests))
+        stream.bytes = 0
+        per_request = min(run(pipeline, token, args.requests) for _ in range(args.repeat))
+        log_bytes = stream.bytes / (args.requests * args.repeat)
+        print(f"{spec:<18} {per_request * 1e6:>12.1f} {log_bytes:>22.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compara filas/segundo del serializador DRF y del serializador rápido.
+
+Uso (desde backend/):
+
+    python benchmarks/bench_serialization.py [--rows 1000 10000 100000] [--repeat 3]
+
+No necesita base de datos: parte de las tuplas que entrega el cursor y mide
+lo que ocurre después en cada camino (instancias del modelo +
+PesticideSerializer + JSONRenderer, o tuplas de values_list +
+PesticideFastSerializer + FastJSONRenderer). Verifica además que ambos
+caminos producen los mismos bytes.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kcdummy.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from api.models import Pesticide  # noqa: E402
+from api.renderers import FastJSONRenderer, orjson  # noqa: E402
+from api.serializers import PesticideFastSerializer, PesticideSerializer  # noqa: E402
+
+
+def make_rows(count):
+    statuses = [choice for choice, _ in Pesticide.STATUS_CHOICES]
+    categories = [choice for choice, _ in Pesticide.CATEGORY_CHOICES]
+    return [
+        (
+            i + 1,
+            f"Producto {i:06d} {i % 37}% SC",
+            f"SAG-{i:07d}",
+            f"Ingrediente activo {i % 300}",
+            f"Fabricante Agroquímica {i % 200}",
+            statuses[i % len(statuses)],
+            date(2020, 1, 1) + timedelta(days=i % 1500),
+            categories[i % len(categories)],
+            datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i * 37),
+        )
+        for i in range(count)
+    ]
+
+
+def drf_path(rows, fields):
+    instances = [Pesticide.from_db('default', fields, row) for row in rows]
+    data = PesticideSerializer(instances, many=True).data
+    return JSONRenderer().render(data)
+
+
+def fast_path(rows, fields):
+    row_class = namedtuple('Row', fields)
+    named = [row_class(*row) for row in rows]
+    data = PesticideFastSerializer.serialize(named)
+    return FastJSONRenderer().render(data)
+
+
+def best_time(func, rows, fields, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        content = func(rows, fields)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    fields = PesticideFastSerializer.fields()
+    print(f"Encoder JSON rápido: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"{'filas':>8} {'DRF filas/s':>14} {'rápido filas/s':>16} {'aceleración':>12}")
+    for count in args.rows:
+        rows = make_rows(count)
+        drf_time, drf_content = best_time(drf_path, rows, fields, args.repeat)
+        fast_time, fast_content = best_time(fast_path, rows, fields, args.repeat)
+        if drf_content != fast_content:
+            sys.exit(f"Las salidas difieren con {count} filas")
+        print(f"{count:>8} {count / drf_time:>14,.0f} {count / fast_time:>16,.0f} {drf_time / fast_time:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
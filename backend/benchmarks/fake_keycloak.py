@@ -0,0 +1,141 @@
+"""
+Keycloak simulado dentro del proceso para los benchmarks: llaves RS256,
+tokens del tamaño de los reales y una sesión HTTP que responde discovery,
+JWKS, userinfo e introspección sin salir a la red.
+
+Se instala reemplazando la sesión compartida de core.http:
+
+    core_http._session = FakeSession(issuer, jwks, claims)
+"""
+import json
+import time
+from cryptography.hazmat.primitives.asymmetric import rsa
+import jwt
+import requests
+
+KID = 'bench'
+
+
+def generate_keys():
+    """Llave privada RS256 y el JWKS con su llave pública"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    return private_key, {'keys': [{**jwk, 'kid': KID, 'use': 'sig', 'alg': 'RS256'}]}
+
+
+def build_token(private_key, issuer, azp='backintegration'):
+    now = int(time.time())
+    # Tamaño parecido al de un token real de Keycloak (~1 KB)
+    claims = {
+        'exp': now + 3600, 'iat': now, 'auth_time': now, 'jti': 'c0ffee00-0000-4000-8000-000000000000',
+        'iss': issuer, 'aud': ['account'], 'sub': '3f0e8c52-6b1e-4b4a-9a53-2f3b0f2a9d11',
+        'typ': 'Bearer', 'azp': azp, 'sid': '9b2f3d4e-1a2b-4c5d-8e9f-0a1b2c3d4e5f',
+        'acr': '1', 'allowed-origins': ['http://localhost:5173'],
+        'realm_access': {'roles': ['offline_access', 'uma_authorization', 'default-roles-test']},
+        'resource_access': {'account': {'roles': ['manage-account', 'manage-account-links', 'view-profile']}},
+        'scope': 'openid profile email', 'email_verified': True, 'name': 'Usuario Prueba',
+        'preferred_username': 'usuario.prueba', 'given_name': 'Usuario', 'family_name': 'Prueba',
+        'email': 'usuario.prueba@example.com', 'rut': '11111111-1',
+    }
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': KID}), claims
+
+
+def discovery_document(issuer):
+    """Documento well-known con las mismas claves y URLs que publica Keycloak"""
+    base = f"{issuer}/protocol/openid-connect"
+    return {
+        'issuer': issuer,
+        'authorization_endpoint': f"{base}/auth",
+        'token_endpoint': f"{base}/token",
+        'introspection_endpoint': f"{base}/token/introspect",
+        'userinfo_endpoint': f"{base}/userinfo",
+        'end_session_endpoint': f"{base}/logout",
+        'frontchannel_logout_session_supported': True,
+        'frontchannel_logout_supported': True,
+        'jwks_uri': f"{base}/certs",
+        'check_session_iframe': f"{base}/login-status-iframe.html",
+        'grant_types_supported': [
+            'authorization_code', 'implicit', 'refresh_token', 'password', 'client_credentials',
+            'urn:openid:params:grant-type:ciba', 'urn:ietf:params:oauth:grant-type:device_code',
+        ],
+        'acr_values_supported': ['0', '1'],
+        'response_types_supported': [
+            'code', 'none', 'id_token', 'token', 'id_token token', 'code id_token', 'code token',
+            'code id_token token',
+        ],
+        'subject_types_supported': ['public', 'pairwise'],
+        'id_token_signing_alg_values_supported': [
+            'PS384', 'ES384', 'RS384', 'HS256', 'HS512', 'ES256', 'RS256', 'HS384', 'ES512', 'PS256',
+            'PS512', 'RS512',
+        ],
+        'userinfo_signing_alg_values_supported': ['PS384', 'ES384', 'RS384', 'ES256', 'RS256', 'none'],
+        'response_modes_supported': ['query', 'fragment', 'form_post', 'query.jwt', 'fragment.jwt', 'jwt'],
+        'registration_endpoint': f"{issuer}/clients-registrations/openid-connect",
+        'token_endpoint_auth_methods_supported': [
+            'private_key_jwt', 'client_secret_basic', 'client_secret_post', 'tls_client_auth',
+            'client_secret_jwt',
+        ],
+        'claims_supported': [
+            'aud', 'sub', 'iss', 'auth_time', 'name', 'given_name', 'family_name', 'preferred_username',
+            'email', 'acr',
+        ],
+        'claim_types_supported': ['normal'],
+        'claims_parameter_supported': True,
+        'scopes_supported': [
+            'openid', 'acr', 'roles', 'profile', 'email', 'address', 'phone', 'offline_access',
+            'microprofile-jwt', 'web-origins',
+        ],
+        'request_parameter_supported': True,
+        'request_uri_parameter_supported': True,
+        'require_request_uri_registration': True,
+        'code_challenge_methods_supported': ['plain', 'S256'],
+        'tls_client_certificate_bound_access_tokens': True,
+        'revocation_endpoint': f"{base}/revoke",
+        'backchannel_logout_supported': True,
+        'backchannel_logout_session_supported': True,
+        'device_authorization_endpoint': f"{base}/auth/device",
+        'backchannel_authentication_endpoint': f"{base}/ext/ciba/auth",
+        'pushed_authorization_request_endpoint': f"{base}/ext/par/request",
+        'require_pushed_authorization_requests': False,
+        'mtls_endpoint_aliases': {
+            'token_endpoint': f"{base}/token",
+            'revocation_endpoint': f"{base}/revoke",
+            'introspection_endpoint': f"{base}/token/introspect",
+            'userinfo_endpoint': f"{base}/userinfo",
+        },
+    }
+
+
+class FakeSession:
+    """
+    Sesión HTTP que responde como Keycloak sin salir del proceso. Sirve el
+    realm de `issuer` y, si se indican, los documentos well-known de otros
+    issuers (`discovery_issuers`), p. ej. uno con URLs de localhost:8080.
+    """
+
+    def __init__(self, issuer, jwks, claims, discovery_issuers=()):
+        base = f"{issuer}/protocol/openid-connect"
+        userinfo = {key: claims[key] for key in ('sub', 'preferred_username', 'email', 'name', 'rut')}
+        self.routes = {
+            f"{base}/certs": jwks,
+            f"{base}/userinfo": userinfo,
+            f"{base}/token/introspect": {'active': True, **claims},
+        }
+        for name in (issuer, *discovery_issuers):
+            self.routes[f"{name}/.well-known/openid-configuration"] = discovery_document(name)
+        # Cuerpos ya serializados, como los recibiría requests
+        self.bodies = {url: json.dumps(body).encode('utf-8') for url, body in self.routes.items()}
+
+    def _response(self, url):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['Content-Type'] = 'application/json'
+        response._content = self.bodies[url]
+        return response
+
+    def get(self, url, **kwargs):
+        return self._response(url)
+
+    def post(self, url, **kwargs):
+        return self._response(url)
@@ -0,0 +1,189 @@
+"""
+Mini arnés de microbenchmarks con la misma forma que pytest-benchmark, sin
+depender de él: cada benchmark es una función `bench_*(benchmark)` que
+llama `benchmark(func, *args)` (o `benchmark.pedantic(...)` cuando cada
+ronda necesita preparación fuera del tiempo medido).
+
+Los resultados se guardan en JSON con un esquema parecido al de
+pytest-benchmark (`benchmarks[].stats` con min/max/mean/median/stddev, en
+segundos) y `compare` marca las regresiones contra un baseline guardado.
+"""
+from datetime import datetime, timezone
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+SCHEMA_VERSION = 1
+# Una ronda dura al menos esto; las funciones más rápidas se repiten dentro de la ronda
+MIN_ROUND_TIME = 0.002
+MAX_ROUNDS = 10000
+
+
+class SkipBenchmark(Exception):
+    """El benchmark no puede correr en este entorno (p. ej. sin base de datos)"""
+
+
+class Benchmark:
+    """
+    Fixture que recibe cada `bench_*`. Calibra las iteraciones por ronda y
+    la cantidad de rondas para que la medición dure al menos `min_time`
+    segundos y tenga al menos `min_rounds` rondas.
+    """
+
+    def __init__(self, min_time=0.5, min_rounds=5, max_time=10.0):
+        self.min_time = min_time
+        self.min_rounds = min_rounds
+        self.max_time = max_time
+        self.timings = None
+        self.iterations = 1
+
+    def _rounds(self, round_time):
+        rounds = min(math.ceil(self.min_time / round_time), int(self.max_time / round_time), MAX_ROUNDS)
+        return max(rounds, self.min_rounds)
+
+    def __call__(self, func, *args, **kwargs):
+        # Calentamiento y estimación del tiempo de una llamada
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        once = max(time.perf_counter() - start, 1e-9)
+
+        iterations = math.ceil(MIN_ROUND_TIME / once)
+        loop = range(iterations)
+        timings = []
+        for _ in range(self._rounds(once * iterations)):
+            start = time.perf_counter()
+            for _ in loop:
+                func(*args, **kwargs)
+            timings.append((time.perf_counter() - start) / iterations)
+        self.timings = timings
+        self.iterations = iterations
+        return result
+
+    def pedantic(self, target, args=(), kwargs=None, setup=None, rounds=None, warmup_rounds=1):
+        """
+        Una llamada por ronda. `setup`, si se indica, corre antes de cada
+        ronda sin medirse y puede retornar `(args, kwargs)` para `target`.
+        """
+        def prepare():
+            if setup is None:
+                return args, kwargs or {}
+            prepared = setup()
+            return prepared if prepared is not None else (args, kwargs or {})
+
+        result = None
+        for _ in range(warmup_rounds):
+            call_args, call_kwargs = prepare()
+            result = target(*call_args, **call_kwargs)
+
+        timings = []
+        deadline = time.perf_counter() + self.max_time
+        while True:
+            call_args, call_kwargs = prepare()
+            start = time.perf_counter()
+            result = target(*call_args, **call_kwargs)
+            timings.append(time.perf_counter() - start)
+            if rounds is not None:
+                if len(timings) >= rounds:
+                    break
+            elif len(timings) >= self.min_rounds and (
+                sum(timings) >= self.min_time or time.perf_counter() >= deadline
+            ):
+                break
+        self.timings = timings
+        self.iterations = 1
+        return result
+
+    def stats(self):
+        timings = self.timings
+        mean = statistics.fmean(timings)
+        quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [timings[0]] * 3
+        return {
+            'min': min(timings),
+            'max': max(timings),
+            'mean': mean,
+            'median': statistics.median(timings),
+            'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            'iqr': quartiles[2] - quartiles[0],
+            'rounds': len(timings),
+            'iterations': self.iterations,
+            'ops': 1 / mean if mean > 0 else 0.0,
+        }
+
+
+def machine_info():
+    return {
+        'python_implementation': platform.python_implementation(),
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def commit_info(cwd):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd, capture_output=True,
+            text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    return {'id': commit, 'dirty': dirty}
+
+
+def build_report(results, cwd):
+    return {
+        'version': SCHEMA_VERSION,
+        'datetime': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine_info': machine_info(),
+        'commit_info': commit_info(cwd),
+        'benchmarks': results,
+    }
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(baseline, current, threshold, stat='median'):
+    """
+    Compara `stat` de cada benchmark presente en ambos reportes. Retorna
+    las filas (nombre, baseline, actual, cambio en %, regresión) y la
+    lista de regresiones: benchmarks más lentos que el baseline en más de
+    `threshold` por ciento.
+    """
+    previous = {bench['name']: bench['stats'][stat] for bench in baseline['benchmarks']}
+    rows = []
+    regressions = []
+    for bench in current['benchmarks']:
+        name = bench['name']
+        if name not in previous:
+            continue
+        before, after = previous[name], bench['stats'][stat]
+        change = (after - before) / before * 100 if before > 0 else 0.0
+        regressed = change > threshold
+        rows.append((name, before, after, change, regressed))
+        if regressed:
+            regressions.append(name)
+    return rows, regressions
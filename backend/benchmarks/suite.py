@@ -0,0 +1,282 @@
+"""
+Microbenchmarks de los caminos calientes de autenticación y de datos.
+
+- auth: `KeycloakAuthentication.authenticate` (claims locales y userinfo
+  remoto), decode/verificación de tokens RS256 de tamaño real y el
+  procesamiento del documento well-known (`_transform_url`,
+  `_transform_config`, `_get_well_known_config`, `_fetch_well_known_config`).
+  Keycloak se reemplaza por una sesión HTTP falsa: no se sale a la red.
+- data: `PesticideSerializer` y el serializador rápido a 1k/10k/100k filas
+  (sin base de datos) y el comando `load_pesticides` con distintos
+  `--batch-size` (necesita PostgreSQL; cada ronda se revierte).
+
+Desde backend/:
+
+    python benchmarks/suite.py                          # todo
+    python benchmarks/suite.py -k auth                  # filtra por nombre o grupo
+    python benchmarks/suite.py --json results.json      # guarda los resultados
+    python benchmarks/suite.py --compare baseline.json --threshold 10
+
+Con `--compare` el comando termina con código 1 si algún benchmark quedó
+más lento que el baseline en más de `--threshold` por ciento (mediana por
+defecto, `--compare-stat` para otra estadística).
+"""
+from io import StringIO
+from pathlib import Path
+import argparse
+import csv
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kcdummy.settings')
+os.environ.setdefault('KEYCLOAK_URL', 'http://keycloak.bench:8080')
+# Los logs de debug no son parte de lo que se mide
+os.environ.setdefault('LOG_MODE', 'production')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import DatabaseError, connection, transaction  # noqa: E402
+from django.test import RequestFactory, override_settings  # noqa: E402
+import jwt  # noqa: E402
+from api.bulk_load import FIELDS  # noqa: E402
+from api.serializers import PesticideFastSerializer  # noqa: E402
+from core import http as core_http  # noqa: E402
+from core.authentication import KeycloakAuthentication  # noqa: E402
+from core.jwks import jwks_cache  # noqa: E402
+from core.keycloak import KeycloakService, _discovery_cache  # noqa: E402
+from bench_serialization import drf_path, fast_path, make_rows  # noqa: E402
+from fake_keycloak import FakeSession, build_token, discovery_document, generate_keys  # noqa: E402
+from harness import Benchmark, SkipBenchmark, build_report, compare, format_time, load_report, save_report  # noqa: E402
+
+BENCHMARKS = []
+# Filas del CSV que carga bench_load_pesticides (--load-rows)
+LOAD_ROWS = 20000
+
+
+def case(group, **params):
+    """
+    Registra un benchmark del grupo `group`. Con un parámetro
+    (`rows=[...]`) corre una vez por valor, como `pytest.mark.parametrize`.
+    """
+    def decorator(func):
+        BENCHMARKS.append((group, func, params))
+        return func
+    return decorator
+
+
+class AuthFixture:
+    """Realm falso compartido por los benchmarks de autenticación"""
+
+    _instance = None
+
+    def __init__(self):
+        self.issuer = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}"
+        self.local_issuer = f"http://localhost:8080/realms/{settings.KEYCLOAK_REALM}"
+        self.private_key, jwks = generate_keys()
+        self.public_key = self.private_key.public_key()
+        self.token, claims = build_token(self.private_key, self.issuer)
+        core_http._session = FakeSession(self.issuer, jwks, claims, discovery_issuers=[self.local_issuer])
+        jwks_cache.load(jwks)
+        self.request = RequestFactory().get('/api/pesticides/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+
+@case('auth')
+def bench_authenticate_local_claims(benchmark):
+    fixture = AuthFixture.get()
+    authentication = KeycloakAuthentication('backintegration')
+    with override_settings(KEYCLOAK_USERINFO_REMOTE=False):
+        user, _ = benchmark(authentication.authenticate, fixture.request)
+    assert user.token_info['azp'] == 'backintegration'
+
+
+@case('auth')
+def bench_authenticate_remote_userinfo(benchmark):
+    # Sin caché de userinfo: cada llamada pasa por la sesión HTTP y json()
+    fixture = AuthFixture.get()
+    authentication = KeycloakAuthentication('backintegration')
+    with override_settings(KEYCLOAK_USERINFO_REMOTE=True, KEYCLOAK_USERINFO_CACHE_TTL=0):
+        user, _ = benchmark(authentication.authenticate, fixture.request)
+    assert user.user_info['rut'] == '11111111-1'
+
+
+@case('auth')
+def bench_jwt_decode_rs256(benchmark):
+    fixture = AuthFixture.get()
+    claims = benchmark(
+        jwt.decode, fixture.token, fixture.public_key, algorithms=['RS256'], options={'verify_aud': False},
+    )
+    assert claims['iss'] == fixture.issuer
+
+
+@case('auth')
+def bench_verify_token(benchmark):
+    fixture = AuthFixture.get()
+    claims = benchmark(KeycloakAuthentication('backintegration')._verify_token, fixture.token)
+    assert claims['azp'] == 'backintegration'
+
+
+@case('auth')
+def bench_transform_url(benchmark):
+    fixture = AuthFixture.get()
+    url = f"{fixture.local_issuer}/protocol/openid-connect/certs"
+    assert benchmark(KeycloakService()._transform_url, url).startswith('http://keycloak:8080/')
+
+
+@case('auth')
+def bench_transform_config(benchmark):
+    fixture = AuthFixture.get()
+    config = benchmark(KeycloakService()._transform_config, discovery_document(fixture.local_issuer))
+    assert config['jwks_uri'].startswith('http://keycloak:8080/')
+
+
+@case('auth')
+def bench_get_well_known_config_cached(benchmark):
+    AuthFixture.get()
+    _discovery_cache.clear()
+    config = benchmark(KeycloakService()._get_well_known_config)
+    assert 'jwks_uri' in config
+
+
+@case('auth')
+def bench_fetch_well_known_config(benchmark):
+    # Descarga (falsa), json() y transformación de un documento con URLs de localhost:8080
+    fixture = AuthFixture.get()
+    url = f"{fixture.local_issuer}/.well-known/openid-configuration"
+    config, _ = benchmark(KeycloakService()._fetch_well_known_config, url)
+    assert config['token_endpoint'].startswith('http://keycloak:8080/')
+
+
+@case('data', rows=[1000, 10000, 100000])
+def bench_serialize_drf(benchmark, rows):
+    content = benchmark(drf_path, make_rows(rows), PesticideFastSerializer.fields())
+    assert content.startswith(b'[')
+
+
+@case('data', rows=[1000, 10000, 100000])
+def bench_serialize_fast(benchmark, rows):
+    content = benchmark(fast_path, make_rows(rows), PesticideFastSerializer.fields())
+    assert content.startswith(b'[')
+
+
+def write_load_csv(path, count):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for (_, name, registration_number, ingredient, manufacturer, status, review, category, _) in make_rows(count):
+            writer.writerow([
+                f"BENCH-{registration_number}", name, ingredient, manufacturer, status,
+                review.isoformat(), category,
+            ])
+
+
+def load_and_rollback(path, batch_size):
+    with transaction.atomic():
+        call_command('load_pesticides', path, batch_size=batch_size, stdout=StringIO(), stderr=StringIO())
+        transaction.set_rollback(True)
+
+
+@case('data', batch_size=[500, 5000, 50000])
+def bench_load_pesticides(benchmark, batch_size):
+    try:
+        connection.ensure_connection()
+    except DatabaseError as e:
+        raise SkipBenchmark(f"sin base de datos ({e.__class__.__name__})")
+    if connection.vendor != 'postgresql':
+        raise SkipBenchmark('load_pesticides usa COPY y necesita PostgreSQL')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'pesticides.csv')
+        write_load_csv(path, LOAD_ROWS)
+        benchmark.pedantic(load_and_rollback, args=(path, batch_size))
+
+
+def selected_cases(keyword, overrides):
+    for group, func, params in BENCHMARKS:
+        name = func.__name__
+        if not params:
+            variants = [(name, {})]
+        else:
+            (param, values), = params.items()
+            values = overrides.get(param) or values
+            variants = [(f"{name}[{value}]", {param: value}) for value in values]
+        for fullname, kwargs in variants:
+            if keyword and keyword not in fullname and keyword != group:
+                continue
+            yield group, func, fullname, kwargs
+
+
+def print_results(results):
+    print(f"{'benchmark':<44} {'min':>11} {'mediana':>11} {'media':>11} {'desv.':>11} {'rondas':>7} {'ops/s':>11}")
+    for result in results:
+        stats = result['stats']
+        print(
+            f"{result['name']:<44} {format_time(stats['min']):>11} {format_time(stats['median']):>11} "
+            f"{format_time(stats['mean']):>11} {format_time(stats['stddev']):>11} {stats['rounds']:>7} "
+            f"{stats['ops']:>11,.1f}"
+        )
+
+
+def print_comparison(rows, threshold, stat):
+    print(f"\nComparación con el baseline ({stat}, umbral {threshold:g}%)")
+    print(f"{'benchmark':<44} {'baseline':>11} {'actual':>11} {'cambio':>9}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESIÓN' if regressed else ''
+        print(f"{name:<44} {format_time(before):>11} {format_time(after):>11} {change:>+8.1f}%{flag}")
+
+
+def main():
+    global LOAD_ROWS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', dest='keyword', help='corre solo los benchmarks cuyo nombre contiene el texto, o el grupo')
+    parser.add_argument('--min-time', type=float, default=0.5, help='segundos mínimos de medición por benchmark')
+    parser.add_argument('--min-rounds', type=int, default=5)
+    parser.add_argument('--max-time', type=float, default=10.0, help='segundos máximos por benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', help='filas para los benchmarks de serialización')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', help='valores de --batch-size para load_pesticides')
+    parser.add_argument('--load-rows', type=int, default=20000, help='filas del CSV de load_pesticides')
+    parser.add_argument('--json', metavar='PATH', help='guarda los resultados en JSON')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON de una corrida anterior')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regresión tolerada en %% (con --compare)')
+    parser.add_argument('--compare-stat', default='median', choices=['min', 'median', 'mean'])
+    args = parser.parse_args()
+    LOAD_ROWS = args.load_rows
+
+    baseline = load_report(args.compare) if args.compare else None
+    overrides = {'rows': args.rows, 'batch_size': args.batch_sizes}
+    results = []
+    for group, func, name, kwargs in selected_cases(args.keyword, overrides):
+        benchmark = Benchmark(min_time=args.min_time, min_rounds=args.min_rounds, max_time=args.max_time)
+        try:
+            func(benchmark, **kwargs)
+        except SkipBenchmark as e:
+            print(f"{name}: omitido, {e}", file=sys.stderr)
+            continue
+        results.append({'group': group, 'name': name, 'params': kwargs, 'stats': benchmark.stats()})
+
+    print_results(results)
+    report = build_report(results, BACKEND_DIR)
+    if args.json:
+        save_report(report, args.json)
+        print(f"\nResultados guardados en {args.json}")
+    if baseline is not None:
+        rows, regressions = compare(baseline, report, args.threshold, args.compare_stat)
+        print_comparison(rows, args.threshold, args.compare_stat)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} regresión(es) sobre {args.threshold:g}%: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,29 @@
 from rest_framework import authentication, exceptions
 from django.conf import settings
+from django.http import JsonResponse
+from functools import wraps
 from .keycloak import KeycloakService
+from .keycloak_async import AsyncKeycloakService, async_jwks
+from .jwks import jwks_cache
+from .metrics import timed_authentication
 import logging
 import jwt
 from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# Claims estándar de OIDC que el endpoint userinfo también retornaría
+USERINFO_CLAIMS = (
+    'sub',
+    'preferred_username',
+    'email',
+    'email_verified',
+    'name',
+    'given_name',
+    'family_name',
+    'rut',
+)
+
 class KeycloakAuthentication(authentication.BaseAuthentication):
     def __init__(self, expected_client=None):
         # Si no se especifica un cliente, usar el del backend
@@ -18,56 +35,171 @@ class KeycloakAuthentication(authentication.BaseAuthentication):
         # Retorna solo el path, que debería ser /realms/test
         return parsed.path
 
-    def authenticate(self, request):
+    def _verify_token(self, token):
+        """
+        Verifica localmente la firma y los claims del token contra las llaves
+        publicadas por el realm, sin llamar a Keycloak por cada petición.
+        """
+        header = jwt.get_unverified_header(token)
+        return self._decode(token, header, jwks_cache.get_signing_key(header.get('kid')))
+
+    async def _averify_token(self, token):
+        """Igual que `_verify_token`, descargando las llaves sin bloquear"""
+        header = jwt.get_unverified_header(token)
+        return self._decode(token, header, await async_jwks.aget_signing_key(header.get('kid')))
+
+    def _decode(self, token, header, signing_key):
+        if signing_key is None:
+            logger.error(f"No signing key found for kid {header.get('kid')}")
+            raise exceptions.AuthenticationFailed('Unknown token signing key')
+
+        token_info = jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=getattr(settings, 'KEYCLOAK_JWT_ALGORITHMS', ['RS256', 'ES256']),
+            options={
+                'verify_aud': False,
+                'require': ['exp', 'iat'],
+            }
+        )
+
+        # El hostname del issuer cambia entre el frontend y la red interna
+        expected_issuer = f"/realms/{settings.KEYCLOAK_REALM}"
+        if self._normalize_issuer(token_info.get('iss', '')) != expected_issuer:
+            logger.error(f"Unexpected token issuer: {token_info.get('iss')}")
+            raise exceptions.AuthenticationFailed('Invalid token issuer')
+
+        # Validar el cliente (azp)
+        token_client = token_info.get('azp')
+        if self.expected_client and token_client != self.expected_client:
+            logger.error(f"Token not issued for expected client. Expected {self.expected_client}, got {token_client}")
+            raise exceptions.AuthenticationFailed('Invalid token client')
+
+        return token_info
+
+    def _user_info_from_claims(self, token_info):
+        """Construye la información del usuario a partir de los claims del token"""
+        return {
+            claim: token_info[claim]
+            for claim in USERINFO_CLAIMS
+            if claim in token_info
+        }
+
+    def _get_remote_user_info(self, token, token_info):
+        """Consulta el endpoint userinfo (solo si KEYCLOAK_USERINFO_REMOTE está activo)"""
+        keycloak_service = KeycloakService()
+        try:
+            return keycloak_service.get_userinfo(token, token_info)
+        except Exception as e:
+            # Si falla userinfo, usar la información del token
+            logger.warning(f"Failed to get userinfo, using token info: {str(e)}")
+            return self._user_info_from_claims(token_info)
+
+    async def _aget_remote_user_info(self, token, token_info):
+        try:
+            return await AsyncKeycloakService().aget_userinfo(token, token_info)
+        except Exception as e:
+            logger.warning(f"Failed to get userinfo, using token info: {str(e)}")
+            return self._user_info_from_claims(token_info)
+
+    def _get_token(self, request):
+        """Token Bearer del header Authorization, o None si no hay"""
         auth_header = request.headers.get('Authorization')
         if not auth_header:
             logger.debug("No Authorization header found")
             return None
 
+        auth_type, token = auth_header.split(' ')
+        if auth_type.lower() != 'bearer':
+            logger.error("Invalid authorization type")
+            return None
+        return token
+
+    def _build_user(self, token_info, user_info):
+        # Crear un usuario anónimo con la información del token
+        return type('AnonymousUser', (), {
+            'is_authenticated': True,
+            'token_info': token_info,
+            'user_info': user_info
+        })
+
+    def _authentication_failed(self, error):
+        """Traduce un error de la validación a AuthenticationFailed"""
+        if isinstance(error, exceptions.AuthenticationFailed):
+            return error
+        if isinstance(error, jwt.ExpiredSignatureError):
+            logger.error("Token has expired")
+            return exceptions.AuthenticationFailed('Token has expired')
+        if isinstance(error, jwt.InvalidTokenError):
+            logger.error(f"Invalid token: {str(error)}")
+            return exceptions.AuthenticationFailed('Invalid token format')
+        logger.error(f"Authentication error: {str(error)}")
+        return exceptions.AuthenticationFailed(str(error))
+
+    @timed_authentication
+    def authenticate(self, request):
         try:
-            auth_type, token = auth_header.split(' ')
-            if auth_type.lower() != 'bearer':
-                logger.error("Invalid authorization type")
+            token = self._get_token(request)
+            if token is None:
                 return None
 
             logger.debug("Validating token...")
-            token_info = jwt.decode(
-                token,
-                options={"verify_signature": False}
-            )
-
-            # Validar el cliente (azp)
-            token_client = token_info.get('azp')
-            if self.expected_client and token_client != self.expected_client:
-                logger.error(f"Token not issued for expected client. Expected {self.expected_client}, got {token_client}")
-                raise exceptions.AuthenticationFailed('Invalid token client')
-
-            # Obtener información del usuario sin validar el issuer
-            keycloak_service = KeycloakService()
-            try:
-                user_info = keycloak_service.get_userinfo(token)
-            except Exception as e:
-                # Si falla userinfo, intentar obtener la información del token
-                logger.warning(f"Failed to get userinfo, using token info: {str(e)}")
-                user_info = {
-                    'sub': token_info.get('sub'),
-                    'preferred_username': token_info.get('preferred_username'),
-                    'email': token_info.get('email'),
-                    'name': token_info.get('name')
-                }
-
-            # Crear un usuario anónimo con la información del token
-            user = type('AnonymousUser', (), {
-                'is_authenticated': True,
-                'token_info': token_info,
-                'user_info': user_info
-            })
-
-            return (user, None)
-
-        except jwt.InvalidTokenError as e:
-            logger.error(f"Invalid token: {str(e)}")
-            raise exceptions.AuthenticationFailed('Invalid token format')
+            token_info = self._verify_token(token)
+
+            if getattr(settings, 'KEYCLOAK_USERINFO_REMOTE', False):
+                user_info = self._get_remote_user_info(token, token_info)
+            else:
+                user_info = self._user_info_from_claims(token_info)
+
+            return (self._build_user(token_info, user_info), None)
+        except Exception as e:
+            raise self._authentication_failed(e)
+
+    @timed_authentication
+    async def aauthenticate(self, request):
+        """
+        Versión asíncrona de `authenticate`, para vistas async: las llaves y
+        userinfo se obtienen con el cliente asíncrono, sin ocupar un hilo.
+        """
+        try:
+            token = self._get_token(request)
+            if token is None:
+                return None
+
+            logger.debug("Validating token...")
+            token_info = await self._averify_token(token)
+
+            if getattr(settings, 'KEYCLOAK_USERINFO_REMOTE', False):
+                user_info = await self._aget_remote_user_info(token, token_info)
+            else:
+                user_info = self._user_info_from_claims(token_info)
+
+            return (self._build_user(token_info, user_info), None)
         except Exception as e:
-            logger.error(f"Authentication error: {str(e)}")
-            raise exceptions.AuthenticationFailed(str(e)) 
\ No newline at end of file
+            raise self._authentication_failed(e)
+
+
+def _forbidden(detail):
+    return JsonResponse({'detail': str(detail)}, status=403, json_dumps_params={'separators': (',', ':')})
+
+
+def async_authentication(expected_client=None):
+    """
+    Decorador de vistas async de Django que autentica con
+    `KeycloakAuthentication.aauthenticate` y deja el usuario en
+    `request.user`. Sin credenciales o con un token inválido responde 403
+    con `detail`, igual que las vistas de DRF con esta autenticación.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                result = await KeycloakAuthentication(expected_client).aauthenticate(request)
+            except exceptions.AuthenticationFailed as e:
+                return _forbidden(e.detail)
+            if result is None:
+                return _forbidden(exceptions.NotAuthenticated.default_detail)
+            request.user = result[0]
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,208 @@
+from collections import OrderedDict
+from django.core.cache import caches
+import hashlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Cachés registradas por nombre, para reportar sus contadores
+_registry = {}
+
+
+def token_cache_key(token):
+    """Clave de caché derivada de un token; el token nunca se guarda en claro"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class TTLCache:
+    """
+    Caché LRU en memoria con vencimiento por entrada, segura entre hilos.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Elimina las entradas cuya clave cumple `predicate`"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    Caché de dos niveles: un TTLCache local del proceso y, opcionalmente, un
+    backend del framework de caché de Django (`backend` es el alias en
+    CACHES) para compartir resultados entre workers.
+
+    Si el backend compartido falla, la caché sigue funcionando solo en local.
+    """
+
+    def __init__(self, name, maxsize=1024, backend=None):
+        self.name = name
+        self.local = TTLCache(maxsize)
+        self.backend = backend or None
+        self.shared_hits = 0
+        _registry[name] = self
+
+    @property
+    def shared(self):
+        if self.backend is None:
+            return None
+        return caches[self.backend]
+
+    def _shared_key(self, key):
+        return f"kcdummy:{self.name}:{key}"
+
+    def _from_shared(self, key, item):
+        """Copia al nivel local una entrada vigente del compartido"""
+        if item is None:
+            return _MISSING
+        value, expires_at = item
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return _MISSING
+        self.local.set(key, value, ttl)
+        self.shared_hits += 1
+        return value
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                item = shared.get(self._shared_key(key))
+            except Exception as e:
+                logger.warning(f"Shared cache '{self.name}' unavailable: {str(e)}")
+                item = None
+            value = self._from_shared(key, item)
+            if value is not _MISSING:
+                return value
+        return default
+
+    async def aget(self, key, default=None):
+        """Igual que `get`; el nivel compartido se consulta con `aget` de Django"""
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                item = await shared.aget(self._shared_key(key))
+            except Exception as e:
+                logger.warning(f"Shared cache '{self.name}' unavailable: {str(e)}")
+                item = None
+            value = self._from_shared(key, item)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        self.local.set(key, value, ttl)
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                # Se guarda el vencimiento absoluto para que otros workers
+                # respeten el TTL restante al copiarlo a su caché local
+                shared.set(self._shared_key(key), (value, time.time() + ttl), timeout=math.ceil(ttl))
+            except Exception as e:
+                logger.warning(f"Shared cache '{self.name}' unavailable: {str(e)}")
+
+    async def aset(self, key, value, ttl):
+        """Igual que `set`; el nivel compartido se escribe con `aset` de Django"""
+        if ttl <= 0:
+            return
+        self.local.set(key, value, ttl)
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                await shared.aset(self._shared_key(key), (value, time.time() + ttl), timeout=math.ceil(ttl))
+            except Exception as e:
+                logger.warning(f"Shared cache '{self.name}' unavailable: {str(e)}")
+
+    def delete(self, key):
+        self.local.delete(key)
+
+        shared = self.shared
+        if shared is not None:
+            try:
+                shared.delete(self._shared_key(key))
+            except Exception as e:
+                logger.warning(f"Shared cache '{self.name}' unavailable: {str(e)}")
+
+    def clear(self):
+        """Vacía el nivel local (el compartido vence por TTL)"""
+        self.local.clear()
+
+    def stats(self):
+        hits = self.local.hits
+        # Un acierto en el nivel compartido fue antes un fallo en el local
+        misses = self.local.misses - self.shared_hits
+        lookups = hits + self.shared_hits + misses
+        return {
+            'hits': hits,
+            'shared_hits': self.shared_hits,
+            'misses': misses,
+            'evictions': self.local.evictions,
+            'size': len(self.local),
+            'hit_ratio': (hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+
+def cache_stats():
+    """Contadores de todas las cachés registradas, por nombre"""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,143 @@
+from django.conf import settings
+from http.cookiejar import DefaultCookiePolicy
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from .log import debug_enabled
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """
+    Contadores del pool de conexiones hacia Keycloak.
+
+    - requests: conexiones solicitadas al pool
+    - new_connections: conexiones TCP/TLS nuevas
+    - waits: veces que el pool estaba agotado (todas las conexiones en uso)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.waits = 0
+
+    def incr(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hits': self.requests - self.new_connections,
+                'new_connections': self.new_connections,
+                'waits': self.waits,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.new_connections = 0
+            self.waits = 0
+
+
+pool_stats = PoolStats()
+
+
+class _InstrumentedPoolMixin:
+    def _get_conn(self, timeout=None):
+        pool_stats.incr('requests')
+        if self.pool is not None and self.pool.empty():
+            pool_stats.incr('waits')
+        return super()._get_conn(timeout=timeout)
+
+    def _new_conn(self):
+        pool_stats.incr('new_connections')
+        return super()._new_conn()
+
+
+class InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter cuyos pools registran sus estadísticas en `pool_stats`"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': InstrumentedHTTPConnectionPool,
+            'https': InstrumentedHTTPSConnectionPool,
+        }
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    session.verify = settings.KEYCLOAK_VERIFY_SSL
+    # La sesión se comparte entre usuarios: nunca guardar cookies
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    retry = Retry(
+        total=getattr(settings, 'KEYCLOAK_HTTP_RETRIES', 3),
+        backoff_factor=0.1,
+        status_forcelist=[500, 502, 503, 504]
+    )
+    adapter = PooledHTTPAdapter(
+        pool_connections=getattr(settings, 'KEYCLOAK_HTTP_POOL_CONNECTIONS', 10),
+        pool_maxsize=getattr(settings, 'KEYCLOAK_HTTP_POOL_MAXSIZE', 20),
+        pool_block=getattr(settings, 'KEYCLOAK_HTTP_POOL_BLOCK', False),
+        max_retries=retry,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if debug_enabled(logger):
+        logger.debug(f"Created pooled Keycloak session (maxsize={adapter._pool_maxsize}, block={adapter._pool_block})")
+    return session
+
+
+def get_session():
+    """
+    Retorna la sesión HTTP del proceso, compartida entre hilos, para que las
+    llamadas a Keycloak reutilicen conexiones keep-alive.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_timeout():
+    """Timeout (connect, read) para las llamadas a Keycloak"""
+    return (
+        getattr(settings, 'KEYCLOAK_HTTP_CONNECT_TIMEOUT', 2),
+        getattr(settings, 'KEYCLOAK_HTTP_READ_TIMEOUT', 5),
+    )
+
+
+def get_pool_stats():
+    return pool_stats.snapshot()
+
+
+def close_session():
+    """Cierra la sesión compartida (p. ej. al cambiar la configuración)"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
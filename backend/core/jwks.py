@@ -0,0 +1,146 @@
+from django.conf import settings
+import jwt
+import logging
+import threading
+import time
+from .keycloak import KeycloakService
+from .log import debug_enabled
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSCache:
+    """
+    Caché de las llaves públicas del realm, compartida por todo el proceso.
+
+    Las llaves se indexan por `kid`. Pasado `KEYCLOAK_JWKS_TTL` se siguen
+    usando mientras un hilo en segundo plano las refresca; pasado
+    `KEYCLOAK_JWKS_MAX_STALE` se vuelven a descargar de forma síncrona.
+    Un `kid` desconocido fuerza una descarga inmediata (limitada por
+    `KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL` para no amplificar tokens basura).
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._jwks = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        # Aparte de _lock, que se mantiene durante la descarga: marcar el
+        # refresco en curso nunca debe esperar a Keycloak
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'KEYCLOAK_JWKS_TTL', 300)
+
+    @property
+    def max_stale(self):
+        return getattr(settings, 'KEYCLOAK_JWKS_MAX_STALE', 3600)
+
+    @property
+    def min_refetch_interval(self):
+        return getattr(settings, 'KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL', 10)
+
+    def _age(self):
+        if self._fetched_at is None:
+            return None
+        return time.monotonic() - self._fetched_at
+
+    def _fetch(self):
+        """Descarga el JWKS y reemplaza las llaves en caché"""
+        self.load(KeycloakService().get_jwks())
+
+    def load(self, jwks):
+        """Reemplaza las llaves en caché por las del JWKS `jwks`"""
+        keys = {}
+        raw = {}
+        for jwk in jwks.get('keys', []):
+            kid = jwk.get('kid')
+            # Keycloak publica también llaves de cifrado (use=enc), que no sirven para firmas
+            if not kid or jwk.get('use', 'sig') != 'sig':
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError as e:
+                logger.warning(f"Skipping unsupported JWK {kid}: {str(e)}")
+                continue
+            raw[kid] = jwk
+
+        self._keys = keys
+        self._jwks = raw
+        self._fetched_at = time.monotonic()
+        if debug_enabled(logger):
+            logger.debug(f"JWKS refreshed, kids: {list(keys)}")
+
+    def _fetch_locked(self, force=False):
+        """
+        Descarga el JWKS bajo el lock; las peticiones concurrentes esperan a
+        una sola descarga en lugar de lanzar una cada una.
+        """
+        fetched_at = self._fetched_at
+        with self._lock:
+            if self._fetched_at != fetched_at:
+                # Otro hilo completó la descarga mientras esperábamos
+                return
+            if force and self._age() is not None and self._age() < self.min_refetch_interval:
+                return
+            self._fetch()
+
+    def _refresh_in_background(self):
+        try:
+            self._fetch_locked()
+        except Exception as e:
+            logger.warning(f"Background JWKS refresh failed: {str(e)}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
+
+    def _claim_refresh(self):
+        """Marca el refresco en segundo plano como en curso; False si otro hilo ya lo inició"""
+        with self._refresh_lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def _schedule_refresh(self):
+        if not self._claim_refresh():
+            return
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def _ensure_fresh(self):
+        age = self._age()
+        if age is None or age >= self.max_stale:
+            self._fetch_locked()
+        elif age >= self.ttl:
+            self._schedule_refresh()
+
+    def get_signing_key(self, kid):
+        """Retorna la llave (`jwt.PyJWK`) para el `kid`, o None si el realm no la publica"""
+        self._ensure_fresh()
+        key = self._keys.get(kid)
+        if key is None:
+            logger.info(f"Unknown kid {kid}, refetching JWKS")
+            self._fetch_locked(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def lookup(self, kid):
+        """Llave en caché para el `kid`, sin comprobar vigencia ni descargar"""
+        return self._keys.get(kid)
+
+    def get_jwk(self, kid):
+        """Igual que `get_signing_key`, pero retorna el JWK como diccionario"""
+        if self.get_signing_key(kid) is None:
+            return None
+        return self._jwks.get(kid)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._jwks = {}
+            self._fetched_at = None
+
+
+jwks_cache = JWKSCache()
@@ -1,61 +1,511 @@
 from django.conf import settings
 import requests
 from datetime import datetime, timedelta
+import copy
 import json
 import logging
 import os
+import re
+import threading
+import time
 from urllib.parse import urlparse, urlunparse
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 import jwt
+from .http import get_session, get_timeout
+from .cache import TieredCache, token_cache_key
+from .log import debug_enabled
+from .metrics import keycloak_call
 
 logger = logging.getLogger(__name__)
 
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+class SingleFlightTimeout(TimeoutError):
+    """Se agotó la espera por el resultado de una llamada en curso"""
+
+
+class _Call:
+    """Llamada en curso compartida entre los hilos que piden la misma clave"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _copy_error(error):
+    """
+    Copia de la excepción del líder para relanzarla en otro hilo: relanzar el
+    mismo objeto desde varios hilos mezclaría sus tracebacks.
+    """
+    if not isinstance(error, Exception):
+        # KeyboardInterrupt, SystemExit, etc. solo afectan al hilo del líder
+        return RuntimeError(f"In-flight call aborted: {error!r}")
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+_DEFAULT = object()
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: el primer hilo (líder)
+    ejecuta la función y el resto espera su resultado. Si la función falla,
+    cada hilo en espera recibe una copia de la excepción (mismo tipo y
+    atributos) encadenada a la original.
+
+    `timeout` acota en segundos cuánto espera un hilo por el resultado de
+    otro (None: sin límite), o es una función que lo retorna en cada espera;
+    puede cambiarse por llamada en `do`. Al agotarse se lanza
+    SingleFlightTimeout solo en ese hilo.
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=_DEFAULT):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if timeout is _DEFAULT:
+                timeout = self.timeout
+            return self._wait(key, call, timeout() if callable(timeout) else timeout)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _wait(self, key, call, timeout):
+        if not call.event.wait(timeout):
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call {key}")
+        if call.error is None:
+            return call.result
+        error = _copy_error(call.error)
+        if error is call.error:
+            raise error
+        raise error from call.error
+
+    def stats(self):
+        """Llamadas ejecutadas y llamadas que se sumaron a una en curso"""
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared, 'in_flight': len(self._calls)}
+
+
+class _DiscoveryCache:
+    """
+    Caché de documentos well-known compartida por todo el proceso.
+
+    Un documento vencido se sigue sirviendo mientras un hilo en segundo plano
+    lo refresca; solo el primer arranque (sin documento) bloquea, y las
+    peticiones concurrentes de ese arranque comparten una sola descarga.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, url, loader):
+        """`loader` retorna una tupla (documento, ttl en segundos)"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return self._flight.do(url, lambda: self._load(url, loader))
+
+        config, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._schedule_refresh(url, loader)
+        return config
+
+    def peek(self, url):
+        """Retorna (documento, vencido) sin descargar; (None, True) si no hay documento"""
+        entry = self._entries.get(url)
+        if entry is None:
+            return None, True
+        config, expires_at = entry
+        return config, time.monotonic() >= expires_at
+
+    def store(self, url, config, ttl):
+        self._entries[url] = (config, time.monotonic() + ttl)
+
+    def claim_refresh(self, url):
+        """Marca `url` como en refresco; False si otro ya lo está refrescando"""
+        with self._lock:
+            if url in self._refreshing:
+                return False
+            self._refreshing.add(url)
+            return True
+
+    def release_refresh(self, url):
+        with self._lock:
+            self._refreshing.discard(url)
+
+    def _load(self, url, loader):
+        entry = self._entries.get(url)
+        if entry is not None:
+            return entry[0]
+        config, ttl = loader()
+        self.store(url, config, ttl)
+        return config
+
+    def _schedule_refresh(self, url, loader):
+        if self.claim_refresh(url):
+            threading.Thread(target=self._refresh, args=(url, loader), daemon=True).start()
+
+    def _refresh(self, url, loader):
+        try:
+            config, ttl = loader()
+            self.store(url, config, ttl)
+        except Exception as e:
+            logger.warning(f"Background well-known refresh failed, serving stale config: {str(e)}")
+        finally:
+            self.release_refresh(url)
+
+    def clear(self):
+        self._entries.clear()
+
+
+_discovery_cache = _DiscoveryCache()
+
+
+def _discovery_ttl(response):
+    """
+    TTL del documento well-known: el max-age de Cache-Control (acotado por
+    KEYCLOAK_DISCOVERY_TTL). Con no-cache/no-store se usa
+    KEYCLOAK_DISCOVERY_MIN_TTL para no volver a poner la descarga en cada petición.
+    """
+    max_ttl = getattr(settings, 'KEYCLOAK_DISCOVERY_TTL', 3600)
+    min_ttl = getattr(settings, 'KEYCLOAK_DISCOVERY_MIN_TTL', 60)
+    cache_control = response.headers.get('Cache-Control', '').lower()
+
+    if 'no-store' in cache_control or 'no-cache' in cache_control:
+        return min(min_ttl, max_ttl)
+    match = MAX_AGE_RE.search(cache_control)
+    if match:
+        return min(int(match.group(1)), max_ttl)
+    return max_ttl
+
+
+_introspection_cache = TieredCache(
+    'introspection',
+    maxsize=getattr(settings, 'KEYCLOAK_INTROSPECTION_CACHE_SIZE', 10000),
+    backend=getattr(settings, 'KEYCLOAK_CACHE_BACKEND', None),
+)
+
+
+def _introspection_ttl(token_info):
+    """
+    Tiempo que puede reutilizarse un resultado de introspección: hasta el
+    `exp` del token, acotado por KEYCLOAK_INTROSPECTION_CACHE_TTL. Los tokens
+    inactivos se guardan KEYCLOAK_INTROSPECTION_NEGATIVE_TTL.
+    """
+    if not token_info.get('active', False):
+        return getattr(settings, 'KEYCLOAK_INTROSPECTION_NEGATIVE_TTL', 60)
+
+    ttl = getattr(settings, 'KEYCLOAK_INTROSPECTION_CACHE_TTL', 60)
+    exp = token_info.get('exp')
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    return ttl
+
+
+def single_flight_timeout():
+    """Segundos que una petición espera por una llamada a Keycloak en curso de otra"""
+    return getattr(settings, 'KEYCLOAK_SINGLE_FLIGHT_TIMEOUT', 10)
+
+
+# Llamadas por token en curso (userinfo, introspección), compartidas entre hilos
+keycloak_calls = SingleFlight(timeout=single_flight_timeout)
+
+
+def coalesced_call_key(endpoint, token):
+    """Clave de una llamada a `endpoint` con `token` (solo su hash)"""
+    return f"{endpoint}:{token_cache_key(token)}"
+
+
+class _UserInfoCache:
+    """
+    Caché de respuestas userinfo indexada por (`sub`, `sid` o `iat`), de modo
+    que los tokens de una misma sesión la comparten. Cada `sub` tiene una
+    generación que `invalidate` incrementa; al formar parte de la clave,
+    invalida también las entradas del resto de los workers.
+
+    La clave sale de los claims que el llamador ya verificó (firma, emisor,
+    vencimiento), nunca del payload sin verificar del token: sin claims la
+    respuesta no se guarda.
+    """
+
+    def __init__(self):
+        self.backend = getattr(settings, 'KEYCLOAK_CACHE_BACKEND', None)
+        self.cache = TieredCache(
+            'userinfo',
+            maxsize=getattr(settings, 'KEYCLOAK_USERINFO_CACHE_SIZE', 10000),
+            backend=self.backend,
+        )
+        self._generations = {}
+
+    def _generation(self, sub):
+        shared = self.cache.shared
+        if shared is not None:
+            try:
+                return shared.get(f"kcdummy:userinfo-gen:{sub}", 0)
+            except Exception as e:
+                logger.warning(f"Shared cache 'userinfo' unavailable: {str(e)}")
+        return self._generations.get(sub, 0)
+
+    async def _ageneration(self, sub):
+        shared = self.cache.shared
+        if shared is not None:
+            try:
+                return await shared.aget(f"kcdummy:userinfo-gen:{sub}", 0)
+            except Exception as e:
+                logger.warning(f"Shared cache 'userinfo' unavailable: {str(e)}")
+        return self._generations.get(sub, 0)
+
+    def _session(self, claims):
+        """(sub, sesión) de los claims, o None si no permiten indexar la caché"""
+        if claims is None:
+            return None
+        sub = claims.get('sub')
+        session = claims.get('sid') or claims.get('iat')
+        if not sub or not session:
+            return None
+        return sub, session
+
+    def _ttl(self, claims):
+        ttl = getattr(settings, 'KEYCLOAK_USERINFO_CACHE_TTL', 300)
+        exp = claims.get('exp')
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        return ttl
+
+    def _lookup(self, claims):
+        """Retorna (clave, información en caché); la clave es None si no se puede indexar"""
+        session = self._session(claims)
+        if session is None:
+            return None, None
+
+        sub, sid = session
+        key = f"{sub}:{self._generation(sub)}:{sid}"
+        user_info = self.cache.get(key)
+        if user_info is not None:
+            logger.debug("Userinfo cache hit")
+        return key, user_info
+
+    async def _alookup(self, claims):
+        """Igual que `_lookup`, sin bloquear en el nivel compartido"""
+        session = self._session(claims)
+        if session is None:
+            return None, None
+
+        sub, sid = session
+        key = f"{sub}:{await self._ageneration(sub)}:{sid}"
+        user_info = await self.cache.aget(key)
+        if user_info is not None:
+            logger.debug("Userinfo cache hit")
+        return key, user_info
+
+    def get_or_fetch(self, token, claims, fetch):
+        """`claims` son los claims verificados de `token`"""
+        key, user_info = self._lookup(claims)
+        if user_info is not None:
+            return user_info
+
+        user_info = fetch(token)
+        if key is not None:
+            self.cache.set(key, user_info, self._ttl(claims))
+        return user_info
+
+    async def aget_or_fetch(self, token, claims, fetch):
+        """Igual que `get_or_fetch`, con una corrutina `fetch`"""
+        key, user_info = await self._alookup(claims)
+        if user_info is not None:
+            return user_info
+
+        user_info = await fetch(token)
+        if key is not None:
+            await self.cache.aset(key, user_info, self._ttl(claims))
+        return user_info
+
+    def invalidate(self, sub):
+        """Descarta la información en caché de un usuario (p. ej. tras editar su perfil)"""
+        self._generations[sub] = self._generations.get(sub, 0) + 1
+        self.cache.local.delete_where(lambda key: key.startswith(f"{sub}:"))
+
+        shared = self.cache.shared
+        if shared is not None:
+            gen_key = f"kcdummy:userinfo-gen:{sub}"
+            try:
+                shared.add(gen_key, 0, timeout=None)
+                shared.incr(gen_key)
+            except Exception as e:
+                logger.warning(f"Shared cache 'userinfo' unavailable: {str(e)}")
+
+
+_userinfo_cache = _UserInfoCache()
+
+
+class ServiceAccountTokenManager:
+    """
+    Token client_credentials del backend, compartido por todo el proceso.
+
+    El token se reutiliza hasta `KEYCLOAK_SERVICE_TOKEN_REFRESH_MARGIN`
+    segundos antes de su `expires_in`; dentro de ese margen se sigue
+    entregando mientras un hilo en segundo plano lo renueva. Solo cuando no
+    hay token vigente se bloquea, y las peticiones concurrentes esperan a
+    una sola renovación.
+    """
+
+    def __init__(self):
+        self.token_data = None
+        self.expires_at = None
+        self.lifetime = 0
+        self._lock = threading.Lock()
+        # Aparte de _lock, que se mantiene durante la descarga: marcar el
+        # refresco en curso nunca debe esperar a Keycloak
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    @property
+    def refresh_margin(self):
+        # Con tokens de vida corta, renovar a la mitad de su vida
+        margin = getattr(settings, 'KEYCLOAK_SERVICE_TOKEN_REFRESH_MARGIN', 30)
+        return min(margin, self.lifetime / 2)
+
+    def _remaining(self):
+        if self.token_data is None:
+            return 0
+        return self.expires_at - time.time()
+
+    def _with_remaining(self, remaining):
+        # expires_in refleja lo que le queda al token, no su vida total
+        return {**self.token_data, 'expires_in': int(remaining)}
+
+    def store(self, token_data, requested_at):
+        """Guarda un token pedido en `requested_at` (epoch)"""
+        self.lifetime = token_data.get('expires_in', 0)
+        self.expires_at = requested_at + self.lifetime
+        self.token_data = token_data
+
+    def _fetch(self):
+        requested_at = time.time()
+        self.store(KeycloakService().request_service_account_token(), requested_at)
+
+    def _fetch_if_needed(self):
+        with self._lock:
+            if self._remaining() > self.refresh_margin:
+                return
+            self._fetch()
+
+    def _claim_refresh(self):
+        """Marca el refresco en segundo plano como en curso; False si otro hilo ya lo inició"""
+        with self._refresh_lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def _refresh_in_background(self):
+        try:
+            self._fetch_if_needed()
+        except Exception as e:
+            logger.warning(f"Background service account token refresh failed: {str(e)}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
+
+    def get_token_data(self):
+        """Respuesta del token endpoint con `expires_in` actualizado"""
+        remaining = self._remaining()
+        if remaining > self.refresh_margin:
+            return self._with_remaining(remaining)
+
+        if remaining > 0:
+            if self._claim_refresh():
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return self._with_remaining(remaining)
+
+        self._fetch_if_needed()
+        return self._with_remaining(self._remaining())
+
+    def clear(self):
+        with self._lock:
+            self.token_data = None
+            self.expires_at = None
+            self.lifetime = 0
+
+
+service_account_tokens = ServiceAccountTokenManager()
+
+
+def invalidate_user_info(sub):
+    """Hook para invalidar la información de usuario en caché de `sub`"""
+    _userinfo_cache.invalidate(sub)
+
+
 class KeycloakService:
     def __init__(self):
         # Debug de variables de entorno
-        logger.debug("Environment variables:")
-        logger.debug(f"KEYCLOAK_URL from env: {os.getenv('KEYCLOAK_URL')}")
-        logger.debug(f"KEYCLOAK_URL from settings: {settings.KEYCLOAK_URL}")
+        if debug_enabled(logger):
+            logger.debug("Environment variables:")
+            logger.debug(f"KEYCLOAK_URL from env: {os.getenv('KEYCLOAK_URL')}")
+            logger.debug(f"KEYCLOAK_URL from settings: {settings.KEYCLOAK_URL}")
         
         # Transformar la URL del servidor antes de asignarla
         self.server_url = self._transform_url(settings.KEYCLOAK_URL)
         self.realm = settings.KEYCLOAK_REALM
         self.client_id = settings.KEYCLOAK_CLIENT_ID
         self.client_secret = settings.KEYCLOAK_CLIENT_SECRET
-        self.token_info = None
-        self.token_expires_at = None
         self.verify = settings.KEYCLOAK_VERIFY_SSL
+        self.timeout = get_timeout()
         
         # Parse the server URL to ensure it's valid
         parsed_url = urlparse(self.server_url)
-        logger.debug(f"Parsed URL components: {parsed_url}")
-        
         if not parsed_url.netloc:
             raise ValueError(f"Invalid server URL: {self.server_url}")
         
-        logger.debug("KeycloakService configuration:")
-        logger.debug(f"Original server_url: {settings.KEYCLOAK_URL}")
-        logger.debug(f"Transformed server_url: {self.server_url}")
-        logger.debug(f"realm: {self.realm}")
-        logger.debug(f"client_id: {self.client_id}")
-        logger.debug(f"verify: {self.verify}")
+        if debug_enabled(logger):
+            logger.debug(f"Parsed URL components: {parsed_url}")
+            logger.debug("KeycloakService configuration:")
+            logger.debug(f"Original server_url: {settings.KEYCLOAK_URL}")
+            logger.debug(f"Transformed server_url: {self.server_url}")
+            logger.debug(f"realm: {self.realm}")
+            logger.debug(f"client_id: {self.client_id}")
+            logger.debug(f"verify: {self.verify}")
+
+    @property
+    def token_info(self):
+        """Respuesta del último token del service account obtenido por el proceso"""
+        return service_account_tokens.token_data
+
+    @property
+    def token_expires_at(self):
+        return service_account_tokens.expires_at
 
     def _get_session(self):
-        """Crea una sesión HTTP con retry y timeout"""
-        session = requests.Session()
-        session.verify = self.verify
-
-        retry = Retry(
-            total=3,
-            backoff_factor=0.1,
-            status_forcelist=[500, 502, 503, 504]
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        
-        return session
+        """Retorna la sesión HTTP compartida (pool de conexiones con retry)"""
+        return get_session()
 
     def _transform_url(self, url):
         """
@@ -65,8 +515,10 @@ class KeycloakService:
             return url
             
         parsed = urlparse(url)
-        logger.debug(f"Transforming URL: {url}")
-        logger.debug(f"Parsed components: scheme={parsed.scheme}, netloc={parsed.netloc}, path={parsed.path}")
+        debug = debug_enabled(logger)
+        if debug:
+            logger.debug(f"Transforming URL: {url}")
+            logger.debug(f"Parsed components: scheme={parsed.scheme}, netloc={parsed.netloc}, path={parsed.path}")
         
         if parsed.netloc == 'localhost:8080':
             # Construir nueva URL con el hostname correcto
@@ -78,22 +530,44 @@ class KeycloakService:
                 parsed.query,
                 parsed.fragment
             ))
-            logger.debug(f"Transformed URL from {url} to {transformed}")
+            if debug:
+                logger.debug(f"Transformed URL from {url} to {transformed}")
             return transformed
         return url
 
+    def _well_known_url(self):
+        return f"{self.server_url}/realms/{self.realm}/.well-known/openid-configuration"
+
+    def _transform_config(self, config):
+        """Transforma todas las URLs de la configuración well-known"""
+        transformed_config = {}
+        for key, value in config.items():
+            if isinstance(value, str) and 'http' in value:
+                transformed_config[key] = self._transform_url(value)
+            else:
+                transformed_config[key] = value
+        return transformed_config
+
     def _get_well_known_config(self):
         """
-        Obtiene la configuración well-known y transforma las URLs
+        Obtiene la configuración well-known (desde la caché del proceso)
+        """
+        url = self._well_known_url()
+        return _discovery_cache.get(url, lambda: self._fetch_well_known_config(url))
+
+    def _fetch_well_known_config(self, url):
+        """
+        Descarga la configuración well-known y transforma las URLs.
+        Retorna la configuración y el TTL con que debe guardarse.
         """
         try:
-            url = f"{self.server_url}/realms/{self.realm}/.well-known/openid-configuration"
-            logger.debug(f"Fetching well-known config from: {url}")
+            if debug_enabled(logger):
+                logger.debug(f"Fetching well-known config from: {url}")
             
             session = self._get_session()
             
             try:
-                response = session.get(url, timeout=5)  # Añadir timeout explícito
+                response = keycloak_call('discovery', session.get, url, timeout=self.timeout)  # Añadir timeout explícito
                 response.raise_for_status()
             except requests.exceptions.RequestException as e:
                 logger.error(f"Failed to fetch well-known config: {str(e)}")
@@ -102,46 +576,92 @@ class KeycloakService:
                 raise
             
             config = response.json()
-            logger.debug(f"Original well-known config: {json.dumps(config, indent=2)}")
             
             # Transformar todas las URLs en la configuración
-            transformed_config = {}
-            for key, value in config.items():
-                if isinstance(value, str) and 'http' in value:
-                    transformed_config[key] = self._transform_url(value)
-                else:
-                    transformed_config[key] = value
-            
-            logger.debug(f"Transformed well-known config: {json.dumps(transformed_config, indent=2)}")
-            return transformed_config
+            transformed_config = self._transform_config(config)
+            
+            if debug_enabled(logger):
+                logger.debug(f"Transformed well-known config: {json.dumps(transformed_config)}")
+            return transformed_config, _discovery_ttl(response)
         except Exception as e:
             logger.error(f"Error fetching well-known config: {str(e)}")
             logger.error(f"Current server_url: {self.server_url}")
             logger.error(f"Full error details: {repr(e)}")
             raise
 
+    def get_jwks(self):
+        """
+        Obtiene el JSON Web Key Set publicado por el realm (jwks_uri)
+        """
+        try:
+            config = self._get_well_known_config()
+            url = config['jwks_uri']
+
+            if debug_enabled(logger):
+                logger.debug(f"Fetching JWKS from: {url}")
+
+            session = self._get_session()
+
+            try:
+                response = keycloak_call('jwks', session.get, url, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Failed to fetch JWKS: {str(e)}")
+                logger.error(f"URL attempted: {url}")
+                raise
+
+            return response.json()
+        except Exception as e:
+            logger.error(f"Error fetching JWKS: {str(e)}")
+            raise
+
     def introspect_token(self, token):
-        """Introspección del token para validar su estado."""
+        """
+        Introspección del token para validar su estado. Los resultados se
+        guardan en caché indexados por el hash del token.
+        """
+        cache_key = token_cache_key(token)
+        token_info = _introspection_cache.get(cache_key)
+        if token_info is not None:
+            logger.debug("Introspection cache hit")
+            return token_info
+
+        # Las peticiones concurrentes con el mismo token comparten la llamada
+        return keycloak_calls.do(
+            coalesced_call_key('introspection', token),
+            lambda: self._introspect_and_cache(token, cache_key),
+        )
+
+    def _introspect_and_cache(self, token, cache_key):
+        token_info = self._introspect_token(token)
+        _introspection_cache.set(cache_key, token_info, _introspection_ttl(token_info))
+        return token_info
+
+    def _introspect_token(self, token):
+        """Consulta el endpoint de introspección de Keycloak"""
         try:
             # Obtener la configuración y usar la URL transformada
             config = self._get_well_known_config()
             url = config['introspection_endpoint']
             
-            logger.debug(f"Introspecting token at URL: {url}")
-            logger.debug(f"Using server_url: {self.server_url}")
-            logger.debug(f"Request data: client_id={self.client_id}")
+            if debug_enabled(logger):
+                logger.debug(f"Introspecting token at URL: {url}")
+                logger.debug(f"Using server_url: {self.server_url}")
+                logger.debug(f"Request data: client_id={self.client_id}")
             
             session = self._get_session()
             
             try:
-                response = session.post(
+                response = keycloak_call(
+                    'introspection',
+                    session.post,
                     url,
                     data={
                         'token': token,
                         'client_id': self.client_id,
                         'client_secret': self.client_secret
                     },
-                    timeout=5  # Añadir timeout explícito
+                    timeout=self.timeout
                 )
                 response.raise_for_status()
             except requests.exceptions.RequestException as e:
@@ -156,21 +676,34 @@ class KeycloakService:
             logger.error(f"Full error details: {repr(e)}")
             raise
 
-    def get_user_info(self, token):
+    def get_user_info(self, token, claims=None):
+        """
+        Obtiene la información del usuario (desde la caché si está disponible).
+        `claims` son los claims ya verificados del token; sin ellos no se usa la caché.
+        """
+        return _userinfo_cache.get_or_fetch(token, claims, self._coalesced_user_info)
+
+    def _coalesced_user_info(self, token):
+        return keycloak_calls.do(coalesced_call_key('userinfo', token), lambda: self._fetch_user_info(token))
+
+    def _fetch_user_info(self, token):
         try:
             # Obtener la configuración y usar la URL transformada
             config = self._get_well_known_config()
             url = config['userinfo_endpoint']
             
-            logger.debug(f"Getting user info from: {url}")
+            if debug_enabled(logger):
+                logger.debug(f"Getting user info from: {url}")
             
             session = self._get_session()
             
             try:
-                response = session.get(
+                response = keycloak_call(
+                    'userinfo',
+                    session.get,
                     url,
                     headers={'Authorization': f'Bearer {token}'},
-                    timeout=5  # Añadir timeout explícito
+                    timeout=self.timeout
                 )
                 response.raise_for_status()
             except requests.exceptions.RequestException as e:
@@ -185,24 +718,33 @@ class KeycloakService:
             raise
 
     def get_service_account_token(self):
+        """Retorna el access token del service account (desde la caché del proceso)"""
+        return service_account_tokens.get_token_data()['access_token']
+
+    def request_service_account_token(self):
+        """Solicita un token nuevo con el grant client_credentials"""
         try:
             # Obtener la configuración y usar la URL transformada
             config = self._get_well_known_config()
             url = config['token_endpoint']
             
-            logger.debug(f"Getting service account token from: {url}")
+            if debug_enabled(logger):
+                logger.debug(f"Getting service account token from: {url}")
             
             session = self._get_session()
             
             try:
-                response = session.post(
+                response = keycloak_call(
+                    'token',
+                    session.post,
                     url,
                     data={
                         'grant_type': 'client_credentials',
                         'client_id': self.client_id,
                         'client_secret': self.client_secret,
+                        'scope': 'openid',
                     },
-                    timeout=5  # Añadir timeout explícito
+                    timeout=self.timeout
                 )
                 response.raise_for_status()
             except requests.exceptions.RequestException as e:
@@ -213,36 +755,49 @@ class KeycloakService:
             
             token_data = response.json()
             logger.debug("Service account token obtained successfully")
-            return token_data['access_token']
+            return token_data
         except Exception as e:
             logger.error(f"Error getting service account token: {str(e)}")
             raise
 
-    def get_userinfo(self, token):
+    def get_userinfo(self, token, claims=None):
         """
-        Obtiene la información del usuario usando el endpoint userinfo de Keycloak
+        Obtiene la información del usuario usando el endpoint userinfo de
+        Keycloak (desde la caché si está disponible). `claims` son los claims
+        ya verificados del token; sin ellos no se usa la caché.
         """
+        return _userinfo_cache.get_or_fetch(token, claims, self._coalesced_userinfo)
+
+    def _coalesced_userinfo(self, token):
+        return keycloak_calls.do(coalesced_call_key('userinfo', token), lambda: self._fetch_userinfo(token))
+
+    def _fetch_userinfo(self, token):
         try:
             session = self._get_session()
             userinfo_url = f"{self.server_url}/realms/{self.realm}/protocol/openid-connect/userinfo"
             
-            # Decodificar el token para debug
-            try:
-                token_data = jwt.decode(token, options={"verify_signature": False})
-                logger.debug(f"Token claims for userinfo: {json.dumps(token_data, indent=2)}")
-            except Exception as e:
-                logger.warning(f"Could not decode token for debug: {e}")
+            debug = debug_enabled(logger)
+            if debug:
+                # Decodificar el token para debug
+                try:
+                    token_data = jwt.decode(token, options={"verify_signature": False})
+                    logger.debug(f"Token claims for userinfo: {json.dumps(token_data)}")
+                except Exception as e:
+                    logger.warning(f"Could not decode token for debug: {e}")
+                logger.debug(f"Requesting userinfo from: {userinfo_url}")
 
-            logger.debug(f"Requesting userinfo from: {userinfo_url}")
-            response = session.get(
+            response = keycloak_call(
+                'userinfo',
+                session.get,
                 userinfo_url,
                 headers={'Authorization': f'Bearer {token}'},
-                timeout=5
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
                 user_info = response.json()
-                logger.debug(f"Userinfo response: {json.dumps(user_info, indent=2)}")
+                if debug:
+                    logger.debug(f"Userinfo response: {json.dumps(user_info)}")
                 return user_info
             else:
                 logger.error(f"Error getting userinfo: {response.status_code}")
@@ -0,0 +1,394 @@
+"""
+Cliente asíncrono de Keycloak, para el despliegue ASGI.
+
+Hace las mismas llamadas que `KeycloakService` (discovery, JWKS, userinfo,
+introspección y token del service account) sobre un `httpx.AsyncClient` con
+pool de conexiones keep-alive, así una petición que espera a Keycloak no
+ocupa un hilo. Comparte con el camino síncrono las cachés del proceso: un
+documento, llave o token obtenido por uno sirve al otro.
+"""
+from django.conf import settings
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import asyncio
+import httpx
+import logging
+import threading
+import time
+import weakref
+from .cache import token_cache_key
+from .http import get_timeout
+from .jwks import jwks_cache
+from .log import debug_enabled
+from .metrics import akeycloak_call
+from .keycloak import (
+    KeycloakService,
+    SingleFlightTimeout,
+    _discovery_cache,
+    _discovery_ttl,
+    _introspection_cache,
+    _introspection_ttl,
+    _userinfo_cache,
+    coalesced_call_key,
+    service_account_tokens,
+    single_flight_timeout,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mismos reintentos que la sesión síncrona (urllib3 Retry)
+RETRY_STATUSES = (500, 502, 503, 504)
+RETRY_BACKOFF = 0.1
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _AsyncSingleFlight:
+    """
+    Equivalente de `SingleFlight` para corrutinas: la primera llamada con
+    una clave lanza la corrutina como tarea y el resto espera esa misma
+    tarea (su resultado o su excepción). Si quien la lanzó se cancela o deja
+    de esperar por `timeout`, la tarea sigue para los demás. Las llamadas se
+    registran por event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = weakref.WeakKeyDictionary()
+
+    def _loop_calls(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._calls.get(loop)
+            if calls is None:
+                calls = self._calls[loop] = {}
+            return calls
+
+    async def do(self, key, fn, timeout=None):
+        calls = self._loop_calls()
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(calls, key, done))
+        if timeout is None:
+            return await asyncio.shield(task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for in-flight call {key}")
+
+    @staticmethod
+    def _finish(calls, key, task):
+        if calls.get(key) is task:
+            del calls[key]
+        if not task.cancelled():
+            # Marca la excepción como leída aunque nadie quede esperando
+            task.exception()
+
+
+_flight = _AsyncSingleFlight()
+
+# Referencias a las tareas en segundo plano, para que no se recolecten antes de terminar
+_background_tasks = set()
+
+
+def _spawn(coro):
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _build_client():
+    connect_timeout, read_timeout = get_timeout()
+    maxsize = getattr(settings, 'KEYCLOAK_ASYNC_POOL_MAXSIZE', 100)
+    # Sin un límite menor de keep-alive: cerrar las conexiones sobrantes obliga a reabrirlas en cada pico
+    limits = httpx.Limits(max_connections=maxsize, max_keepalive_connections=maxsize)
+    client = httpx.AsyncClient(
+        verify=settings.KEYCLOAK_VERIFY_SSL,
+        limits=limits,
+        # Esperar una conexión libre del pool cuenta como lectura
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        # El cliente se comparte entre usuarios: nunca guardar cookies
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+    if debug_enabled(logger):
+        logger.debug(f"Created async Keycloak client (max_connections={limits.max_connections})")
+    return client
+
+
+def get_async_client():
+    """
+    Retorna el cliente HTTP del event loop actual. Las conexiones de httpx
+    quedan ligadas al loop en que se abrieron, así que cada loop (el del
+    servidor ASGI o uno temporal de `async_to_sync`) tiene su propio pool.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = _build_client()
+    return client
+
+
+async def aclose_client():
+    """Cierra el cliente del event loop actual (p. ej. al apagar el servidor)"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncKeycloakService(KeycloakService):
+    """
+    Versión asíncrona de `KeycloakService`. Los métodos llevan el prefijo `a`
+    (como el ORM asíncrono de Django) y comparten las cachés del proceso.
+    """
+
+    async def _request(self, endpoint, method, url, **kwargs):
+        """Petición a Keycloak, registrada en las métricas como `endpoint`"""
+        return await akeycloak_call(endpoint, self._send, method, url, **kwargs)
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Petición con reintentos: errores de conexión siempre y errores de
+        lectura o 5xx solo en métodos idempotentes, como la sesión síncrona.
+        """
+        client = get_async_client()
+        retries = getattr(settings, 'KEYCLOAK_HTTP_RETRIES', 3)
+        idempotent = method in IDEMPOTENT_METHODS
+
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if last_attempt or not (idempotent or isinstance(e, httpx.ConnectError)):
+                    raise
+                logger.warning(f"Keycloak request failed, retrying: {str(e)}")
+            else:
+                if last_attempt or not idempotent or response.status_code not in RETRY_STATUSES:
+                    return response
+                logger.warning(f"Keycloak responded {response.status_code}, retrying")
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    async def _aget_well_known_config(self):
+        """
+        Configuración well-known desde la caché del proceso. Sin documento,
+        las peticiones concurrentes comparten una descarga; un documento
+        vencido se sigue sirviendo mientras una tarea lo refresca.
+        """
+        url = self._well_known_url()
+        config, expired = _discovery_cache.peek(url)
+        if config is None:
+            return await _flight.do(('discovery', url), lambda: self._aload_well_known_config(url))
+        if expired and _discovery_cache.claim_refresh(url):
+            _spawn(self._arefresh_well_known_config(url))
+        return config
+
+    async def _aload_well_known_config(self, url):
+        config, ttl = await self._afetch_well_known_config(url)
+        _discovery_cache.store(url, config, ttl)
+        return config
+
+    async def _arefresh_well_known_config(self, url):
+        try:
+            await self._aload_well_known_config(url)
+        except Exception as e:
+            logger.warning(f"Background well-known refresh failed, serving stale config: {str(e)}")
+        finally:
+            _discovery_cache.release_refresh(url)
+
+    async def _afetch_well_known_config(self, url):
+        """Descarga la configuración well-known; retorna (configuración, TTL)"""
+        if debug_enabled(logger):
+            logger.debug(f"Fetching well-known config from: {url}")
+        try:
+            response = await self._request('discovery', 'GET', url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to fetch well-known config from {url}: {str(e)}")
+            raise
+        return self._transform_config(response.json()), _discovery_ttl(response)
+
+    async def aget_jwks(self):
+        """JSON Web Key Set publicado por el realm (jwks_uri)"""
+        config = await self._aget_well_known_config()
+        url = config['jwks_uri']
+        if debug_enabled(logger):
+            logger.debug(f"Fetching JWKS from: {url}")
+        try:
+            response = await self._request('jwks', 'GET', url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to fetch JWKS from {url}: {str(e)}")
+            raise
+        return response.json()
+
+    async def aintrospect_token(self, token):
+        """Introspección del token, con la misma caché que `introspect_token`"""
+        cache_key = token_cache_key(token)
+        token_info = await _introspection_cache.aget(cache_key)
+        if token_info is not None:
+            logger.debug("Introspection cache hit")
+            return token_info
+
+        return await _flight.do(
+            coalesced_call_key('introspection', token),
+            lambda: self._aintrospect_and_cache(token, cache_key),
+            timeout=single_flight_timeout(),
+        )
+
+    async def _aintrospect_and_cache(self, token, cache_key):
+        token_info = await self._aintrospect_token(token)
+        await _introspection_cache.aset(cache_key, token_info, _introspection_ttl(token_info))
+        return token_info
+
+    async def _aintrospect_token(self, token):
+        config = await self._aget_well_known_config()
+        url = config['introspection_endpoint']
+        if debug_enabled(logger):
+            logger.debug(f"Introspecting token at URL: {url}")
+        try:
+            response = await self._request('introspection', 'POST', url, data={
+                'token': token,
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+            })
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to introspect token at {url}: {str(e)}")
+            raise
+        return response.json()
+
+    async def aget_userinfo(self, token, claims=None):
+        """Endpoint userinfo de Keycloak, con la misma caché que `get_userinfo`"""
+        return await _userinfo_cache.aget_or_fetch(token, claims, self._acoalesced_userinfo)
+
+    async def _acoalesced_userinfo(self, token):
+        return await _flight.do(
+            coalesced_call_key('userinfo', token),
+            lambda: self._afetch_userinfo(token),
+            timeout=single_flight_timeout(),
+        )
+
+    async def _afetch_userinfo(self, token):
+        url = f"{self.server_url}/realms/{self.realm}/protocol/openid-connect/userinfo"
+        if debug_enabled(logger):
+            logger.debug(f"Requesting userinfo from: {url}")
+        response = await self._request('userinfo', 'GET', url, headers={'Authorization': f'Bearer {token}'})
+        if response.status_code != 200:
+            logger.error(f"Error getting userinfo: {response.status_code}")
+            raise Exception(f"Failed to get userinfo: {response.status_code}")
+        return response.json()
+
+    async def arequest_service_account_token(self):
+        """Solicita un token nuevo con el grant client_credentials"""
+        config = await self._aget_well_known_config()
+        url = config['token_endpoint']
+        if debug_enabled(logger):
+            logger.debug(f"Getting service account token from: {url}")
+        try:
+            response = await self._request('token', 'POST', url, data={
+                'grant_type': 'client_credentials',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'scope': 'openid',
+            })
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to get service account token from {url}: {str(e)}")
+            raise
+        return response.json()
+
+
+class AsyncJWKS:
+    """
+    Acceso asíncrono a las llaves de `jwks_cache`, con la misma política de
+    vigencia (`KEYCLOAK_JWKS_TTL`, `KEYCLOAK_JWKS_MAX_STALE` y
+    `KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL`).
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._refreshing = False
+
+    async def _download(self):
+        self.cache.load(await AsyncKeycloakService().aget_jwks())
+
+    async def _fetch(self, force=False):
+        age = self.cache._age()
+        if force and age is not None and age < self.cache.min_refetch_interval:
+            return
+        await _flight.do('jwks', self._download)
+
+    async def _refresh_in_background(self):
+        try:
+            await self._fetch()
+        except Exception as e:
+            logger.warning(f"Background JWKS refresh failed: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    async def aget_signing_key(self, kid):
+        """Retorna la llave (`jwt.PyJWK`) para el `kid`, o None si el realm no la publica"""
+        age = self.cache._age()
+        if age is None or age >= self.cache.max_stale:
+            await self._fetch()
+        elif age >= self.cache.ttl and not self._refreshing:
+            self._refreshing = True
+            _spawn(self._refresh_in_background())
+
+        key = self.cache.lookup(kid)
+        if key is None:
+            logger.info(f"Unknown kid {kid}, refetching JWKS")
+            await self._fetch(force=True)
+            key = self.cache.lookup(kid)
+        return key
+
+
+class AsyncServiceAccountTokens:
+    """
+    Acceso asíncrono al token del service account de `service_account_tokens`:
+    mismo token y misma política de renovación anticipada.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._refreshing = False
+
+    async def _fetch(self):
+        requested_at = time.time()
+        token_data = await AsyncKeycloakService().arequest_service_account_token()
+        self.manager.store(token_data, requested_at)
+
+    async def _refresh_in_background(self):
+        try:
+            await _flight.do('service-token', self._fetch)
+        except Exception as e:
+            logger.warning(f"Background service account token refresh failed: {str(e)}")
+        finally:
+            self._refreshing = False
+
+    async def aget_token_data(self):
+        """Respuesta del token endpoint con `expires_in` actualizado"""
+        manager = self.manager
+        remaining = manager._remaining()
+        if remaining > manager.refresh_margin:
+            return manager._with_remaining(remaining)
+
+        if remaining > 0:
+            if not self._refreshing:
+                self._refreshing = True
+                _spawn(self._refresh_in_background())
+            return manager._with_remaining(remaining)
+
+        await _flight.do('service-token', self._fetch)
+        return manager._with_remaining(manager._remaining())
+
+
+async_jwks = AsyncJWKS(jwks_cache)
+async_service_account_tokens = AsyncServiceAccountTokens(service_account_tokens)
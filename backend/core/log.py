@@ -0,0 +1,188 @@
+"""
+Modos de logging del backend (`LOG_MODE`).
+
+- development: todo a DEBUG en texto plano, como hasta ahora.
+- production: INFO en JSON de una línea por registro, con un registro de
+  acceso por petición (`kcdummy.access`). El debug puede muestrearse: con
+  `LOG_DEBUG_SAMPLE_RATE=N` una de cada N peticiones registra su debug.
+
+En ambos modos los tokens, secretos y headers de autorización se ocultan
+antes de escribir. El código del camino caliente debe envolver sus logs de
+debug costosos en `if debug_enabled(logger):`, que no formatea nada cuando
+el debug está apagado o la petición no fue muestreada.
+
+Este módulo no importa Django: settings.py lo usa para armar LOGGING.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import itertools
+import json
+import logging
+import re
+
+ACCESS_LOGGER = 'kcdummy.access'
+
+# Fuera de una petición (comandos, tests) el debug sigue solo el nivel del logger
+_debug_sampled = ContextVar('debug_sampled', default=True)
+_request_counter = itertools.count()
+
+REDACTED = '[REDACTED]'
+SENSITIVE_HEADERS = ('authorization', 'cookie', 'proxy-authorization', 'x-api-key')
+# (marcas, patrón, reemplazo): el patrón solo se aplica si alguna marca
+# aparece en el texto en minúsculas, que es mucho más barato que la regex
+_KEY_MARKERS = ('token', 'secret', 'password')
+_REDACTIONS = (
+    # Header Authorization: "Bearer <token>"
+    (('bearer', 'basic'), re.compile(r'(?i)\b(bearer|basic)\s+[\w.~+/=-]+'), rf'\1 {REDACTED}'),
+    # JWT sueltos (tres segmentos base64url, el primero empieza con '{"')
+    (('eyj',), re.compile(r'\beyJ[\w-]*\.[\w-]*\.[\w-]*'), REDACTED),
+    # Pares clave/valor de JSON y dicts ("token": ...) y de formularios (token=...);
+    # no la prosa de los mensajes de error ("Invalid token: ...")
+    (
+        _KEY_MARKERS,
+        re.compile(
+            r'''(?i)((["'])(?:client_secret|access_token|refresh_token|id_token|token|password)\2\s*:\s*["']?'''
+            r'''|\b(?:client_secret|access_token|refresh_token|id_token|token|password)=)[^"'\s,&}]+'''
+        ),
+        rf'\1{REDACTED}',
+    ),
+)
+
+
+def redact(text):
+    """Oculta tokens, secretos y credenciales en un texto"""
+    lowered = text.lower()
+    for markers, pattern, replacement in _REDACTIONS:
+        if any(marker in lowered for marker in markers):
+            text = pattern.sub(replacement, text)
+    return text
+
+
+def redact_headers(headers):
+    """Copia de los headers con los valores sensibles ocultos"""
+    return {
+        name: REDACTED if name.lower() in SENSITIVE_HEADERS else value
+        for name, value in headers.items()
+    }
+
+
+def start_request(sample_rate):
+    """
+    Decide si la petición que empieza registra debug (una de cada
+    `sample_rate`; 0 nunca, 1 siempre). Retorna el token para `end_request`.
+    """
+    if sample_rate == 1:
+        sampled = True
+    elif sample_rate <= 0:
+        sampled = False
+    else:
+        sampled = next(_request_counter) % sample_rate == 0
+    return _debug_sampled.set(sampled)
+
+
+def end_request(token):
+    _debug_sampled.reset(token)
+
+
+def debug_enabled(logger):
+    """True si un log de debug de `logger` se escribiría en esta petición"""
+    return _debug_sampled.get() and logger.isEnabledFor(logging.DEBUG)
+
+
+class SampledDebugFilter(logging.Filter):
+    """Descarta el debug de las peticiones no muestreadas (también el no envuelto en debug_enabled)"""
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or _debug_sampled.get()
+
+
+class RedactFilter(logging.Filter):
+    """Oculta tokens y secretos en el mensaje ya formateado"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = redact(message)
+        if redacted != message:
+            record.msg = redacted
+            record.args = None
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Un objeto JSON por línea: ts, level, logger y msg, más los campos del
+    diccionario `access` si el registro lo trae (registros de acceso).
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        access = getattr(record, 'access', None)
+        if access:
+            entry.update(access)
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def logging_config(mode='development', level=None, sample_rate=None):
+    """
+    Diccionario para `logging.config.dictConfig`.
+
+    `level` es el nivel de los loggers del proyecto (por defecto DEBUG en
+    development e INFO en production). `sample_rate` es la N de
+    LOG_DEBUG_SAMPLE_RATE: en production, si es mayor que 0, los loggers
+    quedan en DEBUG y el filtro deja pasar el debug de una de cada N
+    peticiones.
+    """
+    production = mode == 'production'
+    if level is None:
+        level = 'INFO' if production else 'DEBUG'
+    if production and sample_rate:
+        level = 'DEBUG'
+
+    filters = ['redact', 'sampled_debug']
+    handler = {
+        'class': 'logging.StreamHandler',
+        'formatter': 'json' if production else 'simple',
+        'filters': filters,
+        'level': 'DEBUG',
+    }
+    project_logger = {'handlers': ['console'], 'level': level, 'propagate': False}
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': {
+            'redact': {'()': RedactFilter},
+            'sampled_debug': {'()': SampledDebugFilter},
+        },
+        'formatters': {
+            'verbose': {
+                'format': '%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s'
+            },
+            'simple': {
+                'format': '%(levelname)s %(message)s'
+            },
+            'json': {
+                '()': JSONFormatter,
+            },
+        },
+        'handlers': {
+            'console': handler,
+        },
+        'loggers': {
+            '': {  # Root logger
+                'handlers': ['console'],
+                'level': level,
+            },
+            'core': project_logger,
+            'core.authentication': project_logger,
+            'core.keycloak': project_logger,
+            'api': project_logger,
+            ACCESS_LOGGER: {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        },
+    }
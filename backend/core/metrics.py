@@ -0,0 +1,372 @@
+"""
+Métricas en formato Prometheus (`GET /metrics`).
+
+Histogramas de la autenticación, de cada llamada a Keycloak (por endpoint y
+status), de las consultas a la base por vista y de la serialización, más los
+contadores que ya llevan las cachés, el pool HTTP y el single-flight.
+
+Con gunicorn, definir PROMETHEUS_MULTIPROC_DIR (un directorio vacío al
+arrancar) para que los histogramas sumen a todos los workers. Los contadores
+de cachés, pool y single-flight son del proceso y reflejan al worker que
+atiende la petición a /metrics.
+
+Las mismas mediciones alimentan el header Server-Timing (ver
+RequestTimingMiddleware).
+
+prometheus_client es opcional: sin él /metrics responde 501 y las
+mediciones solo se usan para Server-Timing, si está activo.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse
+from functools import wraps
+import hmac
+import inspect
+import os
+import time
+from .cache import cache_stats
+from .http import get_pool_stats
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+    from prometheus_client import multiprocess
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # pragma: no cover - prometheus_client es opcional
+    Histogram = None
+
+ENABLED = Histogram is not None and getattr(settings, 'METRICS_ENABLED', True)
+# El header Server-Timing usa las mismas mediciones y no requiere prometheus_client
+TIMING_ENABLED = ENABLED or getattr(settings, 'SERVER_TIMING', 'off') != 'off'
+
+# La autenticación local y las consultas simples duran menos de 1 ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+if ENABLED:
+    AUTH_DURATION = Histogram(
+        'kcdummy_auth_duration_seconds',
+        'Duración de KeycloakAuthentication.authenticate',
+        ['client', 'result'],
+        buckets=LATENCY_BUCKETS,
+    )
+    KEYCLOAK_REQUEST_DURATION = Histogram(
+        'kcdummy_keycloak_request_duration_seconds',
+        'Duración de las llamadas HTTP a Keycloak',
+        ['endpoint', 'status'],
+        buckets=LATENCY_BUCKETS,
+    )
+    VIEW_DB_QUERIES = Histogram(
+        'kcdummy_view_db_queries',
+        'Consultas a la base por petición',
+        ['view'],
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+    VIEW_DB_DURATION = Histogram(
+        'kcdummy_view_db_duration_seconds',
+        'Tiempo total en la base por petición',
+        ['view'],
+        buckets=LATENCY_BUCKETS,
+    )
+    SERIALIZE_DURATION = Histogram(
+        'kcdummy_serialize_duration_seconds',
+        'Duración de la serialización de una página de productos',
+        ['view'],
+        buckets=LATENCY_BUCKETS,
+    )
+
+# Hijos de los histogramas por etiquetas: labels() valida y toma un lock en cada llamada
+_children = {}
+
+
+def _observe(histogram, labels, value):
+    key = (histogram, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = histogram.labels(*labels)
+    child.observe(value)
+
+
+def view_name(request):
+    """Nombre de la ruta resuelta (api:pesticides_list), o None si no se resolvió"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else None
+
+
+# Etapas del header Server-Timing, en el orden en que se publican
+SERVER_TIMING_STAGES = (
+    'auth', 'kc-discovery', 'kc-jwks', 'kc-introspect', 'kc-userinfo', 'kc-token', 'db', 'serialize',
+)
+# Nombre de la etapa de cada endpoint de Keycloak
+KEYCLOAK_STAGES = {
+    'discovery': 'kc-discovery',
+    'jwks': 'kc-jwks',
+    'introspection': 'kc-introspect',
+    'userinfo': 'kc-userinfo',
+    'token': 'kc-token',
+}
+
+
+class RequestTimings:
+    """
+    Tiempos de la petición en curso: consultas a la base (cantidad y
+    duración) y duración acumulada de cada etapa (auth, kc-*, serialize).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.stages = {}
+
+    def add(self, stage, duration):
+        self.stages[stage] = self.stages.get(stage, 0.0) + duration
+
+    def observe(self, request):
+        """Registra las consultas de la petición en las métricas de su vista"""
+        view = view_name(request)
+        # Las rutas no resueltas (404) no se registran: su etiqueta sería arbitraria
+        if view is None:
+            return
+        _observe(VIEW_DB_QUERIES, (view,), self.query_count)
+        _observe(VIEW_DB_DURATION, (view,), self.stages.get('db', 0.0))
+
+    def server_timing(self):
+        """Valor del header Server-Timing (duraciones en milisegundos)"""
+        entries = []
+        for stage in SERVER_TIMING_STAGES:
+            if stage == 'db':
+                duration = self.stages.get('db', 0.0)
+                entries.append(f'db;dur={duration * 1000:.1f};desc="queries: {self.query_count}"')
+            elif stage in self.stages:
+                entries.append(f'{stage};dur={self.stages[stage] * 1000:.1f}')
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+# Tiempos de la petición en curso. Es una variable de contexto y no estado
+# del request porque las consultas del ORM async corren en otro hilo, con
+# otra conexión, pero heredan el contexto.
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def start_request_timings():
+    """Empieza a medir la petición; retorna (tiempos, token para end_request_timings)"""
+    timings = RequestTimings()
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timings(token):
+    _request_timings.reset(token)
+
+
+def _record_stage(stage, duration):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, duration)
+
+
+def _record_query(execute, sql, params, many, context):
+    timings = _request_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+        timings.query_count += 1
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    # La conexión conserva sus wrappers al reconectarse
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+if TIMING_ENABLED:
+    connection_created.connect(_install_query_recorder)
+
+
+def _record_auth(authentication, outcome, duration):
+    if ENABLED:
+        _observe(AUTH_DURATION, (authentication.expected_client or 'default', outcome), duration)
+    _record_stage('auth', duration)
+
+
+def _auth_result(result):
+    return 'anonymous' if result is None else 'success'
+
+
+def timed_authentication(method):
+    """
+    Registra la duración de `authenticate`/`aauthenticate` por cliente
+    esperado y resultado (success, anonymous o failure).
+    """
+    if not TIMING_ENABLED:
+        return method
+
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(self, request):
+            started = time.perf_counter()
+            outcome = 'failure'
+            try:
+                result = await method(self, request)
+                outcome = _auth_result(result)
+                return result
+            finally:
+                _record_auth(self, outcome, time.perf_counter() - started)
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(self, request):
+        started = time.perf_counter()
+        outcome = 'failure'
+        try:
+            result = method(self, request)
+            outcome = _auth_result(result)
+            return result
+        finally:
+            _record_auth(self, outcome, time.perf_counter() - started)
+    return wrapper
+
+
+def _record_keycloak_call(endpoint, status, duration):
+    if ENABLED:
+        _observe(KEYCLOAK_REQUEST_DURATION, (endpoint, status), duration)
+    _record_stage(KEYCLOAK_STAGES.get(endpoint, f'kc-{endpoint}'), duration)
+
+
+def keycloak_call(endpoint, send, *args, **kwargs):
+    """
+    Ejecuta `send(*args, **kwargs)` (p. ej. session.get) y registra su
+    duración con el status de la respuesta, o `error` si no hubo respuesta.
+    """
+    if not TIMING_ENABLED:
+        return send(*args, **kwargs)
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = send(*args, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        _record_keycloak_call(endpoint, status, time.perf_counter() - started)
+
+
+async def akeycloak_call(endpoint, send, *args, **kwargs):
+    """Igual que `keycloak_call`, para `send` asíncrono"""
+    if not TIMING_ENABLED:
+        return await send(*args, **kwargs)
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        response = await send(*args, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        _record_keycloak_call(endpoint, status, time.perf_counter() - started)
+
+
+@contextmanager
+def serialization_timer(request):
+    """Registra la duración del bloque como serialización de la vista"""
+    if not TIMING_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    yield
+    duration = time.perf_counter() - started
+    if ENABLED:
+        _observe(SERIALIZE_DURATION, (view_name(request) or 'unknown',), duration)
+    _record_stage('serialize', duration)
+
+
+class StatsCollector:
+    """Publica los contadores del proceso: cachés, pool HTTP y single-flight"""
+
+    def describe(self):
+        # Sin esto el registro llama a collect() al registrarlo, durante el import
+        return []
+
+    def collect(self):
+        # Import diferido: keycloak importa este módulo
+        from .keycloak import keycloak_calls
+
+        lookups = CounterMetricFamily(
+            'kcdummy_cache_lookups', 'Consultas a las cachés por resultado', labels=['cache', 'result'],
+        )
+        hit_ratio = GaugeMetricFamily(
+            'kcdummy_cache_hit_ratio', 'Proporción de aciertos de las cachés', labels=['cache'],
+        )
+        entries = GaugeMetricFamily(
+            'kcdummy_cache_entries', 'Entradas en el nivel local de las cachés', labels=['cache'],
+        )
+        evictions = CounterMetricFamily(
+            'kcdummy_cache_evictions', 'Entradas desalojadas por tamaño', labels=['cache'],
+        )
+        for name, stats in cache_stats().items():
+            for result in ('hits', 'shared_hits', 'misses'):
+                lookups.add_metric([name, result], stats[result])
+            hit_ratio.add_metric([name], stats['hit_ratio'])
+            entries.add_metric([name], stats['size'])
+            evictions.add_metric([name], stats['evictions'])
+        yield from (lookups, hit_ratio, entries, evictions)
+
+        pool = get_pool_stats()
+        connections = CounterMetricFamily(
+            'kcdummy_keycloak_pool_connections', 'Conexiones pedidas al pool HTTP de Keycloak', labels=['result'],
+        )
+        connections.add_metric(['reused'], pool['hits'])
+        connections.add_metric(['new'], pool['new_connections'])
+        yield connections
+        yield CounterMetricFamily(
+            'kcdummy_keycloak_pool_waits', 'Veces que el pool HTTP de Keycloak estaba agotado', value=pool['waits'],
+        )
+
+        flight = keycloak_calls.stats()
+        calls = CounterMetricFamily(
+            'kcdummy_keycloak_coalesced_calls',
+            'Llamadas a userinfo/introspección ejecutadas (leader) o compartidas con una en curso (shared)',
+            labels=['role'],
+        )
+        calls.add_metric(['leader'], flight['calls'])
+        calls.add_metric(['shared'], flight['shared'])
+        yield calls
+        yield GaugeMetricFamily(
+            'kcdummy_keycloak_calls_in_flight', 'Llamadas a Keycloak en curso', value=flight['in_flight'],
+        )
+
+
+if ENABLED and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    REGISTRY.register(StatsCollector())
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    # Histogramas de todos los workers (archivos en PROMETHEUS_MULTIPROC_DIR) más los contadores de este
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(StatsCollector())
+    return registry
+
+
+def metrics_view(request):
+    """
+    Métricas en el formato de texto de Prometheus. Exige
+    `Authorization: Bearer <METRICS_TOKEN>`; sin METRICS_TOKEN definido no
+    se sirven.
+    """
+    if not ENABLED:
+        return JsonResponse({'error': 'Metrics are disabled or prometheus_client is not installed'}, status=501)
+
+    expected = getattr(settings, 'METRICS_TOKEN', '')
+    if not expected:
+        return JsonResponse({'error': 'Metrics require METRICS_TOKEN to be set'}, status=403)
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), f'Bearer {expected}'.encode('utf-8')):
+        return JsonResponse({'error': 'Authentication credentials were not provided'}, status=401)
+
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -1,38 +1,164 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.http import JsonResponse
+from django.utils.functional import LazyObject
 from jose import jwt
 from jose.exceptions import JWTError, ExpiredSignatureError
-import requests
-from functools import lru_cache
 import json
 from .keycloak import KeycloakService
+from .jwks import jwks_cache
+from .log import ACCESS_LOGGER, debug_enabled, end_request, redact_headers, start_request
+from . import metrics
 import logging
+import time
 
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+
+class AccessLogMiddleware:
+    """
+    Una línea de acceso por petición en `kcdummy.access` (método, ruta,
+    status, duración y usuario) y el muestreo del debug de la petición según
+    LOG_DEBUG_SAMPLE_RATE. Va primero en MIDDLEWARE para cubrir a los demás.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'LOG_DEBUG_SAMPLE_RATE', 1)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token = start_request(self.sample_rate)
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        self._log(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        token = start_request(self.sample_rate)
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        self._log(request, response, started)
+        return response
+
+    def _log(self, request, response, started):
+        if not access_logger.isEnabledFor(logging.INFO):
+            return
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        access_logger.info(
+            '%s %s %s %sms', request.method, request.path, response.status_code, duration_ms,
+            extra={'access': {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'user': _token_info(request).get('preferred_username'),
+            }},
+        )
+
+
+def _token_info(request):
+    """Claims del token del usuario autenticado por la vista, o {} si no hay"""
+    # Sin evaluar el usuario perezoso de AuthenticationMiddleware (consultaría la sesión)
+    user = request.__dict__.get('user')
+    if user is None or isinstance(user, LazyObject):
+        return {}
+    return getattr(user, 'token_info', None) or {}
+
+
+class RequestTimingMiddleware:
+    """
+    Mide las etapas de cada petición (auth, llamadas a Keycloak, base de
+    datos, serialización): registra las consultas en las métricas por vista
+    y, según SERVER_TIMING, agrega el header Server-Timing a las respuestas
+    de la API.
+
+    SERVER_TIMING: `off`, `admin` (solo si el token trae el rol
+    SERVER_TIMING_ROLE en realm_access.roles) o `all`.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING', 'off')
+        self.role = getattr(settings, 'SERVER_TIMING_ROLE', 'admin')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = metrics.start_request_timings()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request_timings(token)
+        self._finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request_timings()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request_timings(token)
+        self._finish(request, response, timings)
+        return response
+
+    def _finish(self, request, response, timings):
+        if metrics.ENABLED:
+            timings.observe(request)
+        if self._shows_server_timing(request):
+            response['Server-Timing'] = timings.server_timing()
+
+    def _shows_server_timing(self, request):
+        if self.server_timing == 'off':
+            return False
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.app_name != 'api':
+            return False
+        if self.server_timing == 'all':
+            return True
+        roles = _token_info(request).get('realm_access', {}).get('roles', [])
+        return self.role in roles
+
 
 class KeycloakMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
         self.keycloak_service = KeycloakService()
 
-    @lru_cache(maxsize=1)
-    def _load_public_key(self):
+    def _load_public_key(self, token):
+        """Obtiene la llave pública (JWK) correspondiente al `kid` del token"""
         try:
-            well_known_url = f"{settings.KEYCLOAK_URL}/realms/{settings.KEYCLOAK_REALM}/.well-known/openid-configuration"
-            logger.debug(f"Fetching well-known config from: {well_known_url}")
-            response = requests.get(well_known_url, verify=False)
-            well_known = response.json()
-            jwks_uri = well_known['jwks_uri']
-            jwks_response = requests.get(jwks_uri, verify=False)
-            self.jwks = jwks_response.json()
-            return self.jwks['keys'][0]
+            kid = jwt.get_unverified_header(token).get('kid')
+            return jwks_cache.get_jwk(kid)
+        except JWTError:
+            raise
         except Exception as e:
             logger.error(f"Error loading public key: {e}")
             return None
 
     def _get_token_from_header(self, request):
         auth_header = request.headers.get('Authorization', '')
-        logger.debug(f"Authorization header: {auth_header}")
         if not auth_header.startswith('Bearer '):
             return None
         return auth_header.split(' ')[1]
@@ -43,7 +169,7 @@ class KeycloakMiddleware:
         """
         try:
             # Primero validamos la firma y claims básicos
-            public_key = self._load_public_key()
+            public_key = self._load_public_key(token)
             if not public_key:
                 raise Exception("No public key available")
 
@@ -57,11 +183,12 @@ class KeycloakMiddleware:
             decoded_token = jwt.decode(
                 token,
                 public_key,
-                algorithms=['RS256'],
+                algorithms=getattr(settings, 'KEYCLOAK_JWT_ALGORITHMS', ['RS256', 'ES256']),
                 options=options
             )
 
-            logger.debug(f"Token decoded successfully: {json.dumps(decoded_token, indent=2)}")
+            if debug_enabled(logger):
+                logger.debug(f"Token decoded successfully: {json.dumps(decoded_token)}")
 
             # Luego hacemos la introspección para validación adicional
             token_info = self.keycloak_service.introspect_token(token)
@@ -84,12 +211,15 @@ class KeycloakMiddleware:
         # Lista de rutas públicas que no requieren autenticación
         public_paths = ['/api/public/', '/admin/', '/api/auth/token/']
         
-        logger.debug(f"Processing request to: {request.path}")
-        logger.debug(f"Request headers: {dict(request.headers)}")
+        debug = debug_enabled(logger)
+        if debug:
+            logger.debug(f"Processing request to: {request.path}")
+            logger.debug(f"Request headers: {redact_headers(request.headers)}")
         
         # Si es una ruta pública, permitimos el acceso sin validación
         if any(request.path.startswith(path) for path in public_paths):
-            logger.debug(f"Path {request.path} is public, skipping authentication")
+            if debug:
+                logger.debug(f"Path {request.path} is public, skipping authentication")
             return self.get_response(request)
 
         # Para rutas protegidas, validamos el token
@@ -105,14 +235,16 @@ class KeycloakMiddleware:
             decoded_token = self._validate_token(token)
 
             # Obtener información detallada del usuario
-            user_info = self.keycloak_service.get_user_info(token)
-            logger.debug(f"User info retrieved: {json.dumps(user_info, indent=2)}")
+            user_info = self.keycloak_service.get_user_info(token, decoded_token)
+            if debug:
+                logger.debug(f"User info retrieved: {json.dumps(user_info)}")
 
             # Agregar información del usuario al request
             request.user_info = user_info
             request.user_roles = decoded_token.get('realm_access', {}).get('roles', [])
             
-            logger.debug(f"User roles: {request.user_roles}")
+            if debug:
+                logger.debug(f"User roles: {request.user_roles}")
             
             response = self.get_response(request)
             return response
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from core.log import logging_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,12 +40,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'api',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.AccessLogMiddleware',
+    'core.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -99,6 +104,45 @@ KEYCLOAK_CLIENT_ID = os.environ.get('KEYCLOAK_CLIENT_ID', 'backintegration')
 KEYCLOAK_CLIENT_SECRET = os.environ.get('KEYCLOAK_CLIENT_SECRET', 'nmdnDct5SE0Tv6AllEmE2HnuYkdA2a1w')
 KEYCLOAK_VERIFY_SSL = os.environ.get('KEYCLOAK_VERIFY_SSL', 'False').lower() == 'true'
 
+# Pool de conexiones HTTP hacia Keycloak
+KEYCLOAK_HTTP_POOL_CONNECTIONS = int(os.environ.get('KEYCLOAK_HTTP_POOL_CONNECTIONS', '10'))
+KEYCLOAK_HTTP_POOL_MAXSIZE = int(os.environ.get('KEYCLOAK_HTTP_POOL_MAXSIZE', '20'))
+KEYCLOAK_HTTP_POOL_BLOCK = os.environ.get('KEYCLOAK_HTTP_POOL_BLOCK', 'False').lower() == 'true'
+KEYCLOAK_HTTP_CONNECT_TIMEOUT = float(os.environ.get('KEYCLOAK_HTTP_CONNECT_TIMEOUT', '2'))
+KEYCLOAK_HTTP_READ_TIMEOUT = float(os.environ.get('KEYCLOAK_HTTP_READ_TIMEOUT', '5'))
+KEYCLOAK_HTTP_RETRIES = int(os.environ.get('KEYCLOAK_HTTP_RETRIES', '3'))
+# Espera máxima (segundos) por una llamada a Keycloak que otro hilo ya está haciendo
+KEYCLOAK_SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('KEYCLOAK_SINGLE_FLIGHT_TIMEOUT', '10'))
+# Conexiones simultáneas del cliente async (vistas de /api/async/)
+KEYCLOAK_ASYNC_POOL_MAXSIZE = int(os.environ.get('KEYCLOAK_ASYNC_POOL_MAXSIZE', '100'))
+
+# Caché de la configuración well-known (segundos)
+KEYCLOAK_DISCOVERY_TTL = int(os.environ.get('KEYCLOAK_DISCOVERY_TTL', '3600'))
+KEYCLOAK_DISCOVERY_MIN_TTL = int(os.environ.get('KEYCLOAK_DISCOVERY_MIN_TTL', '60'))
+
+# Alias en CACHES para compartir las cachés de autenticación entre workers (vacío = solo local)
+KEYCLOAK_CACHE_BACKEND = os.environ.get('KEYCLOAK_CACHE_BACKEND') or None
+
+# Caché de introspección de tokens (segundos / número de entradas)
+KEYCLOAK_INTROSPECTION_CACHE_TTL = int(os.environ.get('KEYCLOAK_INTROSPECTION_CACHE_TTL', '60'))
+KEYCLOAK_INTROSPECTION_NEGATIVE_TTL = int(os.environ.get('KEYCLOAK_INTROSPECTION_NEGATIVE_TTL', '60'))
+KEYCLOAK_INTROSPECTION_CACHE_SIZE = int(os.environ.get('KEYCLOAK_INTROSPECTION_CACHE_SIZE', '10000'))
+
+# Caché de respuestas userinfo (segundos / número de entradas)
+KEYCLOAK_USERINFO_CACHE_TTL = int(os.environ.get('KEYCLOAK_USERINFO_CACHE_TTL', '300'))
+KEYCLOAK_USERINFO_CACHE_SIZE = int(os.environ.get('KEYCLOAK_USERINFO_CACHE_SIZE', '10000'))
+
+# Segundos antes del vencimiento en que se renueva el token del service account
+KEYCLOAK_SERVICE_TOKEN_REFRESH_MARGIN = int(os.environ.get('KEYCLOAK_SERVICE_TOKEN_REFRESH_MARGIN', '30'))
+
+# Verificación local de tokens (JWKS)
+KEYCLOAK_JWT_ALGORITHMS = os.environ.get('KEYCLOAK_JWT_ALGORITHMS', 'RS256,ES256').split(',')
+KEYCLOAK_JWKS_TTL = int(os.environ.get('KEYCLOAK_JWKS_TTL', '300'))
+KEYCLOAK_JWKS_MAX_STALE = int(os.environ.get('KEYCLOAK_JWKS_MAX_STALE', '3600'))
+KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL = int(os.environ.get('KEYCLOAK_JWKS_MIN_REFETCH_INTERVAL', '10'))
+# Si es True, la información del usuario se obtiene del endpoint userinfo en vez de los claims del token
+KEYCLOAK_USERINFO_REMOTE = os.environ.get('KEYCLOAK_USERINFO_REMOTE', 'False').lower() == 'true'
+
 print("Configured Keycloak settings:")
 print(f"KEYCLOAK_URL: {KEYCLOAK_URL}")
 print(f"KEYCLOAK_REALM: {KEYCLOAK_REALM}")
@@ -116,6 +160,23 @@ REST_FRAMEWORK = {
     'UNAUTHENTICATED_USER': None,
 }
 
+# Tamaño de página por defecto y máximo del listado de productos
+PESTICIDES_PAGE_SIZE = int(os.environ.get('PESTICIDES_PAGE_SIZE', '100'))
+PESTICIDES_MAX_PAGE_SIZE = int(os.environ.get('PESTICIDES_MAX_PAGE_SIZE', '1000'))
+# Serializa los listados desde values_list() sin pasar por ModelSerializer
+PESTICIDES_FAST_SERIALIZER = os.environ.get('PESTICIDES_FAST_SERIALIZER', 'True').lower() == 'true'
+# Máximo de identificadores por petición a /api/pesticides/batch/
+PESTICIDES_BATCH_MAX_SIZE = int(os.environ.get('PESTICIDES_BATCH_MAX_SIZE', '100'))
+# Filas leídas por cada viaje al cursor del servidor en la exportación
+PESTICIDES_EXPORT_CHUNK_SIZE = int(os.environ.get('PESTICIDES_EXPORT_CHUNK_SIZE', '2000'))
+# Filas por row group en la exportación a Parquet
+PESTICIDES_PARQUET_ROW_GROUP_SIZE = int(os.environ.get('PESTICIDES_PARQUET_ROW_GROUP_SIZE', '10000'))
+
+# Caché de respuestas serializadas de productos (segundos / número de entradas / alias en CACHES)
+PESTICIDES_RESPONSE_CACHE_TTL = int(os.environ.get('PESTICIDES_RESPONSE_CACHE_TTL', '300'))
+PESTICIDES_RESPONSE_CACHE_SIZE = int(os.environ.get('PESTICIDES_RESPONSE_CACHE_SIZE', '512'))
+PESTICIDES_RESPONSE_CACHE_BACKEND = os.environ.get('PESTICIDES_RESPONSE_CACHE_BACKEND') or None
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -161,43 +222,19 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '%(levelname)s %(asctime)s %(module)s %(process)d %(thread)d %(message)s'
-        },
-        'simple': {
-            'format': '%(levelname)s %(message)s'
-        },
-    },
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-            'level': 'DEBUG',
-        },
-    },
-    'loggers': {
-        '': {  # Root logger
-            'handlers': ['console'],
-            'level': 'DEBUG',
-        },
-        'core': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
-        'core.authentication': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
-        'core.keycloak': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
-    },
-}
+# Métricas Prometheus en /metrics (requiere prometheus_client)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+# /metrics exige "Authorization: Bearer <METRICS_TOKEN>"; sin token no se sirve
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Header Server-Timing en las respuestas de la API: off, admin (solo
+# tokens con el rol SERVER_TIMING_ROLE en realm_access.roles) o all
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'admin')
+SERVER_TIMING_ROLE = os.environ.get('SERVER_TIMING_ROLE', 'admin')
+
+# Logging: development (DEBUG en texto) o production (INFO en JSON con registro de acceso)
+LOG_MODE = os.environ.get('LOG_MODE', 'development')
+LOG_LEVEL = os.environ.get('LOG_LEVEL') or None
+# Debug de 1 de cada N peticiones (0: nunca, 1: todas)
+LOG_DEBUG_SAMPLE_RATE = int(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0' if LOG_MODE == 'production' else '1'))
+LOGGING = logging_config(LOG_MODE, LOG_LEVEL, LOG_DEBUG_SAMPLE_RATE)
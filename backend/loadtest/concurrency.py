@@ -0,0 +1,107 @@
+"""
+Compara la concurrencia que soportan el despliegue síncrono (WSGI con un
+pool de hilos fijo) y el async (ASGI) cuando Keycloak responde lento.
+
+Levanta el stub OIDC en este proceso y mide, para cada nivel de
+concurrencia, peticiones por segundo, latencia p50/p99 y errores del
+listado síncrono y del async. Con userinfo remoto y sin caché, cada
+petición espera a Keycloak `--latency` segundos: el despliegue síncrono se
+satura en hilos / latencia peticiones por segundo; el async no.
+
+Los servidores deben apuntar al stub (desde backend/):
+
+    export KEYCLOAK_URL=http://127.0.0.1:8081 KEYCLOAK_USERINFO_REMOTE=True KEYCLOAK_USERINFO_CACHE_TTL=0
+    gunicorn kcdummy.wsgi -b 127.0.0.1:8000 --threads 16
+    uvicorn kcdummy.asgi:application --port 8001
+
+    python loadtest/concurrency.py --latency 0.2 --concurrency 8,32,128,256
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import sys
+import time
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from oidc_stub import OIDCStub  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_level(url, token, concurrency, duration, timeout):
+    """Mantiene `concurrency` peticiones en curso durante `duration` segundos"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, headers=headers) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+        'errors': errors,
+    }
+
+
+async def main_async(args):
+    stub = OIDCStub(port=args.stub_port, latency=args.latency).start()
+    token = stub.issue_token('backintegration')
+    deployments = [('sync', args.sync_url), ('async', args.async_url)]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    print(f"Keycloak (stub) con {args.latency * 1000:.0f} ms de latencia, {args.duration}s por nivel")
+    print(f"{'despliegue':<10} {'concurrencia':>12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    try:
+        for name, url in deployments:
+            # Calentar: discovery, JWKS y conexiones
+            await run_level(url, token, 1, 0.5, args.timeout)
+            for level in levels:
+                result = await run_level(url, token, level, args.duration, args.timeout)
+                print(
+                    f"{name:<10} {level:>12} {result['rps']:>9.1f} {result['p50']:>9.1f} "
+                    f"{result['p99']:>9.1f} {result['errors']:>8}"
+                )
+    finally:
+        stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrencia del despliegue síncrono vs async')
+    parser.add_argument('--sync-url', default='http://127.0.0.1:8000/api/pesticides/?page_size=10')
+    parser.add_argument('--async-url', default='http://127.0.0.1:8001/api/async/pesticides/?page_size=10')
+    parser.add_argument('--stub-port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.2, help='latencia de Keycloak, en segundos')
+    parser.add_argument('--concurrency', default='8,32,128,256', help='niveles separados por coma')
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos por nivel')
+    parser.add_argument('--timeout', type=float, default=30.0, help='timeout por petición, en segundos')
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
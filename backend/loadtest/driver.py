@@ -0,0 +1,285 @@
+"""
+Prueba de carga del camino real de las peticiones, con el stub OIDC en el
+lugar de Keycloak.
+
+Reproduce una mezcla de token_exchange, test_view, pesticides_list y
+pesticide_detail a una tasa objetivo, con llegadas en lazo abierto: cada
+petición sale a su hora aunque las anteriores no hayan terminado, y su
+latencia se mide desde esa hora (una cola en el cliente también cuenta).
+Reporta throughput, latencia p50/p95/p99 por vista y las llamadas que el
+servidor hizo a Keycloak por petición, contadas por el stub.
+
+Sin `--stub-url` levanta el stub en este proceso con la latencia y los
+errores indicados. El servidor debe apuntar al stub (desde backend/):
+
+    export KEYCLOAK_URL=http://127.0.0.1:8081
+    gunicorn kcdummy.wsgi -b 127.0.0.1:8000 --threads 16
+
+    python loadtest/driver.py --rps 100 --duration 30
+    python loadtest/driver.py --mix pesticides_list=6,pesticide_detail=3,test_view=1 --users 200
+    python loadtest/driver.py --latency 0.05 --error-rates userinfo=0.02
+    python loadtest/driver.py --async-views --base-url http://127.0.0.1:8001   # uvicorn
+
+Los usuarios (`--users`) obtienen sus tokens del stub con grant password
+antes de medir; cada uno tiene un token de frontintegration (token_exchange)
+y uno de backintegration (el resto de las vistas).
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from concurrency import percentile  # noqa: E402
+from oidc_stub import ENDPOINTS, OIDCStub, add_fault_arguments  # noqa: E402
+
+# Vista: (método, ruta, ruta async o None, cliente del token)
+VIEWS = {
+    'token_exchange': ('POST', '/api/auth/token/', '/api/async/auth/token/', 'frontintegration'),
+    'test_view': ('GET', '/api/test/', None, 'backintegration'),
+    'pesticides_list': ('GET', '/api/pesticides/', '/api/async/pesticides/', 'backintegration'),
+    'pesticide_detail': ('GET', '/api/pesticides/{id}/', '/api/async/pesticides/{id}/', 'backintegration'),
+}
+DEFAULT_MIX = 'token_exchange=1,test_view=1,pesticides_list=6,pesticide_detail=2'
+# Consultas del listado, como las que arma el frontend
+LIST_QUERIES = (
+    'page_size=10',
+    'page_size=25',
+    'page_size=50&ordering=-last_review_date',
+    'status=Activo&page_size=25',
+    'category=Herbicida&page_size=25',
+    'manufacturer=Agro&ordering=manufacturer',
+    'limit=20&offset=40',
+)
+
+
+def parse_mix(text):
+    """'pesticides_list=6,test_view=1' -> {'pesticides_list': 6.0, 'test_view': 1.0}"""
+    mix = {}
+    for item in filter(None, text.split(',')):
+        view, _, weight = item.partition('=')
+        if view not in VIEWS:
+            raise argparse.ArgumentTypeError(f"Vista desconocida: {view} (opciones: {', '.join(VIEWS)})")
+        mix[view] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError('La mezcla debe tener al menos una vista con peso')
+    return mix
+
+
+class Plan:
+    """Elige la vista, el usuario y la URL de cada petición"""
+
+    def __init__(self, base_url, mix, users, pesticide_ids, async_views, seed=None):
+        self.base_url = base_url.rstrip('/')
+        self.views = list(mix)
+        self.weights = [mix[view] for view in self.views]
+        self.users = users
+        self.pesticide_ids = pesticide_ids
+        self.async_views = async_views
+        self.random = random.Random(seed)
+
+    def path(self, view):
+        _, path, async_path, _ = VIEWS[view]
+        if self.async_views and async_path:
+            path = async_path
+        if view == 'pesticides_list':
+            return f"{path}?{self.random.choice(LIST_QUERIES)}"
+        if view == 'pesticide_detail':
+            return path.format(id=self.random.choice(self.pesticide_ids))
+        return path
+
+    def next(self):
+        view = self.random.choices(self.views, self.weights)[0]
+        method, _, _, client_id = VIEWS[view]
+        token = self.random.choice(self.users)[client_id]
+        return view, method, f"{self.base_url}{self.path(view)}", token
+
+
+async def fetch_user_token(client, stub_url, realm, client_id, username, attempts=5):
+    """Token de usuario por grant password; reintenta los 503 inyectados por el stub"""
+    url = f"{stub_url}/realms/{realm}/protocol/openid-connect/token"
+    data = {'grant_type': 'password', 'client_id': client_id, 'username': username, 'password': 'loadtest'}
+    for _ in range(attempts):
+        response = await client.post(url, data=data)
+        if response.status_code == 200:
+            return response.json()['access_token']
+    response.raise_for_status()
+
+
+async def fetch_users(client, stub_url, realm, count):
+    async def user(index):
+        username = f"loadtest-{index:04d}"
+        return {
+            client_id: await fetch_user_token(client, stub_url, realm, client_id, username)
+            for client_id in ('frontintegration', 'backintegration')
+        }
+    return await asyncio.gather(*(user(index) for index in range(count)))
+
+
+async def fetch_pesticide_ids(client, base_url, token):
+    response = await client.get(
+        f"{base_url.rstrip('/')}/api/pesticides/?page_size=100",
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    response.raise_for_status()
+    return [item['id'] for item in response.json()['results']]
+
+
+async def fetch_calls(client, stub_url):
+    response = await client.get(f"{stub_url}/_stub/calls")
+    response.raise_for_status()
+    return response.json()
+
+
+async def send(client, view, method, url, token, scheduled, results):
+    try:
+        response = await client.request(method, url, headers={'Authorization': f'Bearer {token}'})
+        outcome = response.status_code
+    except httpx.HTTPError as e:
+        outcome = e.__class__.__name__
+    results.append((view, time.perf_counter() - scheduled, outcome))
+
+
+async def run_load(client, plan, rps, duration, arrivals, results):
+    """Lanza `rps * duration` peticiones a su hora y espera a que terminen"""
+    tasks = []
+    start = time.perf_counter()
+    offset = 0.0
+    for _ in range(int(rps * duration)):
+        offset += plan.random.expovariate(rps) if arrivals == 'poisson' else 1 / rps
+        scheduled = start + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        view, method, url, token = plan.next()
+        tasks.append(asyncio.create_task(send(client, view, method, url, token, scheduled, results)))
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start
+
+
+def is_success(outcome):
+    return isinstance(outcome, int) and outcome < 400
+
+
+def summarize(results, elapsed, calls):
+    views = {}
+    for view, latency, outcome in results:
+        views.setdefault(view, []).append((latency, outcome))
+    views['total'] = [(latency, outcome) for _, latency, outcome in results]
+
+    summary = {'elapsed': elapsed, 'views': {}}
+    for view, samples in views.items():
+        latencies = [latency for latency, outcome in samples if is_success(outcome)]
+        errors = {}
+        for _, outcome in samples:
+            if not is_success(outcome):
+                errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+        summary['views'][view] = {
+            'requests': len(samples),
+            'errors': errors,
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+    total = len(results) or 1
+    summary['keycloak_calls'] = calls
+    summary['keycloak_calls_per_request'] = {endpoint: count / total for endpoint, count in calls.items()}
+    summary['keycloak_calls_per_request']['total'] = sum(calls.values()) / total
+    return summary
+
+
+def print_summary(summary, rps):
+    total = summary['views']['total']
+    errors = sum(total['errors'].values())
+    print(
+        f"Objetivo {rps:g} req/s, logrado {total['throughput']:.1f} req/s exitosas "
+        f"({total['requests']} peticiones en {summary['elapsed']:.1f} s, {errors} errores)"
+    )
+    print(f"{'vista':<18} {'peticiones':>10} {'req/s':>8} {'errores':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for view, stats in summary['views'].items():
+        print(
+            f"{view:<18} {stats['requests']:>10} {stats['throughput']:>8.1f} {sum(stats['errors'].values()):>8} "
+            f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}"
+        )
+    if errors:
+        detail = ', '.join(f"{outcome}×{count}" for outcome, count in sorted(total['errors'].items()))
+        print(f"Errores: {detail}")
+    per_request = summary['keycloak_calls_per_request']
+    detail = ', '.join(f"{endpoint} {per_request[endpoint]:.3f}" for endpoint in ENDPOINTS if endpoint in per_request)
+    print(f"Llamadas a Keycloak por petición: {per_request['total']:.3f}" + (f" ({detail})" if detail else ''))
+
+
+async def main_async(args):
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = OIDCStub(
+            port=args.stub_port, realm=args.realm, latency=args.latency, error_rate=args.error_rate,
+            latencies=args.latencies, error_rates=args.error_rates, seed=args.seed,
+        ).start()
+        stub_url = stub.url
+    stub_url = stub_url.rstrip('/')
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+            users = await fetch_users(client, stub_url, args.realm, args.users)
+            pesticide_ids = []
+            if 'pesticide_detail' in args.mix:
+                pesticide_ids = await fetch_pesticide_ids(client, args.base_url, users[0]['backintegration'])
+                if not pesticide_ids:
+                    sys.exit('No hay productos para pesticide_detail: cargar datos con manage.py load_pesticides')
+            plan = Plan(args.base_url, args.mix, users, pesticide_ids, args.async_views, args.seed)
+
+            # Calentar: discovery, JWKS, token del service account y conexiones
+            if args.warmup > 0:
+                await run_load(client, plan, args.rps, args.warmup, args.arrivals, [])
+
+            before = await fetch_calls(client, stub_url)
+            results = []
+            elapsed = await run_load(client, plan, args.rps, args.duration, args.arrivals, results)
+            after = await fetch_calls(client, stub_url)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    calls = {endpoint: after.get(endpoint, 0) - before.get(endpoint, 0) for endpoint in after}
+    summary = summarize(results, elapsed, {endpoint: count for endpoint, count in calls.items() if count})
+    print_summary(summary, args.rps)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': {
+                'base_url': args.base_url, 'rps': args.rps, 'duration': args.duration, 'mix': args.mix,
+                'users': args.users, 'async_views': args.async_views, 'arrivals': args.arrivals,
+            }, **summary}, f, indent=2)
+            f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga con una mezcla de vistas a tasa fija')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--rps', type=float, default=50.0, help='peticiones por segundo objetivo')
+    parser.add_argument('--duration', type=float, default=30.0, help='segundos medidos')
+    parser.add_argument('--warmup', type=float, default=3.0, help='segundos de calentamiento, sin medir')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"pesos por vista (por defecto {DEFAULT_MIX})")
+    parser.add_argument('--users', type=int, default=50, help='usuarios distintos (tokens)')
+    parser.add_argument('--async-views', action='store_true', help='usar las rutas /api/async/ donde existen')
+    parser.add_argument('--arrivals', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--connections', type=int, default=100, help='conexiones máximas al servidor')
+    parser.add_argument('--timeout', type=float, default=30.0, help='timeout por petición, en segundos')
+    parser.add_argument('--json', metavar='PATH', help='guarda el resumen en JSON')
+    parser.add_argument('--stub-url', help='stub OIDC ya corriendo; sin esto se levanta uno en este proceso')
+    parser.add_argument('--stub-port', type=int, default=8081)
+    parser.add_argument('--realm', default='test')
+    add_fault_arguments(parser)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
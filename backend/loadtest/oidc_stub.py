@@ -0,0 +1,243 @@
+"""
+Servidor OIDC mínimo que reemplaza a Keycloak en las pruebas de carga.
+
+Publica discovery, JWKS, userinfo, introspección y token endpoint de un
+realm, con tokens RS256 firmados por una llave generada al arrancar. Cada
+respuesta puede demorarse `latency` segundos para simular un Keycloak lento
+y fallar con 503 en una fracción `error_rate` de las llamadas; ambos valores
+se pueden fijar por endpoint (discovery, jwks, userinfo, introspection,
+token).
+
+El token endpoint acepta client_credentials (token del service account) y
+password (token de usuario para `username`, sin validar la contraseña).
+`GET /_stub/calls` retorna las llamadas recibidas por endpoint.
+
+    python loadtest/oidc_stub.py --port 8081 --latency 0.2
+    python loadtest/oidc_stub.py --error-rate 0.01 --latencies userinfo=0.3 --error-rates token=0.2
+"""
+from cryptography.hazmat.primitives.asymmetric import rsa
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+import jwt
+
+
+ENDPOINTS = ('discovery', 'jwks', 'userinfo', 'introspection', 'token')
+
+
+class OIDCStub:
+    def __init__(self, host='127.0.0.1', port=8081, realm='test', latency=0.0, error_rate=0.0,
+                 latencies=None, error_rates=None, seed=None):
+        self.realm = realm
+        self.latency = latency
+        self.error_rate = error_rate
+        # Valores por endpoint; los que no están usan latency / error_rate
+        self.latencies = latencies or {}
+        self.error_rates = error_rates or {}
+        self._random = random.Random(seed)
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        # Un kid por llave: un servidor que guardó las llaves de otra ejecución las vuelve a pedir
+        self.kid = uuid.uuid4().hex
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        self.jwks = {'keys': [{**jwk, 'kid': self.kid, 'use': 'sig', 'alg': 'RS256'}]}
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_port}"
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def issuer(self):
+        return f"{self.url}/realms/{self.realm}"
+
+    def discovery(self):
+        base = f"{self.issuer}/protocol/openid-connect"
+        return {
+            'issuer': self.issuer,
+            'jwks_uri': f"{base}/certs",
+            'token_endpoint': f"{base}/token",
+            'userinfo_endpoint': f"{base}/userinfo",
+            'introspection_endpoint': f"{base}/token/introspect",
+        }
+
+    def issue_token(self, client_id='backintegration', username='loadtest', lifetime=3600):
+        now = int(time.time())
+        claims = {
+            'iss': self.issuer,
+            'sub': str(uuid.uuid5(uuid.NAMESPACE_DNS, username)),
+            'azp': client_id,
+            'preferred_username': username,
+            'email': f"{username}@example.com",
+            'name': username,
+            'sid': str(uuid.uuid4()),
+            'iat': now,
+            'exp': now + lifetime,
+            'realm_access': {'roles': ['offline_access', 'uma_authorization']},
+        }
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+    def record(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def calls_snapshot(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def inject(self, endpoint):
+        """
+        Registra la llamada, aplica la latencia del endpoint y decide si
+        falla. Retorna True si la respuesta debe ser un error.
+        """
+        self.record(endpoint)
+        time.sleep(self.latencies.get(endpoint, self.latency))
+        error_rate = self.error_rates.get(endpoint, self.error_rate)
+        if not error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < error_rate
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, como Keycloak
+            protocol_version = 'HTTP/1.1'
+            # Headers y cuerpo se escriben por separado: sin esto, Nagle agrega ~40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _form(self):
+                length = int(self.headers.get('Content-Length', 0))
+                return {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+            def _claims(self, token):
+                try:
+                    return jwt.decode(token, stub.private_key.public_key(), algorithms=['RS256'])
+                except jwt.InvalidTokenError:
+                    return None
+
+            def _route(self):
+                prefix = f"/realms/{stub.realm}"
+                if not self.path.startswith(prefix):
+                    return None
+                return self.path[len(prefix):].split('?')[0]
+
+            def _unavailable(self):
+                return self._send(503, {'error': 'temporarily_unavailable'})
+
+            def do_GET(self):
+                if self.path == '/_stub/calls':
+                    return self._send(200, stub.calls_snapshot())
+                route = self._route()
+                if route == '/.well-known/openid-configuration':
+                    if stub.inject('discovery'):
+                        return self._unavailable()
+                    return self._send(200, stub.discovery())
+                if route == '/protocol/openid-connect/certs':
+                    if stub.inject('jwks'):
+                        return self._unavailable()
+                    return self._send(200, stub.jwks)
+                if route == '/protocol/openid-connect/userinfo':
+                    if stub.inject('userinfo'):
+                        return self._unavailable()
+                    auth = self.headers.get('Authorization', '')
+                    claims = self._claims(auth[len('Bearer '):]) if auth.startswith('Bearer ') else None
+                    if claims is None:
+                        return self._send(401, {'error': 'invalid_token'})
+                    fields = ('sub', 'preferred_username', 'email', 'name')
+                    return self._send(200, {key: claims[key] for key in fields if key in claims})
+                self._send(404, {'error': 'not_found'})
+
+            def do_POST(self):
+                route = self._route()
+                form = self._form()
+                if route == '/protocol/openid-connect/token':
+                    if stub.inject('token'):
+                        return self._unavailable()
+                    client_id = form.get('client_id', 'backintegration')
+                    if form.get('grant_type') == 'password':
+                        username = form.get('username', 'loadtest')
+                    else:
+                        username = 'service-account'
+                    return self._send(200, {
+                        'access_token': stub.issue_token(client_id, username),
+                        'expires_in': 300,
+                        'token_type': 'Bearer',
+                    })
+                if route == '/protocol/openid-connect/token/introspect':
+                    if stub.inject('introspection'):
+                        return self._unavailable()
+                    claims = self._claims(form.get('token', ''))
+                    return self._send(200, {'active': True, **claims} if claims else {'active': False})
+                self._send(404, {'error': 'not_found'})
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_endpoint_values(text):
+    """'userinfo=0.3,token=0.1' -> {'userinfo': 0.3, 'token': 0.1}"""
+    values = {}
+    for item in filter(None, (text or '').split(',')):
+        endpoint, _, value = item.partition('=')
+        if endpoint not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Endpoint desconocido: {endpoint} (opciones: {', '.join(ENDPOINTS)})")
+        values[endpoint] = float(value)
+    return values
+
+
+def add_fault_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.0, help='demora de cada respuesta, en segundos')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fracción de respuestas 503 (0 a 1)')
+    parser.add_argument('--latencies', type=parse_endpoint_values, default={},
+                        help='latencia por endpoint, p. ej. userinfo=0.3,token=0.1')
+    parser.add_argument('--error-rates', type=parse_endpoint_values, default={},
+                        help='fracción de 503 por endpoint, p. ej. introspection=0.05')
+    parser.add_argument('--seed', type=int, help='semilla de los errores inyectados')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor OIDC de prueba (reemplazo de Keycloak)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--realm', default='test')
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    stub = OIDCStub(
+        args.host, args.port, args.realm, args.latency, args.error_rate,
+        args.latencies, args.error_rates, args.seed,
+    )
+    print(f"OIDC stub en {stub.issuer} (latencia {args.latency}s, errores {args.error_rate:.1%})")
+    print(f"Token backintegration: {stub.issue_token('backintegration')}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import Keycloak from 'keycloak-js'
 import axios from 'axios'
 import logoSag from './assets/LOGOSAG.png'
@@ -13,6 +13,9 @@ function App() {
   const [userInfo, setUserInfo] = useState(null)
   const [pesticides, setPesticides] = useState([])
   const [loading, setLoading] = useState(false)
+  const [nextUrl, setNextUrl] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const backendToken = useRef(null) // { token, expiresAt }
   const [searchTerm, setSearchTerm] = useState('')
   const [sortConfig, setSortConfig] = useState({ key: null, direction: 'asc' })
   const [activeView, setActiveView] = useState(null) // 'userInfo' o 'pesticides'
@@ -143,34 +146,50 @@ function App() {
     }
   }
 
+  // Intercambia el token del frontend por uno del backend, reutilizándolo hasta poco antes de que venza
+  const getBackendToken = async () => {
+    if (backendToken.current && Date.now() < backendToken.current.expiresAt) {
+      return backendToken.current.token;
+    }
+    const authResponse = await axios.post('http://localhost:8000/api/auth/token/', null, {
+      headers: {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${keycloak.token}`
+      },
+      withCredentials: true
+    });
+    const expiresIn = authResponse.data.expires_in || 60;
+    backendToken.current = {
+      token: authResponse.data.token,
+      expiresAt: Date.now() + Math.max(expiresIn - 30, 0) * 1000
+    };
+    return backendToken.current.token;
+  }
+
+  // Pide una página del listado; `next` apunta a la siguiente (o null si es la última)
+  const fetchPesticidesPage = async (url) => {
+    const token = await getBackendToken();
+    const response = await axios.get(url, {
+      headers: {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${token}`
+      },
+      withCredentials: true
+    });
+    setNextUrl(response.data.next);
+    return response.data.results;
+  }
+
   const fetchPesticides = async () => {
     if (keycloak && authenticated) {
       setLoading(true)
       setActiveView('pesticides')
       try {
-        // Primero intercambiamos el token
-        const authResponse = await axios.post('http://localhost:8000/api/auth/token/', null, {
-          headers: {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${keycloak.token}`
-          },
-          withCredentials: true
-        });
-
-        const backendToken = authResponse.data.token;
-
-        // Luego hacemos la petición de pesticidas
-        const response = await axios.get('http://localhost:8000/api/pesticides/', {
-          headers: {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${backendToken}`
-          },
-          withCredentials: true
-        });
-
-        setPesticides(response.data);
+        // Solo la primera página; el resto se pide con "Cargar más".
+        // Sin page_size la API responde el arreglo completo, sin paginar
+        setPesticides(await fetchPesticidesPage('http://localhost:8000/api/pesticides/?page_size=100'));
         setMessage('Datos cargados correctamente');
       } catch (error) {
         console.error('Error al cargar pesticidas:', error);
@@ -181,6 +200,20 @@ function App() {
     }
   }
 
+  const loadMorePesticides = async () => {
+    if (!nextUrl || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const results = await fetchPesticidesPage(nextUrl);
+      setPesticides(previous => [...previous, ...results]);
+    } catch (error) {
+      console.error('Error al cargar pesticidas:', error);
+      setMessage('Error al cargar los datos: ' + (error.response?.data?.error || error.message));
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   const handleSort = (key) => {
     let direction = 'asc';
     if (sortConfig.key === key && sortConfig.direction === 'asc') {
@@ -383,6 +416,18 @@ function App() {
                             </tbody>
                           </table>
                         </div>
+                        <div className="d-flex justify-content-between align-items-center">
+                          <span className="text-muted">{pesticides.length} productos cargados</span>
+                          {nextUrl && (
+                            <button
+                              className="btn btn-outline-primary"
+                              onClick={loadMorePesticides}
+                              disabled={loadingMore}
+                            >
+                              {loadingMore ? 'Cargando...' : 'Cargar más'}
+                            </button>
+                          )}
+                        </div>
                       </div>
                     )}
                   </div>